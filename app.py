@@ -4,6 +4,10 @@ from flask import Flask
 from models import db, migrate, login_manager
 from routes import main_bp, auth_bp, webhook_bp, user_bp
 from config import config
+from commands import register_commands
+from services.queue import start_workers_once
+from services.metrics import init_metrics
+from services.db_profile import engine_options, init_db_profile
 
 def create_app(config_name=None):
     """Application factory function"""
@@ -16,12 +20,16 @@ def create_app(config_name=None):
     app.config.from_object(config[config_name])
     
     # Initialize extensions
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
     db.init_app(app)
-    with app.app_context():
-        db.create_all()
+    init_db_profile(app, db)
+    if app.config['DB_CREATE_ALL']:
+        with app.app_context():
+            db.create_all()
 
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    init_metrics(app)
     
     # Register blueprints
     app.register_blueprint(main_bp)
@@ -29,6 +37,14 @@ def create_app(config_name=None):
     app.register_blueprint(webhook_bp)
     app.register_blueprint(user_bp)
     
+    # Register CLI commands
+    register_commands(app)
+    
+    # Start background job workers with the first request
+    @app.before_request
+    def _start_job_workers():
+        start_workers_once(app)
+    
     # Register custom template filters
     @app.template_filter('strftime')
     def _jinja2_filter_datetime(date, fmt=None):
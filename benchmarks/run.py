@@ -0,0 +1,126 @@
+"""Microbenchmarks for title generation and activity decisioning.
+
+Run from the repository root:
+
+    python -m benchmarks.run --output benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+With --compare, the exit status is 1 if any benchmark got slower (or used
+more memory) than the baseline by more than the tolerance.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from services.activity import should_hide_from_feed
+from services.title_generator import analyze_elevation, analyze_heart_rate, analyze_pace, generate_workout_title
+from services.segments import detect_climbs, detect_intervals
+from models.user import UserSnapshot
+from benchmarks.synthetic import synthetic_activities, synthetic_activity, synthetic_streams
+
+SIZES = [1000, 10000, 50000, 100000]
+
+# Differences below these are treated as noise when comparing
+MIN_TIME_DELTA = 0.0005       # Seconds
+MIN_MEMORY_DELTA = 64 * 1024  # Bytes
+
+def measure(func, repeat):
+    """Best-of-`repeat` wall time and the peak traced memory of one call"""
+    func()  # Warm up
+    
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {'seconds': best, 'peak_bytes': peak}
+
+def benchmarks():
+    """Yield (name, callable) pairs for every benchmark"""
+    settings = UserSnapshot(id=1, strava_id=1, username=None, run_threshold=3600, ride_threshold=7200,
+                            walk_threshold=10800, access_token=None, token_expiry=None, created_at=None,
+                            hr_zones=None, hr_zones_fetched_at=None)
+    
+    for size in SIZES:
+        streams = synthetic_streams(size)
+        activity = synthetic_activity(streams)
+        
+        yield f"analyze_heart_rate[{size}]", lambda s=streams: analyze_heart_rate(s.heartrate)
+        yield f"analyze_pace[{size}]", lambda s=streams: analyze_pace(s.velocity, 'Run')
+        yield f"analyze_elevation[{size}]", lambda s=streams: analyze_elevation(s.altitude, s.grade)
+        yield f"detect_intervals[{size}]", lambda s=streams: detect_intervals(s.velocity, s.time, s.distance)
+        yield f"detect_climbs[{size}]", lambda s=streams: detect_climbs(s.altitude, s.distance, s.time)
+        yield f"generate_workout_title[{size}]", lambda a=activity, s=streams: generate_workout_title(a, s)
+        
+        activities = synthetic_activities(size)
+        yield f"should_hide_from_feed[{size}]", lambda a=activities: [should_hide_from_feed(x, settings) for x in a]
+
+def run(repeat, only=None):
+    results = {}
+    for name, func in benchmarks():
+        if only and only not in name:
+            continue
+        results[name] = measure(func, repeat)
+        print(f"{name:40s} {results[name]['seconds'] * 1000:10.3f} ms {results[name]['peak_bytes'] / 1024:10.1f} KiB")
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return the benchmarks that regressed against the baseline"""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        
+        time_limit = before['seconds'] * (1 + tolerance)
+        if result['seconds'] > time_limit and result['seconds'] - before['seconds'] > MIN_TIME_DELTA:
+            regressions.append(f"{name}: {before['seconds'] * 1000:.3f} ms -> {result['seconds'] * 1000:.3f} ms")
+        
+        memory_limit = before['peak_bytes'] * (1 + tolerance)
+        if result['peak_bytes'] > memory_limit and result['peak_bytes'] - before['peak_bytes'] > MIN_MEMORY_DELTA:
+            regressions.append(f"{name}: {before['peak_bytes']} -> {result['peak_bytes']} bytes peak")
+    
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark (best is kept)')
+    parser.add_argument('--only', help='Only run benchmarks whose name contains this string')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Baseline JSON file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed slowdown as a fraction (default 0.25)')
+    args = parser.parse_args(argv)
+    
+    results = run(args.repeat, args.only)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results
+            }, f, indent=2, sort_keys=True)
+    
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions")
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Cold start timings of the web app, each measured in a fresh interpreter.
+
+Run from the repository root:
+
+    python -m benchmarks.startup --config production --repeat 5
+
+Reports the median time to import the app, build it with create_app, serve
+the first webhook request and import the analytics stack on first use,
+plus the slowest imports (from a separate ``python -X importtime`` run).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PHASES = ['import_app', 'create_app', 'first_request', 'analytics_imports']
+
+# Runs in the child interpreter and prints the phase timings as JSON
+CHILD = """
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app({config!r})
+created = time.perf_counter()
+app.test_client().post('/webhook/', json={{'object_type': 'athlete', 'aspect_type': 'update'}})
+served = time.perf_counter()
+import services.title_generator, services.stream_cache
+analytics = time.perf_counter()
+print(json.dumps({{
+    'import_app': imported - start,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'analytics_imports': analytics - served
+}}))
+"""
+
+def run_once(config_name, env, importtime=False):
+    """Phase timings (and with `importtime`, per-module import times) of one fresh process"""
+    flags = ['-X', 'importtime'] if importtime else []
+    result = subprocess.run(
+        [sys.executable, *flags, '-c', CHILD.format(config=config_name)],
+        capture_output=True, text=True, env=env, check=True
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    
+    imports = []
+    for line in result.stderr.splitlines():
+        # "import time: <self us> | <cumulative us> | <module>"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, module = (part.strip() for part in line.replace('import time:', '|').split('|'))
+        imports.append((module.strip(), int(self_us), int(cumulative_us)))
+    
+    return timings, imports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure app start-up time')
+    parser.add_argument('--config', default='production', help='Config name passed to create_app')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh processes to measure')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args(argv)
+    
+    # Background workers would start polling the database in the child
+    env = dict(os.environ, JOB_WORKERS='0')
+    
+    runs = [run_once(args.config, env)[0] for _ in range(args.repeat)]
+    
+    # -X importtime slows imports down, so the module list comes from a separate run
+    _, imports = run_once(args.config, env, importtime=True)
+    
+    results = {
+        'config': args.config,
+        'python': sys.version.split()[0],
+        'median_seconds': {phase: statistics.median(run[phase] for run in runs) for phase in PHASES},
+        'slowest_imports': [
+            {'module': module, 'self_ms': self_us / 1000, 'cumulative_ms': cumulative_us / 1000}
+            for module, self_us, cumulative_us in sorted(imports, key=lambda i: i[1], reverse=True)[:args.top]
+        ]
+    }
+    
+    print(f"{'phase':<20} {'median':>10}")
+    for phase, seconds in results['median_seconds'].items():
+        print(f"{phase:<20} {seconds * 1000:>8.1f}ms")
+    print(f"{'total to first request':<20} {sum(results['median_seconds'][p] for p in PHASES[:3]) * 1000:>8.1f}ms")
+    
+    print("\nSlowest imports (self time):")
+    for entry in results['slowest_imports']:
+        print(f"  {entry['module']:<50} {entry['self_ms']:>8.1f}ms")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import numpy as np
+from services.streams import ActivityStreams, STREAM_DTYPES
+
+def synthetic_streams(points, seed=0):
+    """Realistic 1 Hz streams for a hilly interval session of `points` samples.
+
+    Velocity alternates between work and recovery blocks, heart rate follows
+    the effort with lag and noise, and altitude has a few long climbs with GPS
+    jitter on top.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(points)
+    
+    # 4 min work / 2 min recovery blocks after a 10 minute warm-up
+    in_work = (t > 600) & ((t - 600) % 360 < 240)
+    velocity = np.where(in_work, 4.6, 2.9) + rng.normal(0, 0.15, points)
+    velocity = np.clip(velocity, 0, None)
+    
+    heartrate = np.where(in_work, 172, 138) + rng.normal(0, 3, points)
+    heartrate = np.convolve(heartrate, np.ones(30) / 30, mode='same').round()
+    
+    # Climbs every ~40 minutes, plus sensor noise
+    altitude = 120 + 180 * np.sin(t / 2400 * 2 * np.pi) ** 2 + rng.normal(0, 0.4, points)
+    grade = np.gradient(altitude) / np.maximum(velocity, 0.1) * 100
+    distance = np.cumsum(velocity)
+    
+    arrays = {'time': t, 'distance': distance, 'heartrate': heartrate, 'velocity_smooth': velocity,
+              'altitude': altitude, 'grade_smooth': grade}
+    return ActivityStreams({key: values.astype(STREAM_DTYPES[key]) for key, values in arrays.items()})
+
+def synthetic_activity(streams, activity_type='Run'):
+    """Activity summary matching the synthetic streams"""
+    return {
+        'id': 1,
+        'type': activity_type,
+        'name': 'Morning Run',
+        'distance': float(streams.distance[-1]),
+        'elapsed_time': int(streams.time[-1]) + 1,
+        'hide_from_home': False
+    }
+
+def synthetic_activities(count, seed=0):
+    """Activity summaries with a realistic mix of types and durations"""
+    rng = np.random.default_rng(seed)
+    types = rng.choice(['Run', 'Ride', 'Walk', 'Swim', 'Hike'], count, p=[0.4, 0.3, 0.15, 0.1, 0.05])
+    elapsed = rng.lognormal(np.log(3000), 0.7, count).astype(int)
+    return [{'id': i, 'type': str(activity_type), 'elapsed_time': int(seconds)}
+            for i, (activity_type, seconds) in enumerate(zip(types, elapsed))]
@@ -0,0 +1,80 @@
+import click
+from models import db
+from services.queue import work, start_workers, prune_jobs
+from services.async_worker import AsyncWorker
+from services.rollups import rebuild_rollups
+from services.db_profile import check_index_used
+
+def register_commands(app):
+    """Register custom flask CLI commands"""
+    
+    @app.cli.command('init-db')
+    def init_db():
+        """Create any missing database tables"""
+        db.create_all()
+        click.echo('Database tables created')
+    
+    @app.cli.command('create-indexes')
+    def create_indexes():
+        """Create indexes declared on the models that existing tables are missing"""
+        # create_all skips tables that already exist, indexes added to them later included
+        for table in db.metadata.sorted_tables:
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                index.create(db.engine, checkfirst=True)
+                click.echo(f"{index.name} on {table.name}")
+    
+    @app.cli.command('check-query-plans')
+    def check_query_plans():
+        """Check that hot queries are answered from their indexes (exits 1 if not)"""
+        from models.activity_log import ActivityLog
+        
+        checks = [
+            ('dashboard recent activities', ActivityLog.recent_for_user(0).statement, 'ix_activity_log_user_processed')
+        ]
+        
+        failed = False
+        for name, statement, index_name in checks:
+            ok, plan = check_index_used(db.session, statement, index_name)
+            failed = failed or not ok
+            click.echo(f"{'OK' if ok else 'FAIL'}  {name} (expects {index_name})")
+            for line in plan:
+                click.echo(f"      {line}")
+        
+        if failed:
+            raise SystemExit(1)
+    
+    @app.cli.command('worker')
+    @click.option('--threads', default=1, help='Number of worker threads to run')
+    @click.option('--burst', is_flag=True, help='Exit once the queue is empty')
+    @click.option('--async', 'use_async', is_flag=True, help='Run jobs as coroutines on an asyncio event loop')
+    @click.option('--concurrency', type=int, default=None, help='Jobs in flight with --async (default ASYNC_MAX_IN_FLIGHT)')
+    def worker(threads, burst, use_async, concurrency):
+        """Run background job workers in the foreground"""
+        if use_async:
+            AsyncWorker(app, max_in_flight=concurrency).run_forever(burst=burst)
+            return
+        
+        if burst or threads <= 1:
+            work(app, burst=burst)
+            return
+        
+        stop_event, workers = start_workers(app, threads)
+        try:
+            for thread in workers:
+                thread.join()
+        except KeyboardInterrupt:
+            stop_event.set()
+    
+    @app.cli.command('prune-jobs')
+    @click.option('--older-than', type=int, default=None, help='Seconds since finishing (default JOB_RETENTION)')
+    def prune_jobs_command(older_than):
+        """Delete finished (done or failed) jobs from the queue table"""
+        count = prune_jobs(older_than)
+        click.echo(f"Pruned {count} jobs")
+    
+    @app.cli.command('rebuild-rollups')
+    @click.option('--user-id', type=int, default=None, help='Only rebuild this user\'s rollups')
+    def rebuild_rollups_command(user_id):
+        """Recompute the dashboard's daily activity rollups from the activity log"""
+        rebuild_rollups(user_id)
+        click.echo('Rollups rebuilt')
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -14,6 +15,89 @@ class Config:
     STRAVA_VERIFICATION_TOKEN = os.environ.get('STRAVA_VERIFICATION_TOKEN')
     BASE_URL = os.environ.get('BASE_URL', 'http://localhost:5530')
 
+    # Strava API client
+    STRAVA_BASE_URL = os.environ.get('STRAVA_BASE_URL', 'https://www.strava.com')
+    STRAVA_POOL_SIZE = int(os.environ.get('STRAVA_POOL_SIZE', 10))           # Keep-alive connections per process
+    STRAVA_CONNECT_TIMEOUT = float(os.environ.get('STRAVA_CONNECT_TIMEOUT', 3.05))
+    STRAVA_READ_TIMEOUT = float(os.environ.get('STRAVA_READ_TIMEOUT', 15))
+
+    # Strava rate limits, shared by every worker on the host through a locked state file
+    STRAVA_RATE_LIMIT_STATE_PATH = os.environ.get('STRAVA_RATE_LIMIT_STATE_PATH',
+                                                  os.path.join(tempfile.gettempdir(), 'strava_rate_limit.json'))
+    STRAVA_RATE_LIMIT_SHORT = int(os.environ.get('STRAVA_RATE_LIMIT_SHORT', 200))     # Until headers say otherwise
+    STRAVA_RATE_LIMIT_DAILY = int(os.environ.get('STRAVA_RATE_LIMIT_DAILY', 2000))
+    STRAVA_RATE_LIMIT_BACKFILL_RESERVE = float(os.environ.get('STRAVA_RATE_LIMIT_BACKFILL_RESERVE', 0.3))  # Share kept for live traffic
+    STRAVA_RATE_LIMIT_MAX_WAIT = float(os.environ.get('STRAVA_RATE_LIMIT_MAX_WAIT', 5))  # Seconds to block before deferring
+
+    # On-disk activity stream cache (set STREAM_CACHE_DIR to an empty string to disable)
+    STREAM_CACHE_DIR = os.environ.get('STREAM_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'strava_stream_cache'))
+    STREAM_CACHE_MAX_BYTES = int(os.environ.get('STREAM_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+    # Title analyzers to run; only the streams they need are fetched
+    TITLE_ANALYZERS = [name.strip() for name in os.environ.get('TITLE_ANALYZERS', 'heart_rate,pace,elevation,intervals,climbs').split(',')
+                       if name.strip()]
+
+    # Athlete heart rate zones are cached on the user and refreshed in the background once stale
+    HR_ZONES_TTL = int(os.environ.get('HR_ZONES_TTL', 7 * 24 * 3600))  # Seconds
+
+    # Historic backfill
+    BACKFILL_PAGE_SIZE = int(os.environ.get('BACKFILL_PAGE_SIZE', 200))     # Strava's maximum
+    BACKFILL_CONCURRENCY = int(os.environ.get('BACKFILL_CONCURRENCY', 4))   # Activities processed in parallel
+    BACKFILL_CHECKPOINT_SIZE = int(os.environ.get('BACKFILL_CHECKPOINT_SIZE', 20))  # Activities logged per checkpoint
+
+    # Group commit for live activity logs (0 commits every event on its own)
+    ACTIVITY_LOG_COMMIT_WINDOW = float(os.environ.get('ACTIVITY_LOG_COMMIT_WINDOW', 0))  # Seconds
+    ACTIVITY_LOG_MAX_BATCH = int(os.environ.get('ACTIVITY_LOG_MAX_BATCH', 100))
+
+    # OAuth token refresh
+    TOKEN_REFRESH_MARGIN = int(os.environ.get('TOKEN_REFRESH_MARGIN', 300))  # Refresh this many seconds before expiry
+    TOKEN_LOCK_DIR = os.environ.get('TOKEN_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'strava_token_locks'))
+
+    # In-process user cache (webhook and login lookups); TTL bounds staleness across workers
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))  # Seconds
+
+    # Prometheus metrics, aggregated across worker processes through per-process files
+    METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'strava_metrics'))
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))  # Seconds other workers may lag behind
+
+    # Per-event tracing of the processing pipeline (0 disables it)
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.1))  # Share of events traced
+    TRACE_SLOW_COUNT = int(os.environ.get('TRACE_SLOW_COUNT', 50))      # Slowest traces kept (per process and shown)
+    TRACE_DIR = os.environ.get('TRACE_DIR', os.path.join(tempfile.gettempdir(), 'strava_traces'))  # Per-process trace files
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')                         # Required for /admin/* endpoints
+
+    # Background job queue
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))              # Worker threads per web process
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+    JOB_RETRY_BASE_DELAY = int(os.environ.get('JOB_RETRY_BASE_DELAY', 30))    # Seconds, doubled per attempt
+    JOB_RETRY_MAX_DELAY = int(os.environ.get('JOB_RETRY_MAX_DELAY', 3600))
+    JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 600))          # Seconds before a running job is considered abandoned
+    JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 7 * 24 * 3600))      # Seconds finished jobs are kept
+    JOB_PRUNE_INTERVAL = int(os.environ.get('JOB_PRUNE_INTERVAL', 3600))    # Seconds between prunes per process (0 disables)
+    JOB_WORKER_MODE = os.environ.get('JOB_WORKER_MODE', 'threads')  # 'threads', or 'async' for one asyncio worker per process
+
+    # asyncio worker (JOB_WORKER_MODE=async or `flask worker --async`)
+    ASYNC_MAX_IN_FLIGHT = int(os.environ.get('ASYNC_MAX_IN_FLIGHT', 200))  # Jobs processed concurrently
+    ASYNC_IO_THREADS = int(os.environ.get('ASYNC_IO_THREADS', 100))        # Threads for blocking Strava and DB calls
+    ASYNC_CPU_THREADS = int(os.environ.get('ASYNC_CPU_THREADS', 2))        # Threads for title analytics
+
+    # Database engine profile: 'tuned' applies the settings below, 'default' leaves SQLAlchemy's defaults
+    DB_ENGINE_PROFILE = os.environ.get('DB_ENGINE_PROFILE', 'tuned')
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')           # Readers do not block on the writer
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))       # Milliseconds to wait for a lock
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # Bytes
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))           # Connections kept per process (Postgres)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))    # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # Seconds before a connection is replaced
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+    # Create missing tables on start-up (production runs `flask init-db` at deploy time instead)
+    DB_CREATE_ALL = os.environ.get('DB_CREATE_ALL', 'true').lower() == 'true'
+
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
@@ -21,6 +105,7 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
+    DB_CREATE_ALL = os.environ.get('DB_CREATE_ALL', 'false').lower() == 'true'
 
 # Configuration dictionary
 config = {
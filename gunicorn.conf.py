@@ -0,0 +1,41 @@
+"""Gunicorn settings for production.
+
+    FLASK_CONFIG=production gunicorn run:app
+
+The app is imported once in the master (preload) and forked into the
+workers, so a new worker is ready to serve as soon as it exists.
+"""
+import glob
+import os
+from config import Config
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Also import the numeric stack in the master, so workers inherit it
+preload_analytics = os.environ.get('GUNICORN_PRELOAD_ANALYTICS', 'true').lower() == 'true'
+
+def on_starting(server):
+    # Per-process metric files from the previous run would be counted again
+    if Config.METRICS_DIR:
+        for path in glob.glob(os.path.join(Config.METRICS_DIR, 'metrics_*.json')):
+            os.remove(path)
+    if Config.TRACE_DIR:
+        for path in glob.glob(os.path.join(Config.TRACE_DIR, 'traces_*.json')):
+            os.remove(path)
+    
+    if server.cfg.preload_app and preload_analytics:
+        import services.title_generator  # noqa: F401
+        import services.stream_cache  # noqa: F401
+
+def post_fork(server, worker):
+    # Connections opened in the master must not be shared with the workers
+    if server.cfg.preload_app:
+        from run import app
+        from models import db
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
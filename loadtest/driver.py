@@ -0,0 +1,135 @@
+"""Replay Strava webhook events against a running app and report latencies.
+
+    STRAVA_BASE_URL=http://localhost:8100 python run.py       # the app
+    python -m loadtest.fake_strava --port 8100               # the fake Strava
+    python -m loadtest.driver --app http://localhost:5000 --fake http://localhost:8100 --rate 20 --duration 60
+
+The driver signs the fake athlete up through the app's OAuth callback, then
+POSTs activity create events at the target rate. Webhook latency is the
+time to the app's 200; completion latency runs from the POST until the fake
+Strava saw the activity update, i.e. the full queue -> fetch -> analyze ->
+PUT path.
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+
+PERCENTILES = (50, 95, 99)
+
+def sign_up(app_url, session):
+    """Create (or refresh) the fake athlete's account via the OAuth callback"""
+    response = session.get(f"{app_url}/auth/callback", params={'code': 'loadtest'}, allow_redirects=False)
+    if response.status_code >= 400:
+        raise RuntimeError(f"Sign-up through /auth/callback failed with {response.status_code}")
+
+def send_events(app_url, owner_id, rate, duration, first_id, concurrency):
+    """POST webhook events at `rate` per second, returning {activity_id: (sent_at, latency, status)}"""
+    results = {}
+    lock = threading.Lock()
+    local = threading.local()
+    
+    def post(activity_id):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        event = {
+            'object_type': 'activity',
+            'aspect_type': 'create',
+            'object_id': activity_id,
+            'owner_id': owner_id,
+            'event_time': int(time.time())
+        }
+        sent_at = time.time()
+        try:
+            status = local.session.post(f"{app_url}/webhook/", json=event, timeout=30).status_code
+        except requests.RequestException:
+            status = None
+        with lock:
+            results[activity_id] = (sent_at, time.time() - sent_at, status)
+    
+    total = int(rate * duration)
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i in range(total):
+            # Open-loop schedule: a slow app must not slow the arrivals down
+            delay = start + i / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(post, first_id + i)
+    return results
+
+def wait_for_completion(fake_url, activity_ids, timeout):
+    """Poll the fake Strava until every activity was updated or `timeout` passes"""
+    deadline = time.time() + timeout
+    wanted = {str(activity_id) for activity_id in activity_ids}
+    while True:
+        updates = requests.get(f"{fake_url}/_stats", timeout=10).json()['updates']
+        done = {key: value for key, value in updates.items() if key in wanted}
+        if len(done) == len(wanted) or time.time() >= deadline:
+            return {int(key): value for key, value in done.items()}
+        time.sleep(0.5)
+
+def summarize(latencies):
+    if not latencies:
+        return {'count': 0}
+    values = np.asarray(latencies) * 1000
+    summary = {'count': len(values), 'mean_ms': round(float(values.mean()), 1)}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p}_ms"] = round(float(value), 1)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the webhook pipeline against a fake Strava')
+    parser.add_argument('--app', default='http://localhost:5000', help='Base URL of the running app')
+    parser.add_argument('--fake', default='http://localhost:8100', help='Base URL of the fake Strava API')
+    parser.add_argument('--owner-id', type=int, default=1000, help='Strava id of the fake athlete')
+    parser.add_argument('--rate', type=float, default=10, help='Webhook events per second')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to send events for')
+    parser.add_argument('--concurrency', type=int, default=32, help='Maximum in-flight webhook POSTs')
+    parser.add_argument('--drain', type=float, default=120, help='Seconds to wait for processing to finish')
+    parser.add_argument('--first-id', type=int, default=None, help='First activity id (default: time based)')
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args(argv)
+    
+    sign_up(args.app, requests.Session())
+    requests.post(f"{args.fake}/_reset", timeout=10)
+    
+    # Fresh ids each run, so the app's dedup does not swallow the events
+    first_id = args.first_id or int(time.time() * 1000)
+    
+    started = time.time()
+    sent = send_events(args.app, args.owner_id, args.rate, args.duration, first_id, args.concurrency)
+    send_time = time.time() - started
+    updated = wait_for_completion(args.fake, sent, args.drain)
+    # Measured to the last update, not to the end of the drain wait
+    total_time = max(updated.values(), default=time.time()) - started
+    
+    accepted = [activity_id for activity_id, (_, _, status) in sent.items() if status == 200]
+    completion = [updated[activity_id] - sent[activity_id][0] for activity_id in accepted if activity_id in updated]
+    calls = requests.get(f"{args.fake}/_stats", timeout=10).json()['calls']
+    
+    report = {
+        'sent': len(sent),
+        'accepted': len(accepted),
+        'completed': len(completion),
+        'send_rate': round(len(sent) / send_time, 2),
+        'completion_rate': round(len(completion) / total_time, 2),
+        'webhook': summarize([latency for _, latency, status in sent.values() if status == 200]),
+        'completion': summarize(completion),
+        'strava_calls': calls
+    }
+    
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    
+    # Non-zero exit when events were dropped, so CI can gate on it
+    return 0 if len(completion) == len(sent) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
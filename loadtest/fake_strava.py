@@ -0,0 +1,197 @@
+"""Local stand-in for the Strava API, for load testing.
+
+    python -m loadtest.fake_strava --port 8100 --latency 0.15 --error-rate 0.01
+
+Point the app at it with STRAVA_BASE_URL=http://localhost:8100. Activities
+are generated on the fly from their id, every call is recorded, and
+X-RateLimit-* headers (and 429s) follow the configured limits. GET /_stats
+returns call counts and the time each activity was last updated, which the
+load driver uses to measure end-to-end completion.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from flask import Flask, Response, g, jsonify, request
+from benchmarks.synthetic import synthetic_streams
+
+SHORT_WINDOW = 15 * 60
+LONG_WINDOW = 24 * 60 * 60
+
+RESOLUTION_POINTS = {'low': 100, 'medium': 1000, 'high': 10000}
+
+def create_fake_strava(latency=0.1, jitter=0.5, error_rate=0.0, short_limit=200, long_limit=2000,
+                       stream_points=3600, athlete_id=1000):
+    """Build the fake Strava Flask app.
+
+    `latency` is the mean added delay per call in seconds (varied by
+    +/- `jitter` of itself); `error_rate` is the share of calls answered
+    with a 500.
+    """
+    app = Flask(__name__)
+    lock = threading.RLock()
+    state = {
+        'calls': {},
+        'updates': {},
+        'activities': {},
+        'usage': [0, 0],
+        'windows': [None, None]
+    }
+    
+    # Serializing long streams is expensive, so do it once per keys/resolution
+    streams = synthetic_streams(stream_points)
+    stream_bodies = {}
+    
+    def streams_body(keys, resolution):
+        cache_key = (keys, resolution)
+        if cache_key not in stream_bodies:
+            # Strava downsamples to about 100/1000/10000 points; without a resolution it sends every sample
+            step = max(1, stream_points // RESOLUTION_POINTS[resolution]) if resolution in RESOLUTION_POINTS else 1
+            wanted = set(keys.split(',')) if keys else set(streams.keys())
+            stream_bodies[cache_key] = json.dumps({
+                key: {'data': streams.get(key)[::step].tolist(), 'series_type': 'time',
+                      'original_size': stream_points, 'resolution': resolution or 'high'}
+                for key in sorted(wanted & set(streams.keys()))
+            })
+        return stream_bodies[cache_key]
+    
+    def activity(activity_id):
+        with lock:
+            if activity_id not in state['activities']:
+                rng = random.Random(activity_id)
+                state['activities'][activity_id] = {
+                    'id': activity_id,
+                    'type': rng.choice(['Run', 'Run', 'Ride', 'Walk']),
+                    'name': 'Morning Activity',
+                    'distance': rng.uniform(2000, 40000),
+                    'elapsed_time': rng.randint(600, 3 * 3600),
+                    'start_date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - rng.randint(0, 6 * 3600))),
+                    'hide_from_home': False,
+                    'manual': False,
+                    'has_heartrate': True
+                }
+            return state['activities'][activity_id]
+    
+    def rate_limit_headers():
+        now = time.time()
+        windows = [int(now // SHORT_WINDOW), int(now // LONG_WINDOW)]
+        for i in (0, 1):
+            if state['windows'][i] != windows[i]:
+                state['windows'][i], state['usage'][i] = windows[i], 0
+            state['usage'][i] += 1
+        return {
+            'X-RateLimit-Limit': f"{short_limit},{long_limit}",
+            'X-RateLimit-Usage': f"{state['usage'][0]},{state['usage'][1]}"
+        }
+    
+    @app.before_request
+    def simulate_network():
+        if request.path.startswith('/_'):
+            return None
+        
+        with lock:
+            endpoint = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+            state['calls'][endpoint] = state['calls'].get(endpoint, 0) + 1
+            headers = rate_limit_headers()
+            limited = state['usage'][0] > short_limit or state['usage'][1] > long_limit
+        
+        if latency:
+            time.sleep(max(0.0, random.uniform(latency * (1 - jitter), latency * (1 + jitter))))
+        
+        if limited:
+            return Response('{"message": "Rate Limit Exceeded"}', 429, headers, mimetype='application/json')
+        if random.random() < error_rate:
+            return Response('{"message": "error"}', 500, headers, mimetype='application/json')
+        
+        g.rate_limit_headers = headers
+        return None
+    
+    @app.after_request
+    def add_rate_limit_headers(response):
+        response.headers.extend(g.get('rate_limit_headers', {}))
+        return response
+    
+    @app.route('/oauth/token', methods=['POST'])
+    def oauth_token():
+        return jsonify({
+            'access_token': f"access-{random.getrandbits(32)}",
+            'refresh_token': f"refresh-{random.getrandbits(32)}",
+            'expires_at': int(time.time()) + 6 * 3600,
+            'athlete': {'id': athlete_id, 'username': 'loadtest'}
+        })
+    
+    @app.route('/api/v3/activities/<int:activity_id>', methods=['GET'])
+    def get_activity(activity_id):
+        return jsonify(activity(activity_id))
+    
+    @app.route('/api/v3/activities/<int:activity_id>', methods=['PUT'])
+    def update_activity(activity_id):
+        changes = request.get_json(silent=True) or {}
+        with lock:
+            current = activity(activity_id)
+            current.update({key: value for key, value in changes.items() if key in ('name', 'hide_from_home')})
+            state['updates'][activity_id] = time.time()
+            return jsonify(current)
+    
+    @app.route('/api/v3/activities/<int:activity_id>/streams')
+    def get_streams(activity_id):
+        body = streams_body(request.args.get('keys'), request.args.get('resolution'))
+        return Response(body, mimetype='application/json')
+    
+    @app.route('/api/v3/athlete/activities')
+    def athlete_activities():
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 30, type=int)
+        first = (page - 1) * per_page + 1
+        return jsonify([activity(activity_id) for activity_id in range(first, min(first + per_page, 501))])
+    
+    @app.route('/api/v3/athlete/zones')
+    def athlete_zones():
+        edges = [0, 123, 153, 169, 184]
+        return jsonify({'heart_rate': {
+            'custom_zones': False,
+            'zones': [{'min': low, 'max': high} for low, high in zip(edges, edges[1:] + [-1])]
+        }})
+    
+    @app.route('/_stats')
+    def stats():
+        with lock:
+            return jsonify({'calls': state['calls'], 'updates': state['updates']})
+    
+    @app.route('/_reset', methods=['POST'])
+    def reset():
+        with lock:
+            state['calls'].clear()
+            state['updates'].clear()
+            state['activities'].clear()
+        return '', 204
+    
+    return app
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a local fake Strava API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', type=float, default=0.1, help='Mean added latency per call (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.5, help='Latency variation as a fraction of the mean')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of calls failing with 500')
+    parser.add_argument('--short-limit', type=int, default=200, help='15-minute rate limit')
+    parser.add_argument('--long-limit', type=int, default=2000, help='Daily rate limit')
+    parser.add_argument('--stream-points', type=int, default=3600, help='Samples per activity stream')
+    parser.add_argument('--athlete-id', type=int, default=1000, help='Strava id of the fake athlete')
+    args = parser.parse_args(argv)
+    
+    app = create_fake_strava(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        short_limit=args.short_limit,
+        long_limit=args.long_limit,
+        stream_points=args.stream_points,
+        athlete_id=args.athlete_id
+    )
+    app.run(host=args.host, port=args.port, threaded=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Add the incremental sync watermark and activity start dates
+
+Revision ID: 3f2a9c1d7e01
+Revises: 
+Create Date: 2026-10-18 10:30:00
+
+Databases created by `flask init-db` (or on start-up) before migrations
+were shipped may already have some of these columns, so each one is only
+added when it is missing.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7e01'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if not _has_column('user', 'sync_after'):
+        op.add_column('user', sa.Column('sync_after', sa.DateTime(), nullable=True))
+    if not _has_column('activity_log', 'start_date'):
+        op.add_column('activity_log', sa.Column('start_date', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('activity_log') as batch_op:
+        batch_op.drop_column('start_date')
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('sync_after')
@@ -0,0 +1,33 @@
+"""Cache athlete heart rate zones on the user
+
+Revision ID: 7b4d2e8a1c36
+Revises: 3f2a9c1d7e01
+Create Date: 2026-10-18 11:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b4d2e8a1c36'
+down_revision = '3f2a9c1d7e01'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if not _has_column('user', 'hr_zones'):
+        op.add_column('user', sa.Column('hr_zones', sa.Text(), nullable=True))
+    if not _has_column('user', 'hr_zones_fetched_at'):
+        op.add_column('user', sa.Column('hr_zones_fetched_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('hr_zones_fetched_at')
+        batch_op.drop_column('hr_zones')
@@ -0,0 +1,48 @@
+"""Deduplicate the activity log and index it per user
+
+Revision ID: c91e5f3b7a24
+Revises: 7b4d2e8a1c36
+Create Date: 2026-10-18 11:30:00
+
+Before webhook processing was made idempotent, a redelivered event could
+log the same activity twice. The latest row for each activity is kept so
+the unique index can be built.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c91e5f3b7a24'
+down_revision = '7b4d2e8a1c36'
+branch_labels = None
+depends_on = None
+
+
+def _has_index(table, name):
+    return name in {index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if not _has_index('activity_log', 'ix_activity_log_user_activity'):
+        op.execute(
+            'DELETE FROM activity_log '
+            'WHERE user_id IS NOT NULL AND strava_activity_id IS NOT NULL '
+            'AND id NOT IN ('
+            '    SELECT keep_id FROM ('
+            '        SELECT MAX(id) AS keep_id FROM activity_log '
+            '        WHERE user_id IS NOT NULL AND strava_activity_id IS NOT NULL '
+            '        GROUP BY user_id, strava_activity_id'
+            '    ) AS latest'
+            ')'
+        )
+        op.create_index('ix_activity_log_user_activity', 'activity_log', ['user_id', 'strava_activity_id'], unique=True)
+    
+    if not _has_index('activity_log', 'ix_activity_log_user_processed'):
+        op.create_index('ix_activity_log_user_processed', 'activity_log', ['user_id', sa.text('processed_at DESC')])
+
+
+def downgrade():
+    # Deleted duplicates are not restored
+    op.drop_index('ix_activity_log_user_processed', table_name='activity_log')
+    op.drop_index('ix_activity_log_user_activity', table_name='activity_log')
@@ -0,0 +1,30 @@
+"""Record when the athlete has not granted the scope heart rate zones need
+
+Revision ID: e4a7c2b9d158
+Revises: c91e5f3b7a24
+Create Date: 2026-10-18 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2b9d158'
+down_revision = 'c91e5f3b7a24'
+branch_labels = None
+depends_on = None
+
+
+def _has_column(table, column):
+    return column in {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if not _has_column('user', 'hr_zones_scope_missing'):
+        op.add_column('user', sa.Column('hr_zones_scope_missing', sa.Boolean(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('hr_zones_scope_missing')
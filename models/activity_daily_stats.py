@@ -0,0 +1,16 @@
+from . import db
+
+class ActivityDailyStats(db.Model):
+    """Per-user daily totals for each activity type, maintained alongside ActivityLog"""
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', 'activity_type', name='uq_activity_daily_stats_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    activity_type = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    hidden_count = db.Column(db.Integer, nullable=False, default=0)
+    total_distance = db.Column(db.Float, nullable=False, default=0)
+    total_elapsed_time = db.Column(db.Integer, nullable=False, default=0)
@@ -2,6 +2,13 @@ from datetime import datetime
 from . import db
 
 class ActivityLog(db.Model):
+    __table_args__ = (
+        # One log row per activity, so redelivered events cannot be logged twice
+        db.Index('ix_activity_log_user_activity', 'user_id', 'strava_activity_id', unique=True),
+        # The dashboard's latest activities for a user, read in index order without a sort
+        db.Index('ix_activity_log_user_processed', 'user_id', db.text('processed_at DESC')),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     strava_activity_id = db.Column(db.BigInteger)
@@ -9,7 +16,15 @@ class ActivityLog(db.Model):
     activity_name = db.Column(db.String(255))
     elapsed_time = db.Column(db.Integer)
     distance = db.Column(db.Float)
+    start_date = db.Column(db.DateTime, nullable=True)
     was_hidden = db.Column(db.Boolean, default=False)
     processed_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    user = db.relationship('User', backref=db.backref('activity_logs', lazy=True))
\ No newline at end of file
+    user = db.relationship('User', backref=db.backref('activity_logs', lazy=True))
+    
+    @classmethod
+    def recent_for_user(cls, user_id, limit=10):
+        """Query for a user's most recently processed activities, newest first"""
+        return cls.query.filter_by(user_id=user_id)\
+                        .order_by(cls.processed_at.desc())\
+                        .limit(limit)
\ No newline at end of file
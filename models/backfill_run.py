@@ -0,0 +1,36 @@
+from datetime import datetime
+from . import db
+
+class BackfillRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    status = db.Column(db.String(20), default='queued')  # queued, running, done, failed
+    full_resync = db.Column(db.Boolean, default=False)    # Ignore the user's sync watermark
+    cursor = db.Column(db.DateTime, nullable=True)        # Latest start_date processed, to resume from
+    pages_done = db.Column(db.Integer, default=0)
+    processed = db.Column(db.Integer, default=0)
+    hidden = db.Column(db.Integer, default=0)
+    titled = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    user = db.relationship('User', backref=db.backref('backfill_runs', lazy=True))
+    
+    @property
+    def is_active(self):
+        return self.status in ('queued', 'running')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'pages_done': self.pages_done,
+            'processed': self.processed,
+            'hidden': self.hidden,
+            'titled': self.titled,
+            'error': self.error,
+            'started_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
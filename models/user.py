@@ -1,8 +1,14 @@
+from collections import namedtuple
 from datetime import datetime
-import requests
 from flask_login import UserMixin
 from . import db, login_manager
 from flask import current_app
+from services.strava_client import get_client
+from services.tokens import get_valid_token, token_is_fresh
+from services.cache import TTLCache
+from services.metrics import token_refreshes
+from sqlalchemy import event
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -24,20 +30,24 @@ class User(db.Model, UserMixin):
     activities_hidden = db.Column(db.Integer, default=0)
     last_activity_date = db.Column(db.DateTime, nullable=True)
     
+    # Historic sync watermark: start_date of the latest activity a backfill has processed
+    sync_after = db.Column(db.DateTime, nullable=True)
+    
+    # Heart rate zones from Strava (JSON list of {min, max}) and when they were last fetched
+    hr_zones = db.Column(db.Text, nullable=True)
+    hr_zones_fetched_at = db.Column(db.DateTime, nullable=True)
+    # Set when the athlete did not grant profile:read_all, which reading zones needs
+    hr_zones_scope_missing = db.Column(db.Boolean, default=False)
+    
     def get_valid_token(self):
-        """Get a valid access token, refreshing if necessary"""
-        now = datetime.utcnow()
-        
-        # Check if token is expired or about to expire
-        if not self.token_expiry or self.token_expiry <= now:
-            self.refresh_strava_token()
-            
-        return self.access_token
+        """Get a valid access token, refreshing if it is expired or about to expire"""
+        return get_valid_token(self)
     
     def refresh_strava_token(self):
         """Refresh the Strava access token"""
-        response = requests.post(
-            'https://www.strava.com/oauth/token',
+        response = get_client().post(
+            '/oauth/token',
+            endpoint='oauth_token',
             data={
                 'client_id': current_app.config['STRAVA_CLIENT_ID'],
                 'client_secret': current_app.config['STRAVA_CLIENT_SECRET'],
@@ -52,8 +62,10 @@ class User(db.Model, UserMixin):
             self.refresh_token = data['refresh_token']
             self.token_expiry = datetime.utcfromtimestamp(data['expires_at'])
             db.session.commit()
+            token_refreshes.inc(result='success')
             return True
         else:
+            token_refreshes.inc(result='failure')
             print(f"Token refresh failed for user {self.id}: {response.text}")
             return False
 
@@ -67,6 +79,103 @@ class User(db.Model, UserMixin):
             return self.walk_threshold
         return None  # No threshold defined for this activity type
 
+    def snapshot(self):
+        """Detached, read-only copy of the fields needed to process activities"""
+        return UserSnapshot(**{field: getattr(self, field) for field in UserSnapshot._fields})
+    
+    @classmethod
+    def get_snapshot(cls, user_id=None, strava_id=None):
+        """Look up a user's snapshot by id or Strava id, from the in-process cache when possible"""
+        cache = _snapshot_cache()
+        key = ('id', user_id) if user_id is not None else ('strava_id', strava_id)
+        
+        snapshot = cache.get(key)
+        if snapshot is None:
+            user = db.session.get(cls, user_id) if user_id is not None else cls.query.filter_by(strava_id=strava_id).first()
+            if user is None:
+                return None
+            snapshot = user.snapshot()
+            cache.set(('id', snapshot.id), snapshot)
+            cache.set(('strava_id', snapshot.strava_id), snapshot)
+        
+        return snapshot
+    
+    def invalidate_snapshot(self):
+        """Drop this user from the snapshot cache.
+
+        Updates and deletes of users do this on their own once they commit
+        (see _drop_changed_snapshots).
+        """
+        _drop_snapshot(self.id, self.strava_id)
+
+class UserSnapshot(namedtuple('UserSnapshot', 'id strava_id username run_threshold ride_threshold walk_threshold '
+                                              'access_token token_expiry created_at hr_zones hr_zones_fetched_at '
+                                              'hr_zones_scope_missing')):
+    """Plain copy of a user's settings that is safe to share between threads and requests"""
+    __slots__ = ()
+    
+    get_activity_threshold = User.get_activity_threshold
+    
+    def get_valid_token(self):
+        """The cached access token while it is fresh, otherwise refresh through the database"""
+        if token_is_fresh(self):
+            return self.access_token
+        user = db.session.get(User, self.id)
+        return user.get_valid_token() if user else None
+    
+    def to_user(self):
+        """A session-bound User built from the snapshot without querying the database.
+
+        Fields not in the snapshot (refresh token, statistics) are loaded on
+        first access. A snapshot that has since been dropped from the cache
+        (the user changed or was deleted) is reloaded instead, so this returns
+        None for a deleted user.
+        """
+        existing = db.session.identity_map.get(db.session.identity_key(User, self.id))
+        if existing is not None:
+            return existing
+        
+        if _snapshot_cache().get(('id', self.id)) is not self:
+            return db.session.get(User, self.id)
+        
+        user = User(**self._asdict())
+        make_transient_to_detached(user)
+        db.session.add(user)
+        return user
+
+_snapshots = None
+
+def _snapshot_cache():
+    global _snapshots
+    if _snapshots is None:
+        _snapshots = TTLCache(
+            max_size=current_app.config['USER_CACHE_SIZE'],
+            ttl=current_app.config['USER_CACHE_TTL']
+        )
+    return _snapshots
+
+def _drop_snapshot(user_id, strava_id):
+    if _snapshots is not None:
+        _snapshots.pop(('id', user_id))
+        _snapshots.pop(('strava_id', strava_id))
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, user):
+    """Remember users whose snapshot is out of date once the flush commits"""
+    object_session(user).info.setdefault('changed_users', set()).add((user.id, user.strava_id))
+
+@event.listens_for(Session, 'after_commit')
+def _drop_changed_snapshots(session):
+    # Dropped after the commit, so a concurrent lookup cannot cache the old row again
+    for user_id, strava_id in session.info.pop('changed_users', ()):
+        _drop_snapshot(user_id, strava_id)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_changed_users(session, previous_transaction):
+    session.info.pop('changed_users', None)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
\ No newline at end of file
+    snapshot = User.get_snapshot(user_id=int(user_id))
+    return snapshot.to_user() if snapshot else None
\ No newline at end of file
@@ -1,7 +1,9 @@
 from flask import redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required
 from . import auth_bp
+from models import db
 from services.strava import exchange_token, process_user_from_token_response, get_authorization_url
+from services.hr_zones import request_zone_refresh, zones_are_stale
 
 @auth_bp.route('/authorize')
 def authorize():
@@ -32,6 +34,16 @@ def callback():
     # Process the response
     user = process_user_from_token_response(data)
     
+    # Strava reports the scopes the athlete accepted; reading zones needs profile:read_all
+    scope = request.args.get('scope')
+    if scope is not None:
+        user.hr_zones_scope_missing = 'profile:read_all' not in scope.split(',')
+        db.session.commit()
+    
+    # Fetch heart rate zones now so the first activity's title can use them
+    if zones_are_stale(user):
+        request_zone_refresh(user)
+    
     # Log the user in
     login_user(user)
     flash("Successfully connected to Strava!", "success")
@@ -1,7 +1,15 @@
+import hmac
 from datetime import datetime
-from flask import render_template, current_app
+from flask import render_template, current_app, jsonify, Response, request, abort
+from sqlalchemy import func
 from . import main_bp
 from services.strava import get_authorization_url
+from services.queue import queue_depth
+from services.strava_client import get_client
+from services.metrics import registry
+from services.tracing import get_slow_traces
+from models import db
+from models.backfill_run import BackfillRun
 
 @main_bp.route('/')
 def index():
@@ -10,4 +18,61 @@ def index():
     return render_template('index.html', 
                            auth_url=auth_url,
                            client_id=current_app.config['STRAVA_CLIENT_ID'],
-                           current_year=datetime.now().year)
\ No newline at end of file
+                           current_year=datetime.now().year)
+
+@main_bp.route('/status')
+def status():
+    """Health check with background job queue depth and Strava usage"""
+    from services.stream_cache import get_stream_cache
+    
+    client = get_client()
+    cache = get_stream_cache()
+    return jsonify({
+        'queue': queue_depth(),
+        'strava': client.latency_stats(),
+        'rate_limit': client.governor.status() if client.governor else None,
+        'stream_cache': cache.stats() if cache else None
+    })
+
+@main_bp.route('/metrics')
+def metrics():
+    """Prometheus metrics for all worker processes"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@main_bp.route('/admin/traces')
+def slow_traces():
+    """Slowest recent event traces of all worker processes, with per-stage timings"""
+    admin_token = current_app.config['ADMIN_TOKEN']
+    given = request.headers.get('X-Admin-Token') or request.args.get('token') or ''
+    if not admin_token or not hmac.compare_digest(given, admin_token):
+        abort(404)
+    
+    return jsonify({'traces': get_slow_traces().slowest()})
+
+@registry.collector
+def _queue_gauges():
+    """Job queue and backfill depth, read from the database at scrape time"""
+    backfills = dict(db.session.query(BackfillRun.status, func.count(BackfillRun.id))
+                     .filter(BackfillRun.status.in_(['queued', 'running']))
+                     .group_by(BackfillRun.status).all())
+    return [
+        ('job_queue_depth', 'Background jobs by status',
+         [({'status': status}, count) for status, count in queue_depth().items()]),
+        ('backfill_runs_active', 'Historic backfills queued or running',
+         [({'status': status}, backfills.get(status, 0)) for status in ('queued', 'running')])
+    ]
+
+@registry.collector
+def _rate_limit_gauges():
+    """Strava rate limit usage, as last reported in the X-RateLimit-* headers"""
+    governor = get_client().governor
+    if not governor:
+        return []
+    status = governor.status()
+    return [
+        ('strava_rate_limit_usage', 'Strava API calls used in the current window',
+         [({'window': 'short'}, status['short_usage']), ({'window': 'daily'}, status['long_usage'])]),
+        ('strava_rate_limit_limit', 'Strava API call limit for the window',
+         [({'window': 'short'}, status['short_limit']), ({'window': 'daily'}, status['long_limit'])])
+    ]
+
@@ -1,31 +1,41 @@
-from flask import render_template, request, flash, redirect, url_for
+from flask import render_template, request, flash, redirect, url_for, jsonify
 from flask_login import login_required, current_user
 from . import user_bp
 from models import db
 from models.activity_log import ActivityLog
-from services.activity import process_historic_activities
+from models.backfill_run import BackfillRun
+from services.activity import start_historic_backfill
+from services.rollups import dashboard_stats
 
 @user_bp.route('/dashboard')
 @login_required
 def dashboard():
     """User dashboard with stats and settings"""
     # Get recent activity logs
-    recent_logs = ActivityLog.query.filter_by(user_id=current_user.id)\
-                                .order_by(ActivityLog.processed_at.desc())\
-                                .limit(10).all()
+    recent_logs = ActivityLog.recent_for_user(current_user.id).all()
     
     # Calculate stats
     total_processed = current_user.activities_processed
     total_hidden = current_user.activities_hidden
     hide_percentage = (total_hidden / total_processed * 100) if total_processed > 0 else 0
     
+    # Time-series stats from the daily rollups
+    stats = dashboard_stats(current_user.id)
+    
+    # Latest historic backfill, if any
+    backfill = BackfillRun.query.filter_by(user_id=current_user.id)\
+                                .order_by(BackfillRun.id.desc())\
+                                .first()
+    
     return render_template(
         'dashboard.html',
         user=current_user,
         recent_logs=recent_logs,
         total_processed=total_processed,
         total_hidden=total_hidden,
-        hide_percentage=hide_percentage
+        hide_percentage=hide_percentage,
+        backfill=backfill,
+        stats=stats
     )
 
 @user_bp.route('/settings', methods=['GET', 'POST'])
@@ -45,14 +55,70 @@ def settings():
         
     return render_template('settings.html', user=current_user)
 
+@user_bp.route('/simulate')
+@login_required
+def simulate():
+    """Preview how many past activities other thresholds would hide, without calling Strava.
+
+    Thresholds (in seconds) default to the current settings. A sweep over many
+    candidates for one type can be requested with `sweep_type` and either
+    `sweep` (comma-separated values) or `sweep_start`/`sweep_stop`/`sweep_step`.
+    """
+    # Imported here so pandas stays out of process start-up
+    from services.simulator import THRESHOLD_FIELDS, load_history, simulate_thresholds, sweep_threshold
+    
+    try:
+        thresholds = {
+            activity_type: int(request.args.get(field, getattr(current_user, field)))
+            for activity_type, field in THRESHOLD_FIELDS.items()
+        }
+        
+        sweep_type = request.args.get('sweep_type')
+        if request.args.get('sweep'):
+            candidates = [int(value) for value in request.args['sweep'].split(',')]
+        elif request.args.get('sweep_stop'):
+            candidates = list(range(int(request.args.get('sweep_start', 0)),
+                                    int(request.args['sweep_stop']),
+                                    max(1, int(request.args.get('sweep_step', 60)))))[:10000]
+        else:
+            candidates = []
+    except ValueError:
+        return jsonify({'error': 'Thresholds must be whole numbers of seconds'}), 400
+    
+    history = load_history(current_user.id)
+    result = {
+        'thresholds': thresholds,
+        'by_type': simulate_thresholds(history, thresholds)
+    }
+    if sweep_type and candidates:
+        result['sweep'] = {
+            'activity_type': sweep_type,
+            'results': sweep_threshold(history, sweep_type, candidates)
+        }
+    
+    return jsonify(result)
+
 @user_bp.route('/process-historic-activities', methods=['POST'])
 @login_required
 def process_historic():
-    """Process all historic activities for the current user"""
+    """Start processing all historic activities for the current user in the background"""
     try:
-        result = process_historic_activities(current_user)
-        flash(f"Processed {result['processed']} activities. {result['hidden']} were hidden from your feed.", 'success')
+        full_resync = request.form.get('full_resync') == '1'
+        run, started = start_historic_backfill(current_user, full_resync=full_resync)
+        if started:
+            flash("Processing your historic activities in the background. Progress is shown below.", 'success')
+        else:
+            flash("Your historic activities are already being processed.", 'info')
     except Exception as e:
         flash(f"Error processing activities: {str(e)}", 'danger')
     
     return redirect(url_for('user.dashboard'))
+
+@user_bp.route('/process-historic-activities/status')
+@login_required
+def historic_status():
+    """Progress of the current user's latest historic backfill"""
+    run = BackfillRun.query.filter_by(user_id=current_user.id)\
+                           .order_by(BackfillRun.id.desc())\
+                           .first()
+    return jsonify(run.to_dict() if run else None)
@@ -1,7 +1,9 @@
 from flask import request, jsonify, current_app
 from . import webhook_bp
 from models.user import User
-from services.activity import process_activity
+from services.queue import enqueue
+from services.dedup import recent_webhook_events, webhook_event_key
+from services.metrics import webhook_events
 
 @webhook_bp.route('/', methods=['GET'])
 def validate():
@@ -31,12 +33,29 @@ def event():
         activity_id = data['object_id']
         strava_user_id = data['owner_id']
         
-        # Find the user
-        user = User.query.filter_by(strava_id=strava_user_id).first()
+        # Strava redelivers events it thinks we missed; acknowledge repeats straight away
+        event_key = webhook_event_key(strava_user_id, activity_id)
+        if event_key in recent_webhook_events:
+            webhook_events.inc(outcome='duplicate')
+            return '', 200
+        
+        # Find the user (usually without a query)
+        user = User.get_snapshot(strava_id=strava_user_id)
         
         if user:
-            process_activity(activity_id, user)
+            # Hand off to the job queue so Strava gets its 200 straight away
+            job = enqueue('process_activity', {'activity_id': activity_id, 'user_id': user.id}, dedup_key=event_key)
+            if job is None:
+                webhook_events.inc(outcome='duplicate')
+                print(f"Duplicate event for activity {activity_id} ignored")
+            else:
+                webhook_events.inc(outcome='queued')
         else:
+            webhook_events.inc(outcome='unknown_user')
             print(f"User with Strava ID {strava_user_id} not found")
+        
+        recent_webhook_events.add(event_key)
+    else:
+        webhook_events.inc(outcome='ignored')
     
     return '', 200
\ No newline at end of file
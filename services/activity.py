@@ -1,8 +1,20 @@
-from datetime import datetime
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
 from models import db
 from models.activity_log import ActivityLog
-from services.strava import hide_activity_from_feed, get_activity, get_athlete_activities, get_activity_streams, update_activity_title
-from services.title_generator import generate_title_for_activity
+from models.user import User
+from models.backfill_run import BackfillRun
+from services.strava import ActivityUpdate, get_activity, get_athlete_activities, get_activity_streams, parse_strava_datetime
+from services.queue import job_handler, async_job_handler, enqueue, hand_off_completion, touch_job
+from services.rate_limit import rate_limit_priority, BACKFILL, RateLimitExceeded
+from services.activity_log_writer import log_activities, get_batcher
+from services.tracing import trace, span
+from services.hr_zones import heart_rate_zones
+from services.dedup import recent_webhook_events, webhook_event_key
 
 def should_hide_from_feed(activity, user):
     """Determine if activity should be hidden based on type and duration"""
@@ -21,7 +33,8 @@ def should_hide_from_feed(activity, user):
 def process_activity(activity_id, user, generate_title=True):
     """Process an activity for a user"""
     # Get fresh access token
-    access_token = user.get_valid_token()
+    with span('token'):
+        access_token = user.get_valid_token()
     
     # Get activity details
     activity = get_activity(activity_id, access_token)
@@ -30,111 +43,434 @@ def process_activity(activity_id, user, generate_title=True):
         print(f"Failed to fetch activity {activity_id} for user {user.id}")
         return False
     
-    was_hidden = False
-    # Check if we should hide this activity
-    if should_hide_from_feed(activity, user):
-        was_hidden = hide_activity_from_feed(activity_id, access_token)
-        print(f"Activity {activity_id} for user {user.id} hidden: {was_hidden}")
+    result = apply_activity_rules(activity_id, activity, user, access_token, generate_title)
+    
+    if result['should_hide']:
+        print(f"Activity {activity_id} for user {user.id} hidden: {result['hidden']}")
     else:
         print(f"Activity {activity_id} for user {user.id} does not need to be hidden")
     
-    # Generate and update title if requested
-    if generate_title:
-        generate_and_update_title(activity_id, activity, access_token)
-    
     # Log the processing
-    log_activity_process(user, activity, was_hidden)
+    with span('log_activity'):
+        log_activity_process(user, activity, result['hidden'])
     
-    return was_hidden
+    return result['hidden']
 
-def generate_and_update_title(activity_id, activity, access_token):
-    """Generate and update the title for an activity"""
-    try:
-        # Get activity streams (detailed data)
-        streams = get_activity_streams(activity_id, access_token)
+def apply_activity_rules(activity_id, activity, user, access_token, generate_title=True):
+    """Hide and/or retitle an activity, sending at most one update to Strava"""
+    # Generate a new title if requested, against the athlete's own heart rate zones when known
+    title = generate_activity_title(activity_id, activity, access_token, heart_rate_zones(user)) if generate_title else None
+    return commit_activity_rules(activity_id, activity, user, access_token, title)
+
+def commit_activity_rules(activity_id, activity, user, access_token, title=None):
+    """Send the hide flag and the (already generated) title in a single update"""
+    update = ActivityUpdate(activity_id, activity)
+    
+    # Check if we should hide this activity
+    should_hide = should_hide_from_feed(activity, user)
+    if should_hide:
+        update.hide_from_feed()
+    
+    if title:
+        update.rename(title)
+    
+    if update.changes:
+        with span('update_activity'):
+            success = update.commit(access_token)
+        if title:
+            print(f"{'Updated' if success else 'Failed to update'} title for activity {activity_id}: {title}")
+    else:
+        success = True
+        print(f"Activity {activity_id} is already up to date")
+    
+    return {
+        'should_hide': should_hide,
+        'hidden': should_hide and success,
+        'titled': bool(title) and success,
+        'updated': success
+    }
+
+def _user_for_job(activity_id, user_id):
+    """The user a process_activity job is for, or None if there is nothing to do"""
+    # Thresholds and a fresh token come from the user cache
+    user = User.get_snapshot(user_id=user_id)
+    if not user:
+        print(f"User {user_id} no longer exists, skipping activity {activity_id}")
+        return None
+    
+    # A retried job may already have got as far as logging the activity
+    if ActivityLog.query.filter_by(user_id=user_id, strava_activity_id=activity_id).first():
+        print(f"Activity {activity_id} for user {user_id} was already processed")
+        return None
+    
+    return user
+
+def _activity_failed(activity_id, user_id, generate_title=True):
+    """Let a later delivery of the webhook event through once its job has failed for good"""
+    user = User.get_snapshot(user_id=user_id)
+    if user:
+        recent_webhook_events.discard(webhook_event_key(user.strava_id, activity_id))
+
+@job_handler('process_activity', on_failure=_activity_failed)
+def process_activity_job(activity_id, user_id, generate_title=True):
+    """Job queue entry point for processing a webhook activity"""
+    user = _user_for_job(activity_id, user_id)
+    if not user:
+        return
+    
+    with trace('process_activity', activity_id=activity_id, user_id=user_id):
+        process_activity(activity_id, user, generate_title=generate_title)
+
+@async_job_handler('process_activity')
+async def process_activity_async(worker, activity_id, user_id, generate_title=True):
+    """Coroutine version of process_activity_job for the asyncio worker.
+
+    The activity and its streams are fetched concurrently on the worker's
+    I/O threads and the title analytics run on its CPU executor, so the
+    event only holds a slot of the event loop while it waits.
+    """
+    with trace('process_activity', activity_id=activity_id, user_id=user_id):
+        def load_user():
+            user = _user_for_job(activity_id, user_id)
+            if not user:
+                return None, None, None
+            hr_zones = heart_rate_zones(user) if generate_title else None
+            with span('token'):
+                return user, user.get_valid_token(), hr_zones
         
-        if not streams:
-            print(f"Failed to fetch streams for activity {activity_id}")
+        user, access_token, hr_zones = await worker.run_db(load_user)
+        if not user:
             return False
         
-        # Generate a descriptive title
-        new_title = generate_title_for_activity(activity, streams)
+        from services.title_generator import stream_request
+        
+        # The summary is not known yet, so ask for what the enabled analyzers could need
+        analyzers = current_app.config['TITLE_ANALYZERS']
+        keys, resolution = stream_request(enabled=analyzers) if generate_title else ([], None)
+        
+        fetches = [worker.run_io(get_activity, activity_id, access_token)]
+        if keys:
+            fetches.append(worker.run_io(_fetch_streams, activity_id, access_token, keys, resolution))
+        activity, *streams = await asyncio.gather(*fetches)
+        
+        if not activity:
+            print(f"Failed to fetch activity {activity_id} for user {user.id}")
+            return False
         
-        # Update the activity title
-        success = update_activity_title(activity_id, access_token, new_title)
+        title = None
+        if keys and stream_request(activity, analyzers)[0]:
+            if streams[0]:
+                title = await worker.run_cpu(_title_analytics, activity_id, activity, streams[0], analyzers, hr_zones)
+            else:
+                print(f"Failed to fetch streams for activity {activity_id}")
         
-        if success:
-            print(f"Updated title for activity {activity_id}: {new_title}")
+        result = await worker.run_io(commit_activity_rules, activity_id, activity, user, access_token, title)
+        
+        if result['should_hide']:
+            print(f"Activity {activity_id} for user {user.id} hidden: {result['hidden']}")
         else:
-            print(f"Failed to update title for activity {activity_id}")
-            
-        return success
+            print(f"Activity {activity_id} for user {user.id} does not need to be hidden")
+        
+        with span('log_activity'):
+            await worker.run_db(log_activity_process, user, activity, result['hidden'])
+        
+        return result['hidden']
+
+def _fetch_streams(activity_id, access_token, keys, resolution):
+    with span('get_activity_streams'):
+        try:
+            return get_activity_streams(activity_id, access_token, keys, resolution)
+        except RateLimitExceeded:
+            # Let the job be retried once the budget is back
+            raise
+        except Exception as e:
+            print(f"Error fetching streams for activity {activity_id}: {str(e)}")
+            return None
+
+def _title_analytics(activity_id, activity, streams, analyzers, hr_zones=None):
+    from services.title_generator import generate_title_for_activity
+    
+    with span('title_analytics'):
+        try:
+            return generate_title_for_activity(activity, streams, analyzers, hr_zones)
+        except Exception as e:
+            print(f"Error generating title for activity {activity_id}: {str(e)}")
+            return None
+
+def generate_activity_title(activity_id, activity, access_token, hr_zones=None):
+    """Generate a descriptive title for an activity, or None if it cannot be generated.
+
+    `hr_zones` are the athlete's heart rate zone edges (see services.hr_zones).
+    """
+    try:
+        # Deferred so numpy is imported on the first title, not at start-up
+        from services.title_generator import generate_title_for_activity, stream_request
+        
+        # Only fetch the streams (and resolution) the analyzers need for this activity
+        analyzers = current_app.config['TITLE_ANALYZERS']
+        keys, resolution = stream_request(activity, analyzers)
+        if not keys:
+            print(f"No title analyzer applies to activity {activity_id}")
+            return None
+        
+        # Get activity streams (detailed data)
+        with span('get_activity_streams'):
+            streams = get_activity_streams(activity_id, access_token, keys, resolution)
+        
+        if not streams:
+            print(f"Failed to fetch streams for activity {activity_id}")
+            return None
+        
+        with span('title_analytics'):
+            return generate_title_for_activity(activity, streams, analyzers, hr_zones)
+    except RateLimitExceeded:
+        # Retry the whole activity later rather than logging it untitled
+        raise
     except Exception as e:
-        print(f"Error generating/updating title for activity {activity_id}: {str(e)}")
-        return False
+        print(f"Error generating title for activity {activity_id}: {str(e)}")
+        return None
 
 def log_activity_process(user, activity, was_hidden):
-    """Log the activity processing for auditing"""
-    log = ActivityLog(
-        user_id=user.id,
-        strava_activity_id=activity['id'],
-        activity_type=activity.get('type', 'Unknown'),
-        activity_name=activity.get('name', 'Unnamed Activity'),
-        elapsed_time=activity.get('elapsed_time', 0),
-        distance=activity.get('distance', 0),
-        was_hidden=was_hidden
-    )
-    
-    # Update user statistics
-    user.activities_processed += 1
-    if was_hidden:
-        user.activities_hidden += 1
-    user.last_activity_date = datetime.utcnow()
-    
-    db.session.add(log)
-    db.session.commit()
+    """Log the activity processing for auditing.
+
+    Each activity is logged once per user; reprocessing it updates the
+    existing row. With ACTIVITY_LOG_COMMIT_WINDOW set, the write is grouped
+    with other live events into one commit, which also marks the calling
+    job done.
+    """
+    batcher = get_batcher()
+    if batcher:
+        batcher.add(user.id, activity, was_hidden, hand_off_completion())
+        return
+    
+    try:
+        log_activities(user.id, [(activity, was_hidden)])
+    except IntegrityError:
+        # Another worker logged the same activity concurrently, update its row instead
+        db.session.rollback()
+        log_activities(user.id, [(activity, was_hidden)])
 
-def process_historic_activities(user, max_pages=5, generate_titles=True):
-    """Process all historic activities for a user"""
+def process_historic_activities(user, max_pages=None, generate_titles=True, run=None, full_resync=False):
+    """Process all historic activities for a user.
+
+    Only activities that started after the user's sync watermark are fetched
+    (oldest first), unless `full_resync` is set, and activities that are
+    already logged are skipped before any detail call. Pages are fetched 200
+    at a time (prefetching the next page) and the activities on a page are
+    processed concurrently. The watermark - and the BackfillRun cursor, when a
+    run is given - advances after every page, so an interrupted run resumes
+    where it stopped.
+    """
+    # Backfills leave rate limit headroom for live webhook events
+    with rate_limit_priority(BACKFILL):
+        return _process_historic_activities(user, max_pages, generate_titles, run, full_resync)
+
+def _process_historic_activities(user, max_pages, generate_titles, run, full_resync):
+    app = current_app._get_current_object()
+    per_page = app.config['BACKFILL_PAGE_SIZE']
+    chunk_size = app.config['BACKFILL_CHECKPOINT_SIZE']
     access_token = user.get_valid_token()
-    processed_count = 0
-    hidden_count = 0
-    titled_count = 0
+    settings = user.snapshot()
+    
+    if run:
+        full_resync = run.full_resync
+        cursor = run.cursor if (run.cursor or full_resync) else user.sync_after
+    else:
+        cursor = None if full_resync else user.sync_after
+    
+    # Strava only sorts oldest-first when `after` is given; step back a second
+    # so activities sharing the watermark's start time are not missed
+    after = cursor - timedelta(seconds=1) if cursor else datetime(1970, 1, 1)
     
-    # Fetch activities page by page
-    for page in range(1, max_pages + 1):
-        activities = get_athlete_activities(access_token, page=page)
+    totals = {'processed': 0, 'hidden': 0, 'titled': 0}
+    page = 1
+    stalled = False
+    
+    with ThreadPoolExecutor(max_workers=app.config['BACKFILL_CONCURRENCY']) as executor:
+        next_page = _submit(executor, app, get_athlete_activities, access_token, page, per_page, after)
         
-        # If no activities or API error, break the loop
-        if not activities or len(activities) == 0:
-            break
+        while max_pages is None or page <= max_pages:
+            activities = next_page.result()
+            if activities is None:
+                raise RuntimeError(f"Failed to fetch page {page} of activities for user {user.id}")
+            if not activities:
+                break
+            
+            # Prefetch the following page while this one is processed
+            has_more = len(activities) == per_page
+            if has_more:
+                next_page = _submit(executor, app, get_athlete_activities, access_token, page + 1, per_page, after)
             
-        # Process each activity
-        for activity in activities:
-            activity_id = activity['id']
-            # Get full activity details
-            full_activity = get_activity(activity_id, access_token)
+            # Skip activities that were already processed
+            logged = set() if full_resync else _logged_activity_ids(user.id, [activity['id'] for activity in activities])
             
-            if full_activity:
-                # Check if we should hide this activity
-                if should_hide_from_feed(full_activity, user):
-                    was_hidden = hide_activity_from_feed(activity_id, access_token)
-                    if was_hidden:
-                        hidden_count += 1
-                else:
-                    was_hidden = False
+            # A page can need more calls than one rate limit window allows, so
+            # log and checkpoint every few activities rather than once a page
+            for start in range(0, len(activities), chunk_size):
+                chunk = activities[start:start + chunk_size]
+                is_last = start + chunk_size >= len(activities)
+                
+                # Fetch and update activities concurrently, log them from this thread
+                futures = [
+                    _submit(executor, app, _backfill_activity, activity['id'], settings, access_token, generate_titles)
+                    for activity in chunk if activity['id'] not in logged
+                ]
+                results, error = _collect(futures)
                 
-                # Generate and update title if requested
-                if generate_titles:
-                    if generate_and_update_title(activity_id, full_activity, access_token):
-                        titled_count += 1
+                entries = []
+                for full_activity, result in results:
+                    # Activities that could not be fetched or whose hide flag
+                    # or title failed to save stay unlogged, so the watermark
+                    # stops before them and the next sync tries them again
+                    if not full_activity or not result['updated']:
+                        continue
+                    
+                    entries.append((full_activity, result['hidden']))
+                    totals['processed'] += 1
+                    totals['hidden'] += int(result['hidden'])
+                    totals['titled'] += int(result['titled'])
                 
-                # Log the processing
-                log_activity_process(user, full_activity, was_hidden)
-                processed_count += 1
+                # Log the chunk in the same transaction as the checkpoint
+                log_activities(user.id, entries, commit=False)
+                
+                # Pages come oldest first, so the watermark only moves up to the
+                # first activity that failed or was cut short; the next sync
+                # tries it again and skips the ones after it that are logged
+                handled = logged | {full_activity['id'] for full_activity, _ in entries}
+                chunk_latest, complete = _handled_until(chunk, handled) if not stalled else (None, False)
+                stalled = stalled or not complete
+                _checkpoint(user, run, chunk_latest, totals, page_done=is_last and error is None)
+                if run:
+                    totals = {'processed': 0, 'hidden': 0, 'titled': 0}
+                
+                if error is not None:
+                    raise error
+            
+            page += 1
+            if not has_more:
+                break
     
-    return {
-        'processed': processed_count,
-        'hidden': hidden_count,
-        'titled': titled_count
-    }
+    if run:
+        return {'processed': run.processed, 'hidden': run.hidden, 'titled': run.titled}
+    return totals
+
+def _logged_activity_ids(user_id, activity_ids):
+    """The subset of `activity_ids` already recorded in the user's activity log"""
+    if not activity_ids:
+        return set()
+    rows = db.session.query(ActivityLog.strava_activity_id)\
+                     .filter(ActivityLog.user_id == user_id,
+                             ActivityLog.strava_activity_id.in_(activity_ids))\
+                     .all()
+    return {row[0] for row in rows}
+
+def _handled_until(activities, handled):
+    """Latest start date among `activities` before the first one not in `handled`, and whether all were"""
+    latest = None
+    for activity in activities:
+        if activity['id'] not in handled:
+            return latest, False
+        start_date = parse_strava_datetime(activity.get('start_date'))
+        if start_date and (latest is None or start_date > latest):
+            latest = start_date
+    return latest, True
+
+def _collect(futures):
+    """Results of `futures` in order and the first error raised, if any.
+
+    After an error, futures that have not started are cancelled, but running
+    ones are still waited for so their updates to Strava get logged.
+    """
+    results, error = [], None
+    for future in futures:
+        if error is not None and future.cancel():
+            continue
+        try:
+            results.append(future.result())
+        except Exception as e:
+            error = error or e
+    return results, error
+
+def _submit(executor, app, func, *args):
+    """Run `func` on the executor inside an app context and the caller's context variables"""
+    context = contextvars.copy_context()
+    
+    def call():
+        with app.app_context():
+            return func(*args)
+    
+    return executor.submit(context.run, call)
+
+def _backfill_activity(activity_id, settings, access_token, generate_titles):
+    """Fetch and update one historic activity (runs on a backfill thread)"""
+    full_activity = get_activity(activity_id, access_token)
+    if not full_activity:
+        return None, None
+    
+    result = apply_activity_rules(activity_id, full_activity, settings, access_token, generate_titles)
+    return full_activity, result
+
+def _checkpoint(user, run, latest, totals, page_done=True):
+    """Advance the sync watermark (and the run's progress) after a chunk of a page"""
+    if latest and (not user.sync_after or latest > user.sync_after):
+        user.sync_after = latest
+    
+    if run:
+        if latest and (not run.cursor or latest > run.cursor):
+            run.cursor = latest
+        run.pages_done += int(page_done)
+        run.processed += totals['processed']
+        run.hidden += totals['hidden']
+        run.titled += totals['titled']
+    
+    # Keep the job's lock fresh so a long backfill is not recovered and run twice
+    touch_job()
+    db.session.commit()
+
+def start_historic_backfill(user, generate_titles=True, full_resync=False):
+    """Queue a background backfill for a user, unless one is already in progress"""
+    run = BackfillRun.query.filter_by(user_id=user.id)\
+                           .filter(BackfillRun.status.in_(('queued', 'running')))\
+                           .first()
+    if run:
+        return run, False
+    
+    run = BackfillRun(user_id=user.id, status='queued', full_resync=full_resync)
+    db.session.add(run)
+    db.session.commit()
+    enqueue('historic_backfill', {'run_id': run.id, 'generate_titles': generate_titles})
+    return run, True
+
+def _backfill_failed(run_id, generate_titles=True):
+    """Mark a backfill as failed once its job has run out of retries"""
+    run = db.session.get(BackfillRun, run_id)
+    if run:
+        run.status = 'failed'
+        run.finished_at = datetime.utcnow()
+
+@job_handler('historic_backfill', on_failure=_backfill_failed)
+def historic_backfill_job(run_id, generate_titles=True):
+    """Job queue entry point for a historic backfill"""
+    run = db.session.get(BackfillRun, run_id)
+    user = db.session.get(User, run.user_id) if run else None
+    if not user:
+        return
+    
+    run.status = 'running'
+    run.error = None
+    db.session.commit()
+    
+    try:
+        process_historic_activities(user, generate_titles=generate_titles, run=run)
+    except Exception as e:
+        # The job will be retried and resume from the last checkpoint
+        db.session.rollback()
+        run = db.session.get(BackfillRun, run_id)
+        run.status = 'queued'
+        run.error = str(e)
+        db.session.commit()
+        raise
+    
+    run.status = 'done'
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
@@ -0,0 +1,207 @@
+import atexit
+import threading
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from models import db
+from models.activity_log import ActivityLog
+from models.user import User
+from services.metrics import jobs_processed
+from services.queue import complete_jobs, finish_job
+from services.strava import parse_strava_datetime
+from services.rollups import add_rollup_delta, apply_rollup_deltas, rollup_key
+
+def _log_fields(activity, was_hidden):
+    return dict(
+        activity_type=activity.get('type', 'Unknown'),
+        activity_name=activity.get('name', 'Unnamed Activity'),
+        elapsed_time=activity.get('elapsed_time', 0),
+        distance=activity.get('distance', 0),
+        start_date=parse_strava_datetime(activity.get('start_date')),
+        was_hidden=was_hidden
+    )
+
+def log_activities(user_id, entries, commit=True):
+    """Log a batch of processed activities for one user in a single transaction.
+
+    `entries` is a list of (activity, was_hidden) pairs. Activities that are
+    already logged are updated in place; new ones are bulk inserted. The user's
+    counters are adjusted with one atomic UPDATE so concurrent workers cannot
+    lose increments, and the daily rollups are updated by the same deltas.
+    Returns the number of new rows.
+    """
+    if not entries:
+        return 0
+    
+    # Later entries for the same activity win
+    latest = {activity['id']: (activity, was_hidden) for activity, was_hidden in entries}
+    now = datetime.utcnow()
+    
+    existing = {log.strava_activity_id: log for log in ActivityLog.query.filter(
+        ActivityLog.user_id == user_id,
+        ActivityLog.strava_activity_id.in_(list(latest))
+    )}
+    
+    new_rows = []
+    hidden_change = 0
+    rollup_deltas = {}
+    for activity_id, (activity, was_hidden) in latest.items():
+        fields = _log_fields(activity, was_hidden)
+        log = existing.get(activity_id)
+        if log:
+            hidden_change += int(was_hidden) - int(bool(log.was_hidden))
+            add_rollup_delta(rollup_deltas, rollup_key(log.start_date, log.activity_type, log.processed_at),
+                             -1, log.was_hidden, log.distance, log.elapsed_time)
+            for field, value in fields.items():
+                setattr(log, field, value)
+            log.processed_at = now
+        else:
+            hidden_change += int(was_hidden)
+            new_rows.append(dict(fields, user_id=user_id, strava_activity_id=activity_id, processed_at=now))
+        
+        add_rollup_delta(rollup_deltas, rollup_key(fields['start_date'], fields['activity_type'], now),
+                         1, was_hidden, fields['distance'], fields['elapsed_time'])
+    
+    if new_rows:
+        db.session.execute(insert(ActivityLog), new_rows)
+    
+    # Keep the dashboard's daily rollups in step
+    apply_rollup_deltas(user_id, rollup_deltas)
+    
+    # Update user statistics atomically
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            activities_processed=User.activities_processed + len(new_rows),
+            activities_hidden=User.activities_hidden + hidden_change,
+            last_activity_date=now
+        )
+        .execution_options(synchronize_session=False)
+    )
+    
+    if commit:
+        db.session.commit()
+    return len(new_rows)
+
+class ActivityLogBatcher:
+    """Groups live activity log writes and commits them together.
+
+    Entries are buffered for up to `window` seconds (or until `max_batch`
+    accumulate) and written in one transaction, so concurrent events share a
+    single commit instead of paying for one each. The jobs that produced
+    them are marked done in that same transaction, and retried if it fails.
+    """
+    
+    def __init__(self, app, window, max_batch=100):
+        self.app = app
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+    
+    def add(self, user_id, activity, was_hidden, claim=None):
+        with self._lock:
+            self._pending.append((user_id, activity, was_hidden, claim))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='activity-log-batcher', daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.max_batch:
+                self._wakeup.set()
+    
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.window)
+            self._wakeup.clear()
+            self.flush()
+    
+    def flush(self):
+        """Write all buffered entries in one transaction"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        
+        by_user = {}
+        claims = {}
+        for user_id, activity, was_hidden, claim in batch:
+            by_user.setdefault(user_id, []).append((activity, was_hidden))
+            if claim is not None:
+                claims.setdefault(user_id, []).append(claim)
+        
+        with self.app.app_context():
+            try:
+                for user_id, entries in by_user.items():
+                    log_activities(user_id, entries, commit=False)
+                kinds = complete_jobs([claim for user_claims in claims.values() for claim in user_claims])
+                db.session.commit()
+                _count_done(kinds)
+            except IntegrityError:
+                # A concurrent writer got there first; fall back to one transaction per user
+                db.session.rollback()
+                for user_id, entries in by_user.items():
+                    _log_safely(user_id, entries, claims.get(user_id, []))
+            except Exception as e:
+                db.session.rollback()
+                print(f"Failed to write {len(batch)} activity logs: {str(e)}")
+                _retry_jobs([claim for user_claims in claims.values() for claim in user_claims], e)
+            finally:
+                db.session.remove()
+
+def _log_user(user_id, entries, claims):
+    log_activities(user_id, entries, commit=False)
+    kinds = complete_jobs(claims)
+    db.session.commit()
+    _count_done(kinds)
+
+def _log_safely(user_id, entries, claims):
+    try:
+        _log_user(user_id, entries, claims)
+    except IntegrityError:
+        db.session.rollback()
+        try:
+            _log_user(user_id, entries, claims)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Failed to write activity logs for user {user_id}: {str(e)}")
+            _retry_jobs(claims, e)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Failed to write activity logs for user {user_id}: {str(e)}")
+        _retry_jobs(claims, e)
+
+def _count_done(kinds):
+    for kind in kinds:
+        jobs_processed.inc(kind=kind, result='done')
+
+def _retry_jobs(claims, error):
+    """Put jobs whose activity logs were not written back in the queue"""
+    for job_id, worker_id in claims:
+        try:
+            finish_job(job_id, error, worker_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Could not reschedule job {job_id}: {str(e)}")
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    """Return the process-wide log batcher, or None if group commit is disabled"""
+    global _batcher
+    window = current_app.config['ACTIVITY_LOG_COMMIT_WINDOW']
+    if window <= 0:
+        return None
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = ActivityLogBatcher(
+                    current_app._get_current_object(),
+                    window,
+                    max_batch=current_app.config['ACTIVITY_LOG_MAX_BATCH']
+                )
+    return _batcher
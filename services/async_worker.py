@@ -0,0 +1,134 @@
+import asyncio
+import contextvars
+import json
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from models import db
+from models.job import Job
+from services.queue import claim_next, finish_job, get_async_handler, maybe_prune_jobs, recover_stale_jobs, run_job, running_job
+
+class AsyncWorker:
+    """Runs queued jobs as coroutines on one event loop, many in flight at once.
+    
+    Strava calls and database work still use blocking clients, so they are
+    handed to a pool of I/O threads (each DB call in its own app context and
+    session); title analytics go to a separate CPU executor. Job kinds without
+    a coroutine handler run their sync handler on an I/O thread.
+    """
+    
+    def __init__(self, app, max_in_flight=None, io_threads=None, cpu_threads=None, worker_id=None):
+        config = app.config
+        self.app = app
+        self.max_in_flight = max_in_flight or config['ASYNC_MAX_IN_FLIGHT']
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:async"
+        self.io_executor = ThreadPoolExecutor(io_threads or config['ASYNC_IO_THREADS'], thread_name_prefix='async-io')
+        self.cpu_executor = ThreadPoolExecutor(cpu_threads or config['ASYNC_CPU_THREADS'], thread_name_prefix='async-cpu')
+    
+    def _submit(self, executor, func, *args):
+        # Executors do not carry context variables over (tracing, rate limit priority)
+        context = contextvars.copy_context()
+        return asyncio.get_running_loop().run_in_executor(executor, context.run, func, *args)
+    
+    def run_io(self, func, *args):
+        """Run a blocking network call on an I/O thread"""
+        return self._submit(self.io_executor, func, *args)
+    
+    def run_cpu(self, func, *args):
+        """Run CPU-bound work off the event loop"""
+        return self._submit(self.cpu_executor, func, *args)
+    
+    def run_db(self, func, *args):
+        """Run database work on an I/O thread, in a fresh app context and session"""
+        return self._submit(self.io_executor, self._in_app_context, func, *args)
+    
+    def _in_app_context(self, func, *args):
+        with self.app.app_context():
+            try:
+                return func(*args)
+            finally:
+                db.session.remove()
+    
+    def _claim(self):
+        job = claim_next(self.worker_id)
+        if job is None:
+            return None
+        return job.id, job.kind, json.loads(job.payload)
+    
+    def _run_sync(self, job_id):
+        return run_job(db.session.get(Job, job_id))
+    
+    async def _run_job(self, job_id, kind, payload):
+        handler = get_async_handler(kind)
+        try:
+            if handler is None:
+                await self.run_db(self._run_sync, job_id)
+                return
+            
+            with running_job(job_id, self.worker_id) as running:
+                try:
+                    await handler(self, **payload)
+                except Exception as e:
+                    await self.run_db(finish_job, job_id, e, self.worker_id)
+                    return
+            
+            # A handed-off job is marked done by whoever commits its work
+            if not running['handed_off']:
+                await self.run_db(finish_job, job_id, None, self.worker_id)
+        except Exception as e:
+            # Left locked; recover_stale_jobs picks it up again
+            print(f"Worker {self.worker_id} could not record job {job_id}: {str(e)}")
+    
+    async def run(self, stop_event=None, burst=False):
+        """Claim and run jobs until stopped (or until the queue is empty in burst mode)"""
+        poll_interval = self.app.config['JOB_POLL_INTERVAL']
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        
+        def finished(task):
+            tasks.discard(task)
+            slots.release()
+        
+        await self.run_db(recover_stale_jobs)
+        
+        while not (stop_event and stop_event.is_set()):
+            await slots.acquire()
+            try:
+                claimed = await self.run_db(self._claim)
+            except Exception as e:
+                print(f"Worker {self.worker_id} error: {str(e)}")
+                claimed = None
+            
+            if claimed is None:
+                slots.release()
+                if burst and not tasks:
+                    break
+                await self.run_db(maybe_prune_jobs)
+                await asyncio.sleep(poll_interval)
+                continue
+            
+            task = asyncio.create_task(self._run_job(*claimed))
+            tasks.add(task)
+            task.add_done_callback(finished)
+        
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def run_forever(self, stop_event=None, burst=False):
+        """Run the event loop in the current thread"""
+        # The app context gives coroutines current_app (config, tracing)
+        with self.app.app_context():
+            try:
+                asyncio.run(self.run(stop_event, burst))
+            finally:
+                self.io_executor.shutdown(wait=False)
+                self.cpu_executor.shutdown(wait=False)
+
+def start_async_worker(app):
+    """Run an asyncio worker in a background thread of this process"""
+    stop_event = threading.Event()
+    worker = AsyncWorker(app)
+    thread = threading.Thread(target=worker.run_forever, args=(stop_event,), name='async-job-worker', daemon=True)
+    thread.start()
+    return stop_event, thread
@@ -0,0 +1,90 @@
+import re
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+
+def engine_options(config):
+    """SQLAlchemy engine options for the configured database.
+
+    With DB_ENGINE_PROFILE=tuned, server databases (Postgres) get a sized,
+    pre-pinged and recycled connection pool. SQLite is tuned through
+    pragmas on each connection instead (see init_db_profile). Options set
+    explicitly in SQLALCHEMY_ENGINE_OPTIONS take precedence.
+    """
+    options = {}
+    if config['DB_ENGINE_PROFILE'] == 'tuned' and not _is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        options.update({
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': config['DB_POOL_PRE_PING']
+        })
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    return options
+
+def init_db_profile(app, db):
+    """Apply the SQLite pragmas to every new connection of the app's SQLite engines"""
+    if app.config['DB_ENGINE_PROFILE'] != 'tuned':
+        return
+    
+    pragmas = sqlite_pragmas(app.config)
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _pragma_setter(pragmas))
+
+def sqlite_pragmas(config):
+    """The pragmas to run on each SQLite connection, in order.
+    
+    WAL lets readers in other gunicorn workers carry on while one process
+    writes; synchronous=NORMAL is durable across application crashes in
+    WAL mode and only fsyncs at checkpoints; busy_timeout makes a writer
+    wait for the lock instead of failing with "database is locked".
+    """
+    return [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE'])
+    ]
+
+def _pragma_setter(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+    return set_pragmas
+
+def _is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+def explain(session, statement):
+    """The database's query plan for a SQLAlchemy statement, one line per step"""
+    dialect = session.get_bind().dialect.name
+    compiled = statement.compile(dialect=session.get_bind().dialect, compile_kwargs={'literal_binds': True})
+    prefix = 'EXPLAIN QUERY PLAN' if dialect == 'sqlite' else 'EXPLAIN'
+    rows = session.execute(text(f"{prefix} {compiled}")).all()
+    
+    # SQLite returns (id, parent, notused, detail) rows, Postgres one text column
+    return [str(row[-1]) for row in rows]
+
+def check_index_used(session, statement, index_name):
+    """Check that a statement's plan reads `index_name` and needs no separate sort.
+
+    Returns (ok, plan lines). On Postgres, sequential scans are disabled for
+    the check so the result does not depend on how many rows there are yet.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        session.execute(text('SET LOCAL enable_seqscan = off'))
+    try:
+        plan = explain(session, statement)
+    finally:
+        session.rollback()
+    
+    uses_index = any(index_name in line for line in plan)
+    sorts = any('TEMP B-TREE FOR ORDER BY' in line or re.match(r'\s*(->\s*)?Sort\b', line) for line in plan)
+    return uses_index and not sorts, plan
@@ -0,0 +1,50 @@
+import threading
+import time
+from collections import OrderedDict
+
+class RecentKeys:
+    """Bounded, thread-safe set that forgets the least recently seen keys.
+
+    With `ttl`, keys are also forgotten that many seconds after they were added.
+    """
+    
+    def __init__(self, max_size=10000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __contains__(self, key):
+        with self._lock:
+            if key not in self._keys:
+                return False
+            if self.ttl is not None and self._keys[key] + self.ttl < time.monotonic():
+                del self._keys[key]
+                return False
+            self._keys.move_to_end(key)
+            return True
+    
+    def add(self, key):
+        with self._lock:
+            self._keys[key] = time.monotonic()
+            self._keys.move_to_end(key)
+            if len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+    
+    def discard(self, key):
+        with self._lock:
+            self._keys.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+# Webhook events this process has already accepted. A job that fails for good
+# removes its event in the process it ran in, and other processes forget it
+# after the TTL (shorter than the default retry backoff), so a later delivery
+# of the event is queued again
+recent_webhook_events = RecentKeys(ttl=300)
+
+def webhook_event_key(strava_user_id, activity_id):
+    """Key of an activity webhook event, also used as its job's dedup key"""
+    return f"activity:{strava_user_id}:{activity_id}"
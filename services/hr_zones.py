@@ -0,0 +1,104 @@
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.orm import Session
+from models import db
+from models.job import Job
+from models.user import User
+from services.queue import job_handler, enqueue
+from services.strava import MissingScope, get_athlete_zones
+
+# Strava athletes have five heart rate zones
+ZONE_COUNT = 5
+
+def zone_edges(zones_json):
+    """Lower bounds of zones 2-5 (bpm) from the stored Strava zones, or None if unusable"""
+    if not zones_json:
+        return None
+    try:
+        zones = json.loads(zones_json)
+        edges = [int(zone['min']) for zone in zones[1:]]
+    except (ValueError, TypeError, KeyError):
+        return None
+    
+    if len(zones) != ZONE_COUNT or edges != sorted(edges) or edges[0] <= 0:
+        return None
+    return edges
+
+def zones_are_stale(user):
+    """True if the user's zones were never fetched or are older than HR_ZONES_TTL.
+
+    Zones the athlete has not granted access to are not stale: they stay
+    missing until the athlete reconnects with the profile:read_all scope.
+    """
+    if user.hr_zones_scope_missing:
+        return False
+    if not user.hr_zones_fetched_at:
+        return True
+    ttl = timedelta(seconds=current_app.config['HR_ZONES_TTL'])
+    return user.hr_zones_fetched_at + ttl < datetime.utcnow()
+
+def heart_rate_zones(user):
+    """The user's cached heart rate zone edges, requesting a background refresh when stale.
+
+    Never calls Strava itself: until the first refresh has run this returns
+    None and titles fall back to zones relative to the activity's max HR.
+    Works with a User or a UserSnapshot.
+    """
+    if zones_are_stale(user):
+        request_zone_refresh(user)
+    return zone_edges(user.hr_zones)
+
+def request_zone_refresh(user):
+    """Queue a refresh of the user's zones, once per stale version.
+
+    The job's dedup key names the version being replaced. Every activity
+    processed while the zones are stale asks again, so an existing job for
+    the key is looked for first, and a new one is committed in its own
+    session to leave the caller's transaction alone.
+    """
+    # Reading (even an expired user) must not flush the caller's pending changes
+    with db.session.no_autoflush:
+        user_id = user.id
+        fetched_at = user.hr_zones_fetched_at.strftime('%Y%m%d%H%M%S') if user.hr_zones_fetched_at else 'never'
+        dedup_key = f"hr_zones:{user_id}:{fetched_at}"
+        try:
+            if db.session.query(Job.id).filter_by(dedup_key=dedup_key).first():
+                return
+            with Session(db.engine) as session:
+                enqueue('refresh_hr_zones', {'user_id': user_id}, dedup_key=dedup_key, session=session)
+        except Exception as e:
+            # Titles still work without zones; a later activity asks again
+            print(f"Could not queue heart rate zone refresh for user {user_id}: {str(e)}")
+
+def _refresh_failed(user_id):
+    """Wait for the TTL before trying again once the job has run out of retries"""
+    user = db.session.get(User, user_id)
+    if user:
+        user.hr_zones_fetched_at = datetime.utcnow()
+
+@job_handler('refresh_hr_zones', on_failure=_refresh_failed)
+def refresh_hr_zones_job(user_id):
+    """Fetch the athlete's heart rate zones from Strava and cache them on the user"""
+    user = db.session.get(User, user_id)
+    if not user:
+        return
+    
+    try:
+        data = get_athlete_zones(user.get_valid_token())
+    except MissingScope:
+        # Not retried until the athlete reconnects and grants it (see auth.callback)
+        print(f"User {user_id} has not granted the profile:read_all scope heart rate zones need")
+        user.hr_zones_scope_missing = True
+        data = None
+    
+    zones = ((data or {}).get('heart_rate') or {}).get('zones')
+    if zones:
+        user.hr_zones = json.dumps(zones)
+        user.hr_zones_scope_missing = False
+    elif not user.hr_zones_scope_missing:
+        # No zones set; try again after the TTL
+        print(f"No heart rate zones available for user {user_id}")
+    
+    user.hr_zones_fetched_at = datetime.utcnow()
+    db.session.commit()
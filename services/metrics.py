@@ -0,0 +1,308 @@
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from fast DB commits to slow Strava calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+    
+    type = 'counter'
+    
+    def __init__(self, registry, name, help, labelnames=()):
+        self.name = name
+        # Exposed as `<name>_total`, which the HELP and TYPE lines name too
+        self.family = f"{name}_total"
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._registry = registry
+        self._values = {}
+        registry.register(self)
+    
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        self._registry.touched()
+    
+    def dump(self):
+        return [[list(key), value] for key, value in self._values.items()]
+    
+    def merge(self, totals, samples):
+        for key, value in samples:
+            key = tuple(key)
+            totals[key] = totals.get(key, 0) + value
+    
+    def render(self, totals):
+        lines = []
+        for key, value in sorted(totals.items()):
+            lines.append(f"{self.family}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Distribution of observed values (e.g. latencies) in fixed buckets"""
+    
+    type = 'histogram'
+    
+    def __init__(self, registry, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.family = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._registry = registry
+        self._values = {}
+        registry.register(self)
+    
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._registry.lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, plus +Inf, sum and count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+        self._registry.touched()
+    
+    @contextmanager
+    def time(self, **labels):
+        """Observe the time spent in the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def dump(self):
+        return [[list(key), [list(counts), total, count]] for key, (counts, total, count) in self._values.items()]
+    
+    def merge(self, totals, samples):
+        for key, (counts, total, count) in samples:
+            key = tuple(key)
+            entry = totals.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+            entry[2] += count
+    
+    def render(self, totals):
+        lines = []
+        for key, (counts, total, count) in sorted(totals.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames + ('le',), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Process-local metrics, shared with other worker processes through files.
+    
+    Recording only touches memory. A background thread writes this process's
+    values to ``<directory>/metrics_<pid>.json`` every `flush_interval`
+    seconds, and a scrape adds up the files of all processes, so each gunicorn
+    worker can answer /metrics for the whole server.
+    """
+    
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = []
+        self._flusher = None
+        self._flusher_pid = None
+        self._dirty = False
+        
+        # A forked worker starts counting from zero in its own file
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+    
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def collector(self, func):
+        """Register a function called at scrape time for live gauge values.
+        
+        It returns a list of ``(name, help, [(labels_dict, value), ...])``.
+        """
+        self._collectors.append(func)
+        return func
+    
+    def configure(self, directory, flush_interval=5.0):
+        self.directory = directory or None
+        self.flush_interval = flush_interval
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+    
+    def touched(self):
+        self._dirty = True
+        if self.directory and self._flusher_pid != os.getpid():
+            self._start_flusher()
+    
+    def _start_flusher(self):
+        with self.lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+            self._flusher.start()
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Metrics flush failed: {str(e)}")
+    
+    def _reset(self):
+        self.lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._values = {}
+        self._flusher = None
+        self._flusher_pid = None
+        self._dirty = False
+    
+    def _path(self):
+        return os.path.join(self.directory, f"metrics_{os.getpid()}.json")
+    
+    def _dump(self):
+        with self.lock:
+            return {name: metric.dump() for name, metric in self._metrics.items()}
+    
+    def flush(self):
+        """Write this process's values to its file in the metrics directory"""
+        if not self.directory or not self._dirty:
+            return
+        self._dirty = False
+        data = self._dump()
+        
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._path())
+    
+    def _process_values(self):
+        """Values of every process (including this one, read from memory)"""
+        yield self._dump()
+        if not self.directory:
+            return
+        
+        own_file = os.path.basename(self._path())
+        for filename in os.listdir(self.directory):
+            if not filename.startswith('metrics_') or not filename.endswith('.json') or filename == own_file:
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+    
+    def render(self):
+        """All metrics, aggregated across processes, in Prometheus text format"""
+        totals = {name: {} for name in self._metrics}
+        for values in self._process_values():
+            for name, samples in values.items():
+                if name in self._metrics:
+                    self._metrics[name].merge(totals[name], samples)
+        
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {metric.family} {metric.help}")
+            lines.append(f"# TYPE {metric.family} {metric.type}")
+            lines.extend(metric.render(totals[name]))
+        
+        for collect in self._collectors:
+            try:
+                gauges = collect()
+            except Exception as e:
+                print(f"Metrics collector {collect.__name__} failed: {str(e)}")
+                continue
+            for name, help, samples in gauges:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+        
+        return '\n'.join(lines) + '\n'
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = (f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + ','.join(pairs) + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+registry = MetricsRegistry()
+
+# Hot-path metrics
+strava_request_seconds = Histogram(
+    registry, 'strava_request_duration_seconds',
+    'Latency of Strava API calls', ('endpoint', 'status')
+)
+webhook_events = Counter(
+    registry, 'webhook_events',
+    'Strava webhook events received, by outcome', ('outcome',)
+)
+title_generation_seconds = Histogram(
+    registry, 'title_generation_duration_seconds',
+    'Time spent generating workout titles from streams'
+)
+db_commit_seconds = Histogram(
+    registry, 'db_commit_duration_seconds',
+    'Latency of database session commits (including the flush)'
+)
+token_refreshes = Counter(
+    registry, 'strava_token_refreshes',
+    'Strava access token refreshes, by result', ('result',)
+)
+jobs_processed = Counter(
+    registry, 'jobs_processed',
+    'Background jobs run, by kind and result', ('kind', 'result')
+)
+
+def init_metrics(app):
+    """Point the registry at the app's metrics directory and time DB commits"""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    
+    registry.configure(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+    
+    if not event.contains(Session, 'before_commit', _before_commit):
+        event.listen(Session, 'before_commit', _before_commit)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+
+def _before_commit(session):
+    session.info['commit_started'] = time.perf_counter()
+
+def _after_commit(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        db_commit_seconds.observe(time.perf_counter() - started)
+
+def _after_rollback(session):
+    session.info.pop('commit_started', None)
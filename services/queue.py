@@ -0,0 +1,393 @@
+import contextvars
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, update
+from sqlalchemy.exc import IntegrityError
+from models import db
+from models.job import Job
+from services.metrics import jobs_processed
+
+# Registered job handlers (sync and coroutine) and final-failure callbacks, keyed by job kind
+_handlers = {}
+_async_handlers = {}
+_failure_handlers = {}
+
+# Worker threads started by this process (see start_workers_once)
+_workers_lock = threading.Lock()
+_workers_started = False
+
+# When this process last pruned finished jobs (see maybe_prune_jobs)
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+
+# The job the current handler is running for (see hand_off_completion)
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+def job_handler(kind, on_failure=None):
+    """Register a function as the handler for a job kind.
+
+    `on_failure` is called with the job payload once the job has failed for
+    the last time.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        if on_failure:
+            _failure_handlers[kind] = on_failure
+        return func
+    return decorator
+
+def async_job_handler(kind):
+    """Register a coroutine that runs a job kind in the asyncio worker.
+
+    It is called with the worker (for its executors) and the job payload.
+    Kinds without one run their sync handler on the worker's I/O threads.
+    """
+    def decorator(func):
+        _async_handlers[kind] = func
+        return func
+    return decorator
+
+def get_async_handler(kind):
+    return _async_handlers.get(kind)
+
+def enqueue(kind, payload=None, run_at=None, max_attempts=None, dedup_key=None, session=None):
+    """Persist a job so a worker can pick it up.
+
+    Returns None if a job with the same `dedup_key` is pending, running or
+    done. A job that failed for good does not hold on to its key, so the
+    same work can be enqueued again. The job is committed in `session`
+    (default: the app's session).
+    """
+    session = session or db.session
+    
+    def new_job():
+        return Job(
+            kind=kind,
+            payload=json.dumps(payload or {}),
+            dedup_key=dedup_key,
+            run_at=run_at or datetime.utcnow(),
+            max_attempts=max_attempts or current_app.config['JOB_MAX_ATTEMPTS']
+        )
+    
+    job = new_job()
+    session.add(job)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        # Jobs that failed before keys were released on failure still hold theirs
+        released = session.execute(
+            update(Job)
+            .where(Job.dedup_key == dedup_key, Job.status == 'failed')
+            .values(dedup_key=None)
+        ).rowcount if dedup_key else 0
+        if not released:
+            session.rollback()
+            return None
+        
+        job = new_job()
+        session.add(job)
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            return None
+    return job
+
+def queue_depth():
+    """Count jobs per status"""
+    rows = db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+    depth = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+    depth.update({status: count for status, count in rows})
+    return depth
+
+def retry_delay(attempts):
+    """Exponential backoff (in seconds) before the next attempt"""
+    base = current_app.config['JOB_RETRY_BASE_DELAY']
+    cap = current_app.config['JOB_RETRY_MAX_DELAY']
+    return min(cap, base * 2 ** max(0, attempts - 1))
+
+def prune_jobs(retention=None):
+    """Delete done and failed jobs that finished more than `retention` seconds ago"""
+    if retention is None:
+        retention = current_app.config['JOB_RETENTION']
+    cutoff = datetime.utcnow() - timedelta(seconds=retention)
+    result = db.session.execute(
+        delete(Job)
+        .where(Job.status.in_(('done', 'failed')), Job.finished_at < cutoff)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def maybe_prune_jobs():
+    """Prune finished jobs if this process has not done so for JOB_PRUNE_INTERVAL seconds"""
+    global _last_prune
+    interval = current_app.config['JOB_PRUNE_INTERVAL']
+    if interval <= 0:
+        return 0
+    
+    with _prune_lock:
+        now = time.monotonic()
+        if _last_prune and now - _last_prune < interval:
+            return 0
+        _last_prune = now
+    
+    try:
+        return prune_jobs()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Pruning finished jobs failed: {str(e)}")
+        return 0
+
+def recover_stale_jobs():
+    """Put jobs whose worker died (e.g. on restart) back in the queue.
+
+    A job counts as abandoned once its lock is older than JOB_LOCK_TIMEOUT;
+    handlers that run longer refresh it with touch_job.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['JOB_LOCK_TIMEOUT'])
+    result = db.session.execute(
+        update(Job)
+        .where(Job.status == 'running', Job.locked_at < cutoff)
+        .values(status='pending', locked_at=None, locked_by=None)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def claim_next(worker_id):
+    """Atomically claim the next due job, or return None"""
+    now = datetime.utcnow()
+    candidate_ids = [row[0] for row in db.session.query(Job.id)
+                     .filter(Job.status == 'pending', Job.run_at <= now)
+                     .order_by(Job.run_at, Job.id)
+                     .limit(5).all()]
+    
+    for job_id in candidate_ids:
+        # Only one worker can flip a given job from pending to running
+        result = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == 'pending')
+            .values(status='running', locked_at=now, locked_by=worker_id, attempts=Job.attempts + 1)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(Job, job_id)
+    
+    return None
+
+@contextmanager
+def running_job(job_id, worker_id=None):
+    """Mark `job_id` as the job being handled in this context, for hand_off_completion and touch_job"""
+    running = {'id': job_id, 'worker_id': worker_id, 'handed_off': False}
+    token = _current_job.set(running)
+    try:
+        yield running
+    finally:
+        _current_job.reset(token)
+
+def touch_job():
+    """Refresh the current job's lock so recover_stale_jobs leaves it alone.
+
+    Long handlers (backfills) call this as they make progress; it is written
+    in the caller's transaction. Returns False outside a job or when another
+    worker has taken the job over.
+    """
+    running = _current_job.get()
+    if running is None:
+        return False
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id == running['id'], Job.status == 'running', Job.locked_by == running['worker_id'])
+        .values(locked_at=datetime.utcnow())
+    )
+    return result.rowcount == 1
+
+def hand_off_completion():
+    """Take over marking the current job done, returning its claim (None outside a job).
+
+    For handlers whose last write is committed later on another thread: the
+    writer marks the job done with complete_jobs in the same transaction, so
+    the job is never done before its work is saved. If that write fails it
+    should call finish_job with the error (and the claim's worker id) so the
+    job is retried.
+    """
+    running = _current_job.get()
+    if running is None:
+        return None
+    running['handed_off'] = True
+    return running['id'], running['worker_id']
+
+def complete_jobs(claims):
+    """Mark handed-off jobs done in the caller's transaction, returning their kinds.
+
+    `claims` are (job id, worker id) pairs from hand_off_completion; a job
+    that has since been recovered and claimed by another worker is left to it.
+    """
+    if not claims:
+        return []
+    now = datetime.utcnow()
+    owners = dict(claims)
+    jobs = Job.query.filter(Job.id.in_(owners), Job.status == 'running').all()
+    done = []
+    for job in jobs:
+        if job.locked_by != owners[job.id]:
+            print(f"Job {job.id} ({job.kind}) is now held by {job.locked_by}; leaving it to them")
+            continue
+        job.status = 'done'
+        job.finished_at = now
+        job.locked_at = None
+        done.append(job.kind)
+    return done
+
+def run_job(job):
+    """Run a claimed job and record the outcome, scheduling a retry on failure"""
+    job_id = job.id
+    worker_id = job.locked_by
+    handler = _handlers.get(job.kind)
+    
+    with running_job(job_id, worker_id) as running:
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind '{job.kind}'")
+            handler(**json.loads(job.payload))
+        except Exception as e:
+            db.session.rollback()
+            return finish_job(job_id, e, worker_id)
+    
+    db.session.rollback()
+    if running['handed_off']:
+        return True
+    return finish_job(job_id, worker_id=worker_id)
+
+def finish_job(job_id, error=None, worker_id=None):
+    """Record the outcome of a job run; a failed job is retried with backoff until it runs out of attempts.
+
+    With `worker_id`, nothing is recorded unless that worker still holds the
+    job: one that outlived JOB_LOCK_TIMEOUT may have been recovered and
+    claimed again, and the new run owns the outcome.
+    """
+    job = db.session.get(Job, job_id)
+    
+    if worker_id is not None and (job.status != 'running' or job.locked_by != worker_id):
+        db.session.rollback()
+        print(f"Job {job_id} ({job.kind}) is no longer held by {worker_id}; not recording its outcome")
+        return False
+    
+    if error is not None:
+        job.last_error = f"{type(error).__name__}: {error}"
+        job.locked_at = None
+        job.locked_by = None
+        
+        # Errors may say when to try again (e.g. rate limiting); waiting for
+        # that is a deferral rather than a failure, so it keeps its attempt
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after:
+            job.attempts -= 1
+        
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            # Let a later delivery of the same work be enqueued again
+            job.dedup_key = None
+            _run_failure_handler(job)
+        else:
+            delay = retry_after or retry_delay(job.attempts)
+            job.status = 'pending'
+            job.run_at = datetime.utcnow() + timedelta(seconds=delay)
+        db.session.commit()
+        jobs_processed.inc(kind=job.kind, result='failed' if job.status == 'failed' else 'retry')
+        if retry_after:
+            print(f"Job {job_id} ({job.kind}) deferred for {int(retry_after)}s: {job.last_error}")
+        else:
+            print(f"Job {job_id} ({job.kind}) failed on attempt {job.attempts}: {job.last_error}")
+        return False
+    
+    job.status = 'done'
+    job.finished_at = datetime.utcnow()
+    job.locked_at = None
+    db.session.commit()
+    jobs_processed.inc(kind=job.kind, result='done')
+    return True
+
+def _run_failure_handler(job):
+    on_failure = _failure_handlers.get(job.kind)
+    if on_failure is None:
+        return
+    try:
+        on_failure(**json.loads(job.payload))
+    except Exception as e:
+        print(f"Failure handler for job {job.id} ({job.kind}) raised: {str(e)}")
+
+def work(app, stop_event=None, worker_id=None, burst=False):
+    """Process jobs until stopped (or until the queue is empty in burst mode)"""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    
+    with app.app_context():
+        poll_interval = app.config['JOB_POLL_INTERVAL']
+        recover_stale_jobs()
+        
+        while not (stop_event and stop_event.is_set()):
+            try:
+                job = claim_next(worker_id)
+                if job is not None:
+                    run_job(job)
+                    continue
+            except Exception as e:
+                db.session.rollback()
+                print(f"Worker {worker_id} error: {str(e)}")
+            finally:
+                db.session.remove()
+            
+            if burst:
+                return
+            
+            # Housekeeping while the queue is idle
+            maybe_prune_jobs()
+            db.session.remove()
+            time.sleep(poll_interval)
+
+def start_workers(app, count=None):
+    """Start background worker threads for this process"""
+    count = app.config['JOB_WORKERS'] if count is None else count
+    stop_event = threading.Event()
+    threads = []
+    
+    for i in range(count):
+        thread = threading.Thread(
+            target=work,
+            args=(app, stop_event),
+            name=f"job-worker-{i}",
+            daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    
+    return stop_event, threads
+
+def start_workers_once(app):
+    """Start the configured worker threads the first time this process serves a request.
+
+    Deferring this until a request arrives keeps CLI commands (``flask db ...``,
+    ``flask worker``) from spawning workers, and means forked server processes
+    each start their own threads.
+    """
+    global _workers_started
+    if _workers_started:
+        return
+    with _workers_lock:
+        if _workers_started:
+            return
+        _workers_started = True
+        if app.config['JOB_WORKERS'] <= 0:
+            return
+        if app.config['JOB_WORKER_MODE'] == 'async':
+            from services.async_worker import start_async_worker
+            start_async_worker(app)
+        else:
+            start_workers(app)
@@ -0,0 +1,164 @@
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+from services.locks import file_lock
+
+# Request priorities: live webhook traffic may use the whole budget,
+# backfills have to leave some headroom for it
+LIVE = 'live'
+BACKFILL = 'backfill'
+
+SHORT_WINDOW = 15 * 60   # Strava's 15-minute window
+LONG_WINDOW = 24 * 60 * 60  # Strava's daily window (resets at midnight UTC)
+
+_priority = contextvars.ContextVar('strava_rate_limit_priority', default=LIVE)
+
+class RateLimitExceeded(Exception):
+    """Raised when a call cannot be made within the rate limit budget"""
+    
+    def __init__(self, retry_after):
+        super().__init__(f"Strava rate limit budget exhausted, retry in {int(retry_after)}s")
+        self.retry_after = retry_after
+
+@contextmanager
+def rate_limit_priority(priority):
+    """Run the enclosed Strava calls with the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority():
+    return _priority.get()
+
+def parse_rate_limit_header(value):
+    """Parse a '<15 minute>,<daily>' header value into a pair of ints"""
+    try:
+        short, long = (int(part) for part in value.split(',')[:2])
+        return short, long
+    except (AttributeError, ValueError):
+        return None
+
+def retry_after_throttled(headers, now=None):
+    """Seconds to wait after Strava answered 429, from the response headers"""
+    now = time.time() if now is None else now
+    try:
+        return max(1.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        pass
+    
+    # Wait for the daily window if that is the one used up, else the 15-minute one
+    limits = parse_rate_limit_header(headers.get('X-RateLimit-Limit'))
+    usage = parse_rate_limit_header(headers.get('X-RateLimit-Usage'))
+    if limits and usage and usage[1] >= limits[1]:
+        return LONG_WINDOW - now % LONG_WINDOW
+    return SHORT_WINDOW - now % SHORT_WINDOW
+
+class RateLimitGovernor:
+    """Token bucket over Strava's application-wide rate limits.
+
+    The bucket state lives in a small JSON file guarded by a file lock, so all
+    gunicorn workers (and worker threads) on the host draw from one budget.
+    It is kept in sync with the X-RateLimit-* headers Strava returns.
+    """
+    
+    def __init__(self, state_path, short_limit=200, long_limit=2000, backfill_reserve=0.3, max_wait=5.0):
+        self.state_path = state_path
+        self.default_limits = (short_limit, long_limit)
+        self.backfill_reserve = backfill_reserve
+        self.max_wait = max_wait
+    
+    def _read_state(self, f, now):
+        f.seek(0)
+        try:
+            state = json.loads(f.read() or '{}')
+        except ValueError:
+            state = {}
+        
+        short_window, long_window = int(now // SHORT_WINDOW), int(now // LONG_WINDOW)
+        if state.get('short_window') != short_window:
+            state['short_window'], state['short_usage'] = short_window, 0
+        if state.get('long_window') != long_window:
+            state['long_window'], state['long_usage'] = long_window, 0
+        state.setdefault('short_limit', self.default_limits[0])
+        state.setdefault('long_limit', self.default_limits[1])
+        return state
+    
+    def _write_state(self, f, state):
+        f.seek(0)
+        f.truncate()
+        f.write(json.dumps(state))
+        f.flush()
+    
+    def _allowance(self, limit, priority):
+        if priority == BACKFILL:
+            return int(limit * (1 - self.backfill_reserve))
+        return limit
+    
+    def _try_acquire(self, priority):
+        """Take one token, returning 0 on success or the seconds until one is available"""
+        now = time.time()
+        with file_lock(self.state_path) as f:
+            state = self._read_state(f, now)
+            
+            if state['long_usage'] >= self._allowance(state['long_limit'], priority):
+                return LONG_WINDOW - now % LONG_WINDOW
+            if state['short_usage'] >= self._allowance(state['short_limit'], priority):
+                return SHORT_WINDOW - now % SHORT_WINDOW
+            
+            state['short_usage'] += 1
+            state['long_usage'] += 1
+            self._write_state(f, state)
+            return 0
+    
+    def acquire(self, priority=None):
+        """Reserve budget for one call, blocking up to `max_wait` seconds"""
+        priority = priority or current_priority()
+        deadline = time.monotonic() + self.max_wait
+        
+        while True:
+            wait = self._try_acquire(priority)
+            if not wait:
+                return
+            
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                raise RateLimitExceeded(wait)
+            time.sleep(min(wait, 1.0))
+    
+    def update_from_headers(self, headers):
+        """Sync the bucket with the X-RateLimit-Limit/X-RateLimit-Usage headers"""
+        limits = parse_rate_limit_header(headers.get('X-RateLimit-Limit'))
+        usage = parse_rate_limit_header(headers.get('X-RateLimit-Usage'))
+        if not limits and not usage:
+            return
+        
+        with file_lock(self.state_path) as f:
+            state = self._read_state(f, time.time())
+            if limits:
+                state['short_limit'], state['long_limit'] = limits
+            if usage:
+                # Our own count may include calls Strava has not reported yet
+                state['short_usage'] = max(state['short_usage'], usage[0])
+                state['long_usage'] = max(state['long_usage'], usage[1])
+            self._write_state(f, state)
+    
+    def mark_exhausted(self):
+        """Treat the current 15-minute window as used up (after a 429)"""
+        with file_lock(self.state_path) as f:
+            state = self._read_state(f, time.time())
+            state['short_usage'] = max(state['short_usage'], state['short_limit'])
+            self._write_state(f, state)
+    
+    def status(self):
+        """Current limits and usage for both windows"""
+        with file_lock(self.state_path) as f:
+            state = self._read_state(f, time.time())
+        return {
+            'short_usage': state['short_usage'],
+            'short_limit': state['short_limit'],
+            'long_usage': state['long_usage'],
+            'long_limit': state['long_limit']
+        }
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db
+from models.activity_log import ActivityLog
+from models.activity_daily_stats import ActivityDailyStats
+
+ROLLUP_FIELDS = ('count', 'hidden_count', 'total_distance', 'total_elapsed_time')
+
+def rollup_key(start_date, activity_type, processed_at=None):
+    """The (day, activity_type) bucket an activity log row counts towards"""
+    when = start_date or processed_at or datetime.utcnow()
+    return when.date(), activity_type or 'Unknown'
+
+def add_rollup_delta(deltas, key, sign, was_hidden, distance, elapsed_time):
+    """Accumulate one log row (sign=1) or its removal (sign=-1) into `deltas`"""
+    delta = deltas.setdefault(key, [0, 0, 0.0, 0])
+    delta[0] += sign
+    delta[1] += sign * int(bool(was_hidden))
+    delta[2] += sign * (distance or 0)
+    delta[3] += sign * (elapsed_time or 0)
+
+def apply_rollup_deltas(user_id, deltas):
+    """Add the accumulated deltas to the user's daily rollups (without committing)"""
+    rows = [
+        dict(user_id=user_id, day=day, activity_type=activity_type, **dict(zip(ROLLUP_FIELDS, delta)))
+        for (day, activity_type), delta in deltas.items()
+        if any(delta)
+    ]
+    if not rows:
+        return
+    
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        upsert = (sqlite if dialect == 'sqlite' else postgresql).insert(ActivityDailyStats)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=['user_id', 'day', 'activity_type'],
+            set_={field: getattr(ActivityDailyStats, field) + getattr(upsert.excluded, field)
+                  for field in ROLLUP_FIELDS}
+        )
+        db.session.execute(upsert, rows)
+        return
+    
+    # Other databases: update existing buckets, then insert the missing ones
+    for row in rows:
+        stats = ActivityDailyStats.query.filter_by(
+            user_id=user_id, day=row['day'], activity_type=row['activity_type']
+        ).first()
+        if stats is None:
+            db.session.add(ActivityDailyStats(**row))
+        else:
+            for field in ROLLUP_FIELDS:
+                setattr(stats, field, getattr(stats, field) + row[field])
+
+def rebuild_rollups(user_id=None):
+    """Recompute the daily rollups from ActivityLog (for one user or everyone)"""
+    clear = delete(ActivityDailyStats)
+    if user_id is not None:
+        clear = clear.where(ActivityDailyStats.user_id == user_id)
+    db.session.execute(clear)
+    
+    day = func.date(func.coalesce(ActivityLog.start_date, ActivityLog.processed_at))
+    activity_type = func.coalesce(ActivityLog.activity_type, 'Unknown')
+    query = select(
+        ActivityLog.user_id,
+        day,
+        activity_type,
+        func.count(ActivityLog.id),
+        func.sum(case((ActivityLog.was_hidden, 1), else_=0)),
+        func.coalesce(func.sum(ActivityLog.distance), 0),
+        func.coalesce(func.sum(ActivityLog.elapsed_time), 0)
+    ).where(ActivityLog.user_id.isnot(None)).group_by(ActivityLog.user_id, day, activity_type)
+    if user_id is not None:
+        query = query.where(ActivityLog.user_id == user_id)
+    
+    db.session.execute(insert(ActivityDailyStats).from_select(
+        ['user_id', 'day', 'activity_type', *ROLLUP_FIELDS], query
+    ))
+    db.session.commit()
+
+def dashboard_stats(user_id, weeks=12):
+    """Per-type totals and weekly hidden/shown counts for the dashboard"""
+    by_type = db.session.query(
+        ActivityDailyStats.activity_type,
+        func.sum(ActivityDailyStats.count),
+        func.sum(ActivityDailyStats.hidden_count),
+        func.sum(ActivityDailyStats.total_distance),
+        func.sum(ActivityDailyStats.total_elapsed_time)
+    ).filter(ActivityDailyStats.user_id == user_id)\
+     .group_by(ActivityDailyStats.activity_type)\
+     .order_by(func.sum(ActivityDailyStats.count).desc())\
+     .all()
+    
+    today = datetime.utcnow().date()
+    first_week = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+    
+    weekly = OrderedDict()
+    for i in range(weeks):
+        weekly[first_week + timedelta(weeks=i)] = {'hidden': 0, 'shown': 0}
+    
+    recent = db.session.query(
+        ActivityDailyStats.day,
+        func.sum(ActivityDailyStats.count),
+        func.sum(ActivityDailyStats.hidden_count)
+    ).filter(ActivityDailyStats.user_id == user_id, ActivityDailyStats.day >= first_week)\
+     .group_by(ActivityDailyStats.day)\
+     .all()
+    for day, count, hidden in recent:
+        week = weekly.get(day - timedelta(days=day.weekday()))
+        if week is not None:
+            week['hidden'] += hidden
+            week['shown'] += count - hidden
+    
+    return {
+        'by_type': [
+            {'activity_type': activity_type, 'count': count, 'hidden': hidden,
+             'distance': distance or 0, 'elapsed_time': elapsed_time or 0}
+            for activity_type, count, hidden, distance, elapsed_time in by_type
+        ],
+        'weekly': [dict(week_start=week_start, **counts) for week_start, counts in weekly.items()]
+    }
@@ -0,0 +1,168 @@
+import numpy as np
+from collections import namedtuple
+
+# One detected section of an activity. `start`/`end` are sample indices
+# (inclusive), `duration` is in seconds, `distance` and `gain` in meters.
+Segment = namedtuple('Segment', ['kind', 'start', 'end', 'duration', 'distance', 'gain'])
+
+# Activities where speed changes mean structured efforts rather than traffic stops
+INTERVAL_TYPES = {'Run', 'TrailRun', 'VirtualRun', 'VirtualRide'}
+
+def smooth(values, window):
+    """Centered moving average over `window` samples, same length as the input"""
+    values = np.asarray(values, dtype=float)
+    window = int(max(1, min(window, len(values))))
+    if window == 1:
+        return values
+    
+    # Pad with the edge values so the ends are not pulled towards zero
+    before = window // 2
+    padded = np.concatenate((np.full(before, values[0]), values, np.full(window - 1 - before, values[-1])))
+    sums = np.cumsum(padded)
+    sums = np.concatenate(([0.0], sums))
+    return (sums[window:] - sums[:-window]) / window
+
+def find_runs(mask):
+    """Start and (inclusive) end indices of every run of True values"""
+    edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1
+
+def merge_runs(starts, ends, join):
+    """Merge each run into the previous one where `join` (one flag per gap) is set"""
+    if len(starts) < 2:
+        return starts, ends
+    return starts[np.concatenate(([True], ~join))], ends[np.concatenate((~join, [True]))]
+
+def elapsed_time(time, n):
+    """Seconds since the start for each sample (1 Hz when there is no time stream)"""
+    if time is not None and len(time) == n:
+        return np.asarray(time, dtype=float)
+    return np.arange(n, dtype=float)
+
+def covered_distance(distance, velocity, seconds):
+    """Meters since the start for each sample, integrating velocity when there is no distance stream"""
+    if distance is not None and len(distance) == len(seconds):
+        return np.asarray(distance, dtype=float)
+    steps = np.diff(seconds) * np.asarray(velocity, dtype=float)[1:]
+    return np.concatenate(([0.0], np.cumsum(steps)))
+
+def _window(seconds, window_seconds):
+    """Samples covering `window_seconds`, allowing for smart recording's uneven sampling"""
+    step = np.median(np.diff(seconds)) if len(seconds) > 1 else 1.0
+    return max(1, int(round(window_seconds / max(step, 1e-6))))
+
+def _segments(kind, starts, ends, seconds, meters, altitude=None):
+    gains = altitude[ends] - altitude[starts] if altitude is not None else np.zeros(len(starts))
+    return [
+        Segment(kind, int(s), int(e), float(seconds[e] - seconds[s]), float(meters[e] - meters[s]), float(g))
+        for s, e, g in zip(starts, ends, gains)
+    ]
+
+def detect_intervals(velocity, time=None, distance=None, window_seconds=15, min_work_seconds=30,
+                     min_rest_seconds=15, min_contrast=1.15, min_reps=3):
+    """Find work/rest intervals in a velocity stream.
+    
+    Speed is smoothed over `window_seconds` and split at the midpoint between
+    the slow and fast ends of its range. Fast sections shorter than
+    `min_work_seconds` are dropped and rests shorter than `min_rest_seconds`
+    joined into the surrounding effort. It only counts as an interval session
+    with at least `min_reps` efforts that are `min_contrast` times faster than
+    the recoveries between them, so GPS noise on a steady run does not.
+    
+    Returns {'work': [Segment], 'rest': [Segment]} or None.
+    """
+    if velocity is None or len(velocity) < 10:
+        return None
+    
+    seconds = elapsed_time(time, len(velocity))
+    meters = covered_distance(distance, velocity, seconds)
+    speed = smooth(velocity, _window(seconds, window_seconds))
+    
+    low, high = np.percentile(speed, [20, 80])
+    starts, ends = find_runs(speed > (low + high) / 2)
+    if len(starts) < min_reps:
+        return None
+    
+    starts, ends = merge_runs(starts, ends, seconds[starts[1:]] - seconds[ends[:-1]] < min_rest_seconds)
+    keep = seconds[ends] - seconds[starts] >= min_work_seconds
+    starts, ends = starts[keep], ends[keep]
+    if len(starts) < min_reps:
+        return None
+    
+    # Recoveries are the gaps between efforts
+    rest_starts, rest_ends = ends[:-1] + 1, starts[1:] - 1
+    
+    # Mean speed of each section from prefix sums, in one pass
+    prefix = np.concatenate(([0.0], np.cumsum(speed)))
+    work_speed = (prefix[ends + 1] - prefix[starts]).sum() / (ends - starts + 1).sum()
+    rest_speed = (prefix[rest_ends + 1] - prefix[rest_starts]).sum() / max((rest_ends - rest_starts + 1).sum(), 1)
+    if work_speed < min_contrast * max(rest_speed, 1e-6):
+        return None
+    
+    return {
+        'work': _segments('work', starts, ends, seconds, meters),
+        'rest': _segments('rest', rest_starts, rest_ends, seconds, meters)
+    }
+
+def detect_climbs(altitude, distance=None, time=None, window_seconds=30, max_dip=3.0, min_gain=20.0, min_grade=0.02):
+    """Find climbs in an altitude stream.
+    
+    Altitude is smoothed over `window_seconds` to remove GPS jitter, rising
+    sections are joined across dips of less than `max_dip` meters, and a
+    climb needs `min_gain` meters at an average grade of at least `min_grade`
+    (checked only with a distance stream).
+    
+    Returns a list of Segments in order.
+    """
+    if altitude is None or len(altitude) < 10:
+        return []
+    
+    seconds = elapsed_time(time, len(altitude))
+    has_distance = distance is not None and len(distance) == len(altitude)
+    meters = np.asarray(distance, dtype=float) if has_distance else np.zeros(len(altitude))
+    height = smooth(altitude, _window(seconds, window_seconds))
+    
+    # Rising steps i -> i + 1, as runs of sample indices
+    starts, ends = find_runs(np.diff(height) > 0)
+    ends = ends + 1
+    if len(starts) == 0:
+        return []
+    
+    starts, ends = merge_runs(starts, ends, height[starts[1:]] - height[ends[:-1]] > -max_dip)
+    
+    gain = height[ends] - height[starts]
+    keep = gain >= min_gain
+    if has_distance:
+        keep &= gain >= min_grade * np.maximum(meters[ends] - meters[starts], 1.0)
+    
+    return _segments('climb', starts[keep], ends[keep], seconds, meters, height)
+
+def describe_intervals(work, tolerance=0.2, share=0.8):
+    """Short label for a set of efforts, e.g. '6x800m', '5x4min' or '7'.
+    
+    Reps count towards the label when they are within `tolerance` of the
+    median distance (or failing that, duration), as long as at least `share`
+    of them are; a cut-off last rep or a final sprint does not spoil it.
+    """
+    for values, unit in ((np.array([segment.distance for segment in work]), 'm'),
+                         (np.array([segment.duration for segment in work]), 's')):
+        median = float(np.median(values))
+        matching = np.abs(values - median) <= tolerance * median
+        if median <= 0 or matching.sum() < share * len(work):
+            continue
+        
+        count = int(matching.sum())
+        if unit == 's':
+            return f"{count}x{max(1, int(round(median / 60)))}min"
+        if median < 1000:
+            return f"{count}x{int(round(median / 100) * 100)}m"
+        return f"{count}x{round(median / 500) * 0.5:g}km"
+    
+    return str(len(work))
+
+def describe_climbs(climbs):
+    """Short label for a list of climbs, e.g. '3 climbs, max 420m'"""
+    biggest = int(max(climb.gain for climb in climbs))
+    if len(climbs) == 1:
+        return f"1 climb, {biggest}m"
+    return f"{len(climbs)} climbs, max {biggest}m"
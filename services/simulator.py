@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from models import db
+from models.activity_log import ActivityLog
+
+# Activity types with a user-configurable threshold
+THRESHOLD_FIELDS = {
+    'Run': 'run_threshold',
+    'Ride': 'ride_threshold',
+    'Walk': 'walk_threshold'
+}
+
+def load_history(user_id):
+    """Load a user's processed activities into a DataFrame"""
+    rows = db.session.query(ActivityLog.activity_type, ActivityLog.elapsed_time, ActivityLog.distance)\
+                     .filter(ActivityLog.user_id == user_id)\
+                     .all()
+    history = pd.DataFrame.from_records(rows, columns=['activity_type', 'elapsed_time', 'distance'])
+    history['elapsed_time'] = history['elapsed_time'].fillna(0).astype('int64')
+    return history
+
+def simulate_thresholds(history, thresholds):
+    """Count how many activities of each type the given thresholds (in seconds) would hide.
+
+    Mirrors should_hide_from_feed: an activity is hidden when its type has a
+    (non-zero) threshold and its elapsed time is below it.
+    """
+    limits = history['activity_type'].map(thresholds).fillna(0)
+    hidden = (limits > 0) & (history['elapsed_time'] < limits)
+    
+    counts = pd.DataFrame({'activity_type': history['activity_type'], 'hidden': hidden})\
+               .groupby('activity_type')['hidden']\
+               .agg(['size', 'sum'])
+    
+    return {
+        activity_type: {'total': int(row['size']), 'hidden': int(row['sum'])}
+        for activity_type, row in counts.iterrows()
+    }
+
+def sweep_threshold(history, activity_type, candidates):
+    """How many activities of one type each candidate threshold would hide, evaluated all at once"""
+    elapsed = np.sort(history.loc[history['activity_type'] == activity_type, 'elapsed_time'].to_numpy())
+    candidates = np.asarray(candidates, dtype='int64')
+    
+    # Number of activities strictly shorter than each candidate
+    hidden = np.searchsorted(elapsed, candidates, side='left')
+    hidden[candidates <= 0] = 0
+    
+    return [
+        {'threshold': int(threshold), 'hidden': int(count)}
+        for threshold, count in zip(candidates, hidden)
+    ]
@@ -1,8 +1,9 @@
-import requests
+import calendar
 from flask import current_app, url_for
 from datetime import datetime
 from models import db
 from models.user import User
+from services.strava_client import get_client
 
 def get_authorization_url():
     """Generate the Strava authorization URL"""
@@ -16,7 +17,7 @@ def get_authorization_url():
         'client_id': client_id,
         'redirect_uri': redirect_uri,
         'response_type': 'code',
-        'scope': 'activity:write,activity:read_all'
+        'scope': 'activity:write,activity:read_all,profile:read_all'
     }
     
     return f"{auth_url}?{'&'.join(f'{k}={v}' for k, v in params.items())}"
@@ -26,8 +27,9 @@ def exchange_token(code):
     client_id = current_app.config['STRAVA_CLIENT_ID']
     client_secret = current_app.config['STRAVA_CLIENT_SECRET']
     
-    response = requests.post(
-        'https://www.strava.com/oauth/token',
+    response = get_client().post(
+        '/oauth/token',
+        endpoint='oauth_token',
         data={
             'client_id': client_id,
             'client_secret': client_secret,
@@ -43,9 +45,10 @@ def exchange_token(code):
 
 def get_activity(activity_id, access_token):
     """Get activity details from Strava"""
-    response = requests.get(
-        f"https://www.strava.com/api/v3/activities/{activity_id}",
-        headers={'Authorization': f'Bearer {access_token}'}
+    response = get_client().get(
+        f"/api/v3/activities/{activity_id}",
+        endpoint='get_activity',
+        access_token=access_token
     )
     
     if response.status_code != 200:
@@ -53,64 +56,170 @@ def get_activity(activity_id, access_token):
         
     return response.json()
 
-def get_activity_streams(activity_id, access_token, stream_types=None):
-    """Get activity streams (detailed data) from Strava"""
+def get_activity_streams(activity_id, access_token, stream_types=None, resolution=None):
+    """Get activity streams (detailed data) from Strava.
+
+    `resolution` ('low', 'medium' or 'high') lets Strava downsample the
+    streams; by default every sample is returned.
+    """
     if stream_types is None:
         stream_types = ['time', 'heartrate', 'velocity_smooth', 'altitude', 'cadence', 'watts', 'grade_smooth']
     
-    response = requests.get(
-        f"https://www.strava.com/api/v3/activities/{activity_id}/streams",
-        headers={'Authorization': f'Bearer {access_token}'},
-        params={
-            'keys': ','.join(stream_types),
-            'key_by_type': True
-        }
+    # numpy is only needed once streams are fetched; keep it out of start-up
+    from services.streams import ActivityStreams
+    from services.stream_cache import get_stream_cache
+    
+    # Streams never change after upload, so serve them from disk when we can
+    cache = get_stream_cache()
+    if cache:
+        streams = cache.get(activity_id, stream_types, resolution)
+        if streams is not None:
+            return streams
+    
+    params = {
+        'keys': ','.join(stream_types),
+        'key_by_type': True
+    }
+    if resolution:
+        params.update({'resolution': resolution, 'series_type': 'time'})
+    
+    response = get_client().get(
+        f"/api/v3/activities/{activity_id}/streams",
+        endpoint='get_activity_streams',
+        access_token=access_token,
+        params=params
     )
     
     if response.status_code != 200:
         return None
         
-    return response.json()
+    streams = ActivityStreams.from_json(response.json())
+    if cache:
+        cache.put(activity_id, stream_types, streams, resolution)
+    
+    return streams
 
-def get_athlete_activities(access_token, page=1, per_page=30):
-    """Get athlete activities from Strava"""
-    response = requests.get(
-        "https://www.strava.com/api/v3/athlete/activities",
-        headers={'Authorization': f'Bearer {access_token}'},
-        params={
-            'page': page,
-            'per_page': per_page
-        }
+class MissingScope(Exception):
+    """Strava refused a call because the athlete did not grant the scope it needs"""
+
+def get_athlete_zones(access_token):
+    """Get the athlete's heart rate and power zones.
+
+    Needs the profile:read_all scope; raises MissingScope if the athlete
+    did not grant it.
+    """
+    response = get_client().get(
+        "/api/v3/athlete/zones",
+        endpoint='get_athlete_zones',
+        access_token=access_token
     )
     
+    if response.status_code == 403 or (response.status_code == 401 and _permission_missing(response)):
+        raise MissingScope('profile:read_all')
     if response.status_code != 200:
         return None
         
     return response.json()
 
-def hide_activity_from_feed(activity_id, access_token):
-    """Set the 'hide_from_home' flag to true for an activity"""
-    url = f"https://www.strava.com/api/v3/activities/{activity_id}"
+def _permission_missing(response):
+    """True if a 401 names a missing permission rather than a bad token"""
+    try:
+        errors = response.json().get('errors') or []
+    except (ValueError, AttributeError):
+        return False
+    return any(str(error.get('field', '')).endswith('permission') for error in errors)
+
+def get_athlete_activities(access_token, page=1, per_page=30, after=None, before=None):
+    """Get athlete activities from Strava.
+
+    `after`/`before` are datetimes (UTC) limiting the activities by start
+    date. When `after` is given Strava returns the oldest activities first.
+    """
+    params = {
+        'page': page,
+        'per_page': per_page
+    }
+    if after is not None:
+        params['after'] = to_epoch(after)
+    if before is not None:
+        params['before'] = to_epoch(before)
     
-    response = requests.put(
-        url,
-        headers={'Authorization': f'Bearer {access_token}'},
-        json={'hide_from_home': True}
+    response = get_client().get(
+        "/api/v3/athlete/activities",
+        endpoint='get_athlete_activities',
+        access_token=access_token,
+        params=params
     )
     
-    return response.status_code == 200
+    if response.status_code != 200:
+        return None
+        
+    return response.json()
+
+def to_epoch(value):
+    """Convert a naive UTC datetime to an epoch timestamp"""
+    return int(calendar.timegm(value.timetuple()))
+
+def parse_strava_datetime(value):
+    """Parse a Strava timestamp such as '2024-01-01T10:00:00Z' into a naive UTC datetime"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
+
+class ActivityUpdate:
+    """Collects field changes for one activity and sends them in a single PUT.
+
+    When the fetched activity JSON is given, fields that already have the
+    requested value are dropped, and nothing is sent if no field changes.
+    """
+    
+    def __init__(self, activity_id, activity=None):
+        self.activity_id = activity_id
+        self.activity = activity or {}
+        self.fields = {}
+    
+    def set(self, field, value):
+        self.fields[field] = value
+        return self
+    
+    def hide_from_feed(self):
+        return self.set('hide_from_home', True)
+    
+    def rename(self, title):
+        return self.set('name', title)
+    
+    @property
+    def changes(self):
+        """Fields whose requested value differs from the fetched activity"""
+        return {field: value for field, value in self.fields.items()
+                if field not in self.activity or self.activity[field] != value}
+    
+    def commit(self, access_token):
+        """Send the pending changes, returning True if the activity is up to date"""
+        changes = self.changes
+        if not changes:
+            return True
+        
+        response = get_client().put(
+            f"/api/v3/activities/{self.activity_id}",
+            endpoint='update_activity',
+            access_token=access_token,
+            json=changes
+        )
+        
+        if response.status_code != 200:
+            return False
+        
+        self.activity.update(changes)
+        return True
+
+def hide_activity_from_feed(activity_id, access_token):
+    """Set the 'hide_from_home' flag to true for an activity"""
+    return ActivityUpdate(activity_id).hide_from_feed().commit(access_token)
 
 def update_activity_title(activity_id, access_token, title):
     """Update the title of an activity"""
-    url = f"https://www.strava.com/api/v3/activities/{activity_id}"
-    
-    response = requests.put(
-        url,
-        headers={'Authorization': f'Bearer {access_token}'},
-        json={'name': title}
-    )
-    
-    return response.status_code == 200
+    return ActivityUpdate(activity_id).rename(title).commit(access_token)
 
 def register_webhook():
     """Register the Strava webhook (used during setup)"""
@@ -119,8 +228,9 @@ def register_webhook():
     verification_token = current_app.config['STRAVA_VERIFICATION_TOKEN']
     callback_url = url_for('webhook.event', _external=True)
     
-    response = requests.post(
-        'https://www.strava.com/api/v3/push_subscriptions',
+    response = get_client().post(
+        '/api/v3/push_subscriptions',
+        endpoint='push_subscriptions',
         data={
             'client_id': client_id,
             'client_secret': client_secret,
@@ -0,0 +1,143 @@
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app, has_app_context
+from services.rate_limit import RateLimitGovernor, RateLimitExceeded, retry_after_throttled
+from services.metrics import strava_request_seconds
+from services.tracing import span
+
+STRAVA_BASE_URL = 'https://www.strava.com'
+
+class StravaClient:
+    """Pooled, keep-alive HTTP client for the Strava API.
+
+    A single client is shared by the whole process so connections (and their
+    TLS sessions) are reused across calls instead of being re-established for
+    every request. API calls are metered by the optional rate limit governor.
+    """
+    
+    def __init__(self, base_url=STRAVA_BASE_URL, pool_size=10, timeout=(3.05, 15), governor=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.governor = governor
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+        
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+    
+    def request(self, method, path, endpoint=None, access_token=None, **kwargs):
+        """Send a request to Strava and record its latency under `endpoint`.
+
+        Raises RateLimitExceeded when the local budget is used up or Strava
+        answers 429 (its limits are shared by every host of the application),
+        so queued jobs are rescheduled instead of treating it as a failure.
+        """
+        headers = kwargs.pop('headers', None) or {}
+        if access_token:
+            headers['Authorization'] = f'Bearer {access_token}'
+        kwargs.setdefault('timeout', self.timeout)
+        
+        # OAuth endpoints are not subject to the API rate limits
+        governor = self.governor if path.startswith('/api/') else None
+        if governor:
+            with span('rate_limit_wait'):
+                governor.acquire()
+        
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            with span(f"strava.{endpoint or path}"):
+                response = self.session.request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
+            status = response.status_code
+        finally:
+            elapsed = time.perf_counter() - start
+            self._record(endpoint or path, elapsed)
+            strava_request_seconds.observe(elapsed, endpoint=endpoint or path, status=status)
+        
+        if governor:
+            governor.update_from_headers(response.headers)
+        
+        if response.status_code == 429:
+            if governor:
+                governor.mark_exhausted()
+            raise RateLimitExceeded(retry_after_throttled(response.headers))
+        
+        return response
+    
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+    
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+    
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+    
+    def _record(self, endpoint, elapsed):
+        with self._stats_lock:
+            stats = self._stats.setdefault(endpoint, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stats['count'] += 1
+            stats['total_seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+    
+    def latency_stats(self):
+        """Per-endpoint call counts and latencies (in seconds)"""
+        with self._stats_lock:
+            return {
+                endpoint: dict(stats, avg_seconds=stats['total_seconds'] / stats['count'])
+                for endpoint, stats in self._stats.items()
+            }
+    
+    def close(self):
+        self.session.close()
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return the process-wide Strava client, creating it from app config on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+def set_client(client):
+    """Replace the process-wide Strava client (e.g. to point at a local stand-in)"""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+    return previous
+
+def _create_client():
+    if not has_app_context():
+        return StravaClient()
+    
+    config = current_app.config
+    pool_size = config['STRAVA_POOL_SIZE']
+    if config['JOB_WORKER_MODE'] == 'async':
+        # Every I/O thread of the asyncio worker may hold a connection
+        pool_size = max(pool_size, config['ASYNC_IO_THREADS'])
+    
+    return StravaClient(
+        base_url=config['STRAVA_BASE_URL'],
+        pool_size=pool_size,
+        timeout=(config['STRAVA_CONNECT_TIMEOUT'], config['STRAVA_READ_TIMEOUT']),
+        governor=RateLimitGovernor(
+            config['STRAVA_RATE_LIMIT_STATE_PATH'],
+            short_limit=config['STRAVA_RATE_LIMIT_SHORT'],
+            long_limit=config['STRAVA_RATE_LIMIT_DAILY'],
+            backfill_reserve=config['STRAVA_RATE_LIMIT_BACKFILL_RESERVE'],
+            max_wait=config['STRAVA_RATE_LIMIT_MAX_WAIT']
+        )
+    )
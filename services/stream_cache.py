@@ -0,0 +1,210 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from flask import current_app, has_app_context
+from services.locks import file_lock
+from services.streams import ActivityStreams
+
+MANIFEST = 'manifest.json'
+
+# Running total of the cache's size, shared by every process using the directory
+USAGE = 'usage.json'
+
+# Eviction frees space down to this share of `max_bytes`, so it does not run on every write
+EVICT_TO = 0.9
+
+# Bumped when the stored arrays change (e.g. their dtypes), so older entries are refetched
+CACHE_FORMAT = 2
+
+# Strava stream resolutions from coarsest to finest (None is every sample)
+RESOLUTION_RANK = {'low': 0, 'medium': 1, 'high': 2, None: 3}
+
+class StreamCache:
+    """On-disk cache of activity streams, one directory per activity.
+
+    Streams never change after upload, so each stream is stored as a ``.npy``
+    file and read back memory-mapped. A manifest records which stream keys
+    were requested, so a cached miss (stream not recorded) is not refetched,
+    and at which resolution, so downsampled streams never stand in for finer
+    ones. The least recently used activities are evicted once the cache grows past
+    `max_bytes`.
+
+    Each manifest also records the entry's size, and a usage file keeps the
+    total, so a write only scans the cache when it pushes the total over
+    `max_bytes`.
+    """
+    
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._usage_path = os.path.join(cache_dir, USAGE)
+        os.makedirs(cache_dir, exist_ok=True)
+    
+    def _entry_dir(self, activity_id):
+        return os.path.join(self.cache_dir, str(activity_id))
+    
+    def _read_manifest(self, entry_dir):
+        try:
+            with open(os.path.join(entry_dir, MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _entry_bytes(self, entry_dir, manifest=None):
+        """Size of an entry's stream files, from its manifest when it records one"""
+        if manifest is not None and 'bytes' in manifest:
+            return manifest['bytes']
+        try:
+            return sum(f.stat().st_size for f in os.scandir(entry_dir) if f.name.endswith('.npy'))
+        except OSError:
+            return 0
+    
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def get(self, activity_id, keys, resolution=None):
+        """Return cached ActivityStreams covering `keys` at `resolution` or finer, or None on a miss"""
+        entry_dir = self._entry_dir(activity_id)
+        manifest = self._read_manifest(entry_dir)
+        
+        if (manifest is None or manifest.get('format') != CACHE_FORMAT or not set(keys) <= set(manifest['requested'])
+                or RESOLUTION_RANK[manifest.get('resolution')] < RESOLUTION_RANK[resolution]):
+            self._count(hit=False)
+            return None
+        
+        arrays = {}
+        try:
+            for key in set(keys) & set(manifest['available']):
+                arrays[key] = np.load(os.path.join(entry_dir, f"{key}.npy"), mmap_mode='r')
+            # Mark as recently used for eviction
+            os.utime(os.path.join(entry_dir, MANIFEST))
+        except (OSError, ValueError):
+            self._count(hit=False)
+            return None
+        
+        self._count(hit=True)
+        return ActivityStreams(arrays)
+    
+    def put(self, activity_id, keys, streams, resolution=None):
+        """Store the streams fetched for `keys`, merging with what is already cached at that resolution"""
+        entry_dir = self._entry_dir(activity_id)
+        os.makedirs(entry_dir, exist_ok=True)
+        
+        manifest = self._read_manifest(entry_dir)
+        old_bytes = self._entry_bytes(entry_dir, manifest) if manifest is not None else 0
+        if manifest is not None and (manifest.get('resolution') != resolution or manifest.get('format') != CACHE_FORMAT):
+            # Streams of different resolutions do not line up, and older formats are replaced, so start over
+            for key in manifest['available']:
+                try:
+                    os.remove(os.path.join(entry_dir, f"{key}.npy"))
+                except OSError:
+                    pass
+            manifest = None
+        manifest = manifest or {'requested': [], 'available': []}
+        requested = set(manifest['requested']) | set(keys)
+        available = set(manifest['available'])
+        
+        for key in keys:
+            array = streams.get(key)
+            if array is None:
+                continue
+            # Write to a temp file and rename so readers never see partial files
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(array))
+            os.replace(tmp_path, os.path.join(entry_dir, f"{key}.npy"))
+            available.add(key)
+        
+        new_bytes = 0
+        for key in available:
+            try:
+                new_bytes += os.path.getsize(os.path.join(entry_dir, f"{key}.npy"))
+            except OSError:
+                pass
+        
+        fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'requested': sorted(requested), 'available': sorted(available), 'resolution': resolution,
+                       'bytes': new_bytes, 'format': CACHE_FORMAT}, f)
+        os.replace(tmp_path, os.path.join(entry_dir, MANIFEST))
+        
+        self._add_usage(new_bytes - old_bytes)
+    
+    def _add_usage(self, delta):
+        """Update the shared size total, evicting if the cache has outgrown `max_bytes`"""
+        with file_lock(self._usage_path) as f:
+            f.seek(0)
+            try:
+                total = json.loads(f.read() or '{}').get('bytes')
+            except (ValueError, AttributeError):
+                total = None
+            
+            # No total yet (new or upgraded cache): count it once
+            if total is None or total + delta > self.max_bytes:
+                total = self.evict()
+            else:
+                total += delta
+            
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({'bytes': total}))
+            f.flush()
+    
+    def evict(self):
+        """Remove least recently used activities once the cache is over `max_bytes`, returning its size.
+
+        Scans every entry, so it only runs when the running total says the
+        cache is full (or is unknown), and frees space down to EVICT_TO of the
+        limit.
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir():
+                continue
+            try:
+                size = self._entry_bytes(entry.path, self._read_manifest(entry.path))
+                last_used = os.stat(os.path.join(entry.path, MANIFEST)).st_mtime
+            except OSError:
+                continue
+            entries.append((last_used, size, entry.path))
+            total += size
+        
+        if total <= self.max_bytes:
+            return total
+        
+        for last_used, size, path in sorted(entries):
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        return total
+    
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_stream_cache():
+    """Return the process-wide stream cache, or None if caching is disabled"""
+    global _cache
+    if _cache is None and has_app_context() and current_app.config['STREAM_CACHE_DIR']:
+        with _cache_lock:
+            if _cache is None:
+                _cache = StreamCache(
+                    current_app.config['STREAM_CACHE_DIR'],
+                    max_bytes=current_app.config['STREAM_CACHE_MAX_BYTES']
+                )
+    return _cache
@@ -0,0 +1,137 @@
+import numpy as np
+
+# Compact storage type for each Strava stream. Velocity, altitude and grade
+# stay float64: the title analytics read them and must give the same results
+# as the Python floats of the JSON
+STREAM_DTYPES = {
+    'time': np.int32,
+    'distance': np.float32,
+    'heartrate': np.int16,
+    'velocity_smooth': np.float64,
+    'altitude': np.float64,
+    'cadence': np.int16,
+    'watts': np.int16,
+    'grade_smooth': np.float64,
+    'temp': np.int16,
+    'moving': np.bool_
+}
+
+def to_array(key, data):
+    """Convert one stream's JSON data list to a typed array"""
+    dtype = STREAM_DTYPES.get(key, np.float32)
+    try:
+        return np.asarray(data, dtype=dtype)
+    except (TypeError, ValueError):
+        # Gaps (null samples) can only be represented as NaN
+        return np.array([np.nan if value is None else value for value in data], dtype=np.float64)
+
+def drop_gaps(values):
+    """The samples of a stream that are not gaps (NaN), or None for a missing stream"""
+    if values is None:
+        return None
+    values = np.asarray(values)
+    if values.dtype.kind != 'f':
+        return values
+    return values[~np.isnan(values)]
+
+def fill_gaps(values):
+    """A stream with its gaps (NaN) interpolated from the samples around them.
+
+    For analyses that line several streams up sample by sample, where
+    dropping gaps would shift one stream against the others. Returns None if
+    the stream is missing or has no samples at all.
+    """
+    if values is None:
+        return None
+    values = np.asarray(values)
+    if values.dtype.kind != 'f':
+        return values
+    gaps = np.isnan(values)
+    if not gaps.any():
+        return values
+    if gaps.all():
+        return None
+    filled = values.copy()
+    filled[gaps] = np.interp(np.flatnonzero(gaps), np.flatnonzero(~gaps), values[~gaps])
+    return filled
+
+class ActivityStreams:
+    """Columnar activity streams backed by typed NumPy arrays.
+
+    Built once from Strava's key_by_type JSON. By default every stream is
+    converted straight away so the decoded JSON lists can be freed; with
+    ``lazy=True`` a stream is only converted (and its list released) the first
+    time it is read.
+    """
+    __slots__ = ('_arrays', '_raw')
+    
+    def __init__(self, arrays=None):
+        self._arrays = dict(arrays or {})
+        self._raw = {}
+    
+    @classmethod
+    def from_json(cls, data, lazy=False):
+        """Build from a Strava streams response (key_by_type=true)"""
+        streams = cls()
+        for key, stream in (data or {}).items():
+            values = stream.get('data') if isinstance(stream, dict) else None
+            if values is None or key == 'latlng':
+                continue
+            if lazy:
+                streams._raw[key] = values
+            else:
+                streams._arrays[key] = to_array(key, values)
+        return streams
+    
+    def get(self, key):
+        """Return the typed array for a stream, or None if it was not fetched"""
+        array = self._arrays.get(key)
+        if array is None and key in self._raw:
+            array = self._arrays[key] = to_array(key, self._raw.pop(key))
+        return array
+    
+    def keys(self):
+        return set(self._arrays) | set(self._raw)
+    
+    def __contains__(self, key):
+        return key in self._arrays or key in self._raw
+    
+    def __bool__(self):
+        return bool(self._arrays or self._raw)
+    
+    @property
+    def nbytes(self):
+        """Memory held by the materialized arrays"""
+        return sum(array.nbytes for array in self._arrays.values())
+    
+    @property
+    def time(self):
+        return self.get('time')
+    
+    @property
+    def distance(self):
+        return self.get('distance')
+    
+    @property
+    def heartrate(self):
+        return self.get('heartrate')
+    
+    @property
+    def velocity(self):
+        return self.get('velocity_smooth')
+    
+    @property
+    def altitude(self):
+        return self.get('altitude')
+    
+    @property
+    def cadence(self):
+        return self.get('cadence')
+    
+    @property
+    def watts(self):
+        return self.get('watts')
+    
+    @property
+    def grade(self):
+        return self.get('grade_smooth')
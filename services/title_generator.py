@@ -1,75 +1,115 @@
 import numpy as np
-import statistics
+from collections import namedtuple
 from datetime import timedelta, datetime
+from services.streams import ActivityStreams, drop_gaps, fill_gaps
+from services.metrics import title_generation_seconds
+from services.segments import INTERVAL_TYPES, describe_climbs, describe_intervals, detect_climbs, detect_intervals
 
-def analyze_heart_rate(hr_data):
-    """Analyze heart rate data to determine intensity zones"""
-    if not hr_data or len(hr_data) < 10:
+# Heart rate zone boundaries as percentage of max HR
+# Zone 1: Recovery (< 60% of max)
+# Zone 2: Endurance (60-70% of max)
+# Zone 3: Tempo (70-80% of max)
+# Zone 4: Threshold (80-90% of max)
+# Zone 5: VO2 Max (> 90% of max)
+HR_ZONE_EDGES = np.array([60, 70, 80, 90])
+
+# Strava stream resolutions, coarsest first; None asks for every sample
+RESOLUTIONS = ['low', 'medium', 'high', None]
+
+# What each title analyzer needs: the streams it reads, the coarsest resolution
+# that gives the same result, and which activities it applies to
+Analyzer = namedtuple('Analyzer', ['name', 'streams', 'resolution', 'applies'])
+
+ANALYZERS = [
+    # Time-in-zone shares survive downsampling
+    Analyzer('heart_rate', ('heartrate',), 'medium',
+             lambda activity: activity.get('has_heartrate', True) and not activity.get('manual')),
+    # Pace changes and climbs are measured sample to sample, so they need every sample
+    Analyzer('pace', ('velocity_smooth',), None,
+             lambda activity: not activity.get('manual')),
+    Analyzer('elevation', ('altitude',), None,
+             lambda activity: not activity.get('manual') and not activity.get('trainer')),
+    # Segments are measured in seconds and meters along the activity
+    Analyzer('intervals', ('distance', 'time', 'velocity_smooth'), None,
+             lambda activity: not activity.get('manual')
+             and (activity.get('type') in INTERVAL_TYPES or activity.get('trainer'))),
+    Analyzer('climbs', ('altitude', 'distance', 'time'), None,
+             lambda activity: not activity.get('manual') and not activity.get('trainer'))
+]
+
+def stream_request(activity=None, enabled=None):
+    """Stream keys and resolution needed by the `enabled` analyzers that apply to `activity`.
+
+    Without an activity every enabled analyzer counts. Returns no keys when
+    none applies, so the streams call can be skipped.
+    """
+    analyzers = [
+        analyzer for analyzer in ANALYZERS
+        if (enabled is None or analyzer.name in enabled) and (activity is None or analyzer.applies(activity))
+    ]
+    keys = sorted({key for analyzer in analyzers for key in analyzer.streams})
+    resolution = max((analyzer.resolution for analyzer in analyzers), key=RESOLUTIONS.index, default=None)
+    return keys, resolution
+
+def analyze_heart_rate(hr_data, zone_edges=None):
+    """Analyze heart rate data to determine intensity zones.
+
+    `zone_edges` are the athlete's lower bounds (bpm) of zones 2-5. Without
+    them, zones are estimated relative to the highest HR of the activity.
+    """
+    # Gaps (dropouts of the strap) are left out rather than counted
+    hr = drop_gaps(hr_data)
+    if hr is None or len(hr) < 10:
         return None
     
-    avg_hr = statistics.mean(hr_data)
-    max_hr = max(hr_data)
-    
-    # Determine intensity based on percentage of max HR
-    # Assuming max HR is the highest recorded in the activity
-    # This is a simplification - ideally we'd use the user's known max HR
+    avg_hr = hr.mean()
+    max_hr = hr.max()
+    if max_hr <= 0:
+        return None
     
     # Calculate time spent in different zones
-    # Zone 1: Recovery (< 60% of max)
-    # Zone 2: Endurance (60-70% of max)
-    # Zone 3: Tempo (70-80% of max)
-    # Zone 4: Threshold (80-90% of max)
-    # Zone 5: VO2 Max (> 90% of max)
-    
-    zone_counts = [0, 0, 0, 0, 0]
-    
-    for hr in hr_data:
+    if zone_edges is not None:
+        zones = np.searchsorted(np.asarray(zone_edges), hr, side='right')
+    else:
+        # Percentage of the activity's own max HR, which overstates easy efforts
         hr_percent = hr / max_hr * 100
-        if hr_percent < 60:
-            zone_counts[0] += 1
-        elif hr_percent < 70:
-            zone_counts[1] += 1
-        elif hr_percent < 80:
-            zone_counts[2] += 1
-        elif hr_percent < 90:
-            zone_counts[3] += 1
-        else:
-            zone_counts[4] += 1
+        zones = np.searchsorted(HR_ZONE_EDGES, hr_percent, side='right')
+    zone_counts = np.bincount(zones, minlength=len(HR_ZONE_EDGES) + 1)
     
     # Determine primary zone (where most time was spent)
-    primary_zone = zone_counts.index(max(zone_counts)) + 1
+    primary_zone = int(zone_counts.argmax()) + 1
     
     # Calculate percentage of time in each zone
-    total_points = len(hr_data)
-    zone_percentages = [count / total_points * 100 for count in zone_counts]
+    zone_percentages = (zone_counts / len(hr) * 100).tolist()
     
     return {
-        'avg_hr': avg_hr,
-        'max_hr': max_hr,
+        'avg_hr': float(avg_hr),
+        'max_hr': max_hr.item(),
         'primary_zone': primary_zone,
-        'zone_percentages': zone_percentages
+        'zone_percentages': zone_percentages,
+        'athlete_zones': zone_edges is not None
     }
 
 def analyze_pace(velocity_data, activity_type):
     """Analyze pace data to determine effort level"""
-    if not velocity_data or len(velocity_data) < 10:
+    velocity = drop_gaps(np.asarray(velocity_data, dtype=float)) if velocity_data is not None else None
+    if velocity is None or len(velocity) < 10:
         return None
     
     # Convert velocity (m/s) to pace (min/km or min/mile)
     # For running and walking, we use min/km
     # For cycling, we use km/h
     
-    avg_velocity = statistics.mean(velocity_data)
-    max_velocity = max(velocity_data)
+    # numpy's pairwise sum can land an ulp off the exact mean the original
+    # statistics.mean gave, which flips a truncated pace (3:59 vs 4:00);
+    # a second pass over the residuals corrects it
+    avg_velocity = velocity.mean()
+    avg_velocity = float(avg_velocity + (velocity - avg_velocity).mean())
+    max_velocity = velocity.max().item()
     
     # Calculate pace variations
-    if len(velocity_data) > 1:
-        velocity_std = statistics.stdev(velocity_data)
-        velocity_changes = [abs(velocity_data[i] - velocity_data[i-1]) for i in range(1, len(velocity_data))]
-        avg_change = statistics.mean(velocity_changes) if velocity_changes else 0
-    else:
-        velocity_std = 0
-        avg_change = 0
+    velocity_std = float(velocity.std(ddof=1))
+    avg_change = float(np.abs(np.diff(velocity)).mean())
     
     # Determine if this was interval training
     # High standard deviation and frequent changes indicate intervals
@@ -98,32 +138,94 @@ def analyze_pace(velocity_data, activity_type):
         'velocity_variation': velocity_std
     }
 
+def cumulative_ascent(altitude_diffs):
+    """Total ascent up to each sample (starting at 0), summed in sample order"""
+    return np.concatenate(([0.0], np.cumsum(np.maximum(altitude_diffs, 0))))
+
+def find_climbs(altitude_diffs, ascent=None, min_gain=10):
+    """Find significant climbs (continuous uphill sections) from altitude differences.
+
+    A climb accumulates every rise. A drop of more than 1m ends it, while a
+    smaller dip only resets it as long as it has not yet gained `min_gain`.
+    Returns the gain of every climb above `min_gain`, in order.
+
+    Climb boundaries come from differences of the cumulative ascent, which
+    round differently from a running total. Gains that land within
+    CLIMB_ROUNDING of `min_gain`, and the reported gains themselves, are
+    summed from the start of their climb like the sample-by-sample loop.
+    """
+    diffs = np.asarray(altitude_diffs, dtype=float)
+    rises = np.maximum(diffs, 0)
+    
+    # Cumulative ascent after each sample, so the gain between two positions
+    # is a simple difference
+    if ascent is None:
+        ascent = cumulative_ascent(diffs)
+    
+    # Only descending samples can end or reset a climb
+    events = np.flatnonzero(diffs < 0)
+    if len(events) == 0:
+        gain = _running_gain(rises, 0, len(diffs))
+        return [gain] if gain > min_gain else []
+    
+    is_drop = diffs[events] < -1
+    
+    # Gain since the previous event, which is the running climb as long as
+    # that event reset it
+    previous_start = np.concatenate(([0], events[:-1] + 1))
+    gain_since_previous = ascent[events + 1] - ascent[previous_start]
+    
+    # Within a section between drops, small dips keep resetting the climb until
+    # the first one reached with more than `min_gain` gained; from then on the
+    # climb carries on to the next drop
+    section = np.cumsum(is_drop) - is_drop
+    holds = ~is_drop & _gains_above(gain_since_previous, min_gain, rises, previous_start, events + 1)
+    held_so_far = np.cumsum(holds)
+    section_starts = np.searchsorted(section, section, side='left')
+    held_before_section = np.where(section_starts > 0, held_so_far[section_starts - 1], 0)
+    resets = is_drop | (held_so_far - held_before_section == 0)
+    
+    # Each drop closes the climb that started after the last reset before it
+    positions = np.arange(len(events))
+    last_reset = np.maximum.accumulate(np.where(resets, positions, -1))
+    reset_before = np.concatenate(([-1], last_reset[:-1]))
+    climb_start = np.where(reset_before >= 0, events[np.maximum(reset_before, 0)] + 1, 0)
+    
+    # Closing drops and the climb still open at the end, as sample ranges
+    starts = np.append(climb_start[is_drop], events[last_reset[-1]] + 1 if last_reset[-1] >= 0 else 0)
+    stops = np.append(events[is_drop] + 1, len(diffs))
+    significant = _gains_above(ascent[stops] - ascent[starts], min_gain, rises, starts, stops)
+    
+    return [_running_gain(rises, start, stop) for start, stop in zip(starts[significant], stops[significant])]
+
+# Cumulative ascent differences are within this many meters of the running total
+CLIMB_ROUNDING = 1e-4
+
+def _running_gain(rises, start, stop):
+    """Ascent over rises[start:stop], added up one sample at a time"""
+    return float(np.cumsum(rises[start:stop])[-1]) if stop > start else 0.0
+
+def _gains_above(gains, min_gain, rises, starts, stops):
+    """gains > min_gain, settling the ones too close to call with the running total"""
+    above = gains > min_gain
+    for i in np.flatnonzero(np.abs(gains - min_gain) <= CLIMB_ROUNDING):
+        above[i] = _running_gain(rises, starts[i], stops[i]) > min_gain
+    return above
+
 def analyze_elevation(altitude_data, grade_data=None):
     """Analyze elevation data to determine climb characteristics"""
-    if not altitude_data or len(altitude_data) < 10:
+    altitude = drop_gaps(np.asarray(altitude_data, dtype=float)) if altitude_data is not None else None
+    if altitude is None or len(altitude) < 10:
         return None
     
+    altitude_diffs = np.diff(altitude)
+    
     # Calculate total elevation gain
-    elevation_changes = [max(0, altitude_data[i] - altitude_data[i-1]) for i in range(1, len(altitude_data))]
-    total_gain = sum(elevation_changes)
+    ascent = cumulative_ascent(altitude_diffs)
+    total_gain = float(ascent[-1])
     
     # Find significant climbs (continuous uphill sections)
-    climbs = []
-    current_climb = 0
-    
-    for i in range(1, len(altitude_data)):
-        diff = altitude_data[i] - altitude_data[i-1]
-        if diff > 0:
-            current_climb += diff
-        elif diff < -1 and current_climb > 10:  # End of climb (allowing for small flat sections)
-            climbs.append(current_climb)
-            current_climb = 0
-        elif diff < 0 and current_climb <= 10:
-            current_climb = 0
-    
-    # Add the last climb if it's significant
-    if current_climb > 10:
-        climbs.append(current_climb)
+    climbs = find_climbs(altitude_diffs, ascent)
     
     # Determine if this was a hilly workout
     is_hilly = total_gain > 100  # More than 100m elevation gain
@@ -142,8 +244,39 @@ def analyze_elevation(altitude_data, grade_data=None):
         'num_significant_climbs': len(climbs)
     }
 
-def generate_workout_title(activity, streams):
-    """Generate a descriptive title based on activity data and streams"""
+def analyze_intervals(streams):
+    """Detect a structured interval session from the velocity stream"""
+    # Streams are lined up sample by sample, so gaps are interpolated rather than dropped
+    intervals = detect_intervals(fill_gaps(streams.velocity), fill_gaps(streams.time), fill_gaps(streams.distance))
+    if not intervals:
+        return None
+    
+    return {
+        'reps': len(intervals['work']),
+        'label': describe_intervals(intervals['work']),
+        'work': intervals['work'],
+        'rest': intervals['rest']
+    }
+
+def analyze_climbs(streams):
+    """Detect the climbs of an activity from the altitude stream"""
+    climbs = detect_climbs(fill_gaps(streams.altitude), fill_gaps(streams.distance), fill_gaps(streams.time))
+    if not climbs:
+        return None
+    
+    return {
+        'count': len(climbs),
+        'max_gain': max(climb.gain for climb in climbs),
+        'label': describe_climbs(climbs),
+        'climbs': climbs
+    }
+
+def generate_workout_title(activity, streams, analyzers=None, hr_zones=None):
+    """Generate a descriptive title based on activity data and streams.
+
+    `analyzers` limits the analyses run to those names (default: all);
+    `hr_zones` are the athlete's heart rate zone edges, when known.
+    """
     if not activity or not streams:
         return "Workout"
     
@@ -157,16 +290,21 @@ def generate_workout_title(activity, streams):
     if time_str.startswith('0:'):
         time_str = time_str[2:]  # Remove leading 0:
     
-    # Extract streams data
-    hr_data = streams.get('heartrate', {}).get('data', []) if 'heartrate' in streams else []
-    velocity_data = streams.get('velocity_smooth', {}).get('data', []) if 'velocity_smooth' in streams else []
-    altitude_data = streams.get('altitude', {}).get('data', []) if 'altitude' in streams else []
-    grade_data = streams.get('grade_smooth', {}).get('data', []) if 'grade_smooth' in streams else []
+    # Accept raw Strava JSON as well
+    if not isinstance(streams, ActivityStreams):
+        streams = ActivityStreams.from_json(streams)
     
     # Analyze data
-    hr_analysis = analyze_heart_rate(hr_data)
-    pace_analysis = analyze_pace(velocity_data, activity_type)
-    elevation_analysis = analyze_elevation(altitude_data, grade_data)
+    applicable = {analyzer.name for analyzer in ANALYZERS if analyzer.applies(activity)}
+    
+    def enabled(name):
+        return name in applicable and (analyzers is None or name in analyzers)
+    
+    hr_analysis = analyze_heart_rate(streams.heartrate, hr_zones) if enabled('heart_rate') else None
+    pace_analysis = analyze_pace(streams.velocity, activity_type) if enabled('pace') else None
+    elevation_analysis = analyze_elevation(streams.altitude) if enabled('elevation') else None
+    interval_analysis = analyze_intervals(streams) if enabled('intervals') else None
+    climb_analysis = analyze_climbs(streams) if enabled('climbs') else None
     
     # Build title components
     title_parts = []
@@ -184,9 +322,9 @@ def generate_workout_title(activity, streams):
         elif hr_analysis['primary_zone'] == 5:
             title_parts.append("High Intensity")
     
-    # Workout structure based on pace
-    if pace_analysis and pace_analysis.get('is_interval'):
-        title_parts.append("Interval")
+    # Workout structure from the detected work/rest segments
+    if interval_analysis:
+        title_parts.append(f"{interval_analysis['label']} Intervals")
     
     # Terrain descriptor based on elevation
     if elevation_analysis:
@@ -208,6 +346,10 @@ def generate_workout_title(activity, streams):
     # Add elevation if significant
     if elevation_analysis and elevation_analysis.get('total_gain', 0) > 50:
         title_parts.append(f"with {int(elevation_analysis['total_gain'])}m gain")
+        if climb_analysis:
+            title_parts.append(f"({climb_analysis['label']})")
+    elif climb_analysis:
+        title_parts.append(f"with {climb_analysis['label']}")
     
     # Combine all parts
     title = " ".join(title_parts)
@@ -221,10 +363,11 @@ def calculate_days_remaining():
     days_remaining = (target_date - current_date).days
     return days_remaining
 
-def generate_title_for_activity(activity, streams):
+def generate_title_for_activity(activity, streams, analyzers=None, hr_zones=None):
     """Generate a title for an activity based on its data"""
     try:
-        base_title = generate_workout_title(activity, streams)
+        with title_generation_seconds.time():
+            base_title = generate_workout_title(activity, streams, analyzers, hr_zones)
         days_remaining = calculate_days_remaining()
         return f"{base_title} D-{days_remaining}"
     except Exception as e:
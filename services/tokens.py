@@ -0,0 +1,32 @@
+import os
+from datetime import datetime, timedelta
+from flask import current_app
+from models import db
+from services.locks import file_lock
+
+TOKEN_FIELDS = ['access_token', 'refresh_token', 'token_expiry']
+
+def token_is_fresh(user, margin=None):
+    """True if the user's access token is valid for at least `margin` more seconds"""
+    if margin is None:
+        margin = current_app.config['TOKEN_REFRESH_MARGIN']
+    return bool(user.token_expiry) and user.token_expiry > datetime.utcnow() + timedelta(seconds=margin)
+
+def get_valid_token(user):
+    """Return a valid access token, refreshing it shortly before it expires.
+
+    Refreshes are single-flight per user across threads and processes: the
+    first caller refreshes under a lock while the others wait and then pick up
+    the new token, so Strava's rotated refresh token is never used twice.
+    """
+    if token_is_fresh(user):
+        return user.access_token
+    
+    lock_path = os.path.join(current_app.config['TOKEN_LOCK_DIR'], f"user_{user.id}.lock")
+    with file_lock(lock_path):
+        # Another worker may have refreshed the token while we waited
+        db.session.refresh(user, TOKEN_FIELDS)
+        if not token_is_fresh(user):
+            user.refresh_strava_token()
+    
+    return user.access_token
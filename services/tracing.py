@@ -0,0 +1,203 @@
+import atexit
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+
+# The trace being recorded in this context (None when not sampled)
+_current_trace = contextvars.ContextVar('trace', default=None)
+_current_depth = contextvars.ContextVar('trace_span_depth', default=0)
+
+class Trace:
+    """Timings of the stages of one traced operation"""
+    
+    __slots__ = ('name', 'attributes', 'started_at', 'start', 'duration', 'spans', 'error')
+    
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = datetime.utcnow()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.error = None
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'attributes': self.attributes,
+            'started_at': self.started_at.isoformat() + 'Z',
+            'duration_ms': round(self.duration * 1000, 2),
+            'error': self.error,
+            'spans': [
+                {'name': name, 'depth': depth, 'offset_ms': round(offset * 1000, 2),
+                 'duration_ms': round(duration * 1000, 2)}
+                for name, depth, offset, duration in sorted(self.spans, key=lambda s: s[2])
+            ]
+        }
+
+class SlowTraces:
+    """Keeps the `size` slowest traces seen by this process, shared with other processes through files.
+    
+    Like the metrics registry, a background thread writes this process's
+    traces to ``<directory>/traces_<pid>.json`` every `flush_interval` seconds
+    when they changed, and slowest() merges the files of all processes, so any
+    gunicorn worker can show the slowest traces of the whole server and of
+    `flask worker` processes.
+    """
+    
+    def __init__(self, size=50, directory=None, flush_interval=5.0):
+        self.size = size
+        self.directory = directory or None
+        self.flush_interval = flush_interval
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        self._dirty = False
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        
+        # A forked worker starts with an empty buffer and its own file
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+        atexit.register(self.flush)
+    
+    def offer(self, trace):
+        entry = (trace.duration, next(self._counter), trace)
+        with self._lock:
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, entry)
+            elif trace.duration > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+            else:
+                return
+            self._dirty = True
+        
+        if self.directory and self._flusher_pid != os.getpid():
+            self._start_flusher()
+    
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='trace-flusher', daemon=True).start()
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Trace flush failed: {str(e)}")
+    
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._heap = []
+        self._flusher_pid = None
+        self._dirty = False
+    
+    def _path(self):
+        return os.path.join(self.directory, f"traces_{os.getpid()}.json")
+    
+    def _own(self):
+        with self._lock:
+            entries = sorted(self._heap, reverse=True)
+        return [dict(trace.to_dict(), pid=os.getpid()) for _, _, trace in entries]
+    
+    def flush(self):
+        """Write this process's traces to its file in the trace directory"""
+        if not self.directory or not self._dirty:
+            return
+        self._dirty = False
+        traces = self._own()
+        
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(traces, f)
+        os.replace(tmp_path, self._path())
+    
+    def slowest(self):
+        """The `size` slowest traces of all processes (this one read from memory), slowest first"""
+        traces = self._own()
+        if self.directory:
+            own_file = os.path.basename(self._path())
+            for filename in os.listdir(self.directory):
+                if not filename.startswith('traces_') or not filename.endswith('.json') or filename == own_file:
+                    continue
+                try:
+                    with open(os.path.join(self.directory, filename)) as f:
+                        traces.extend(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        
+        traces.sort(key=lambda t: t['duration_ms'], reverse=True)
+        return traces[:self.size]
+
+@contextmanager
+def trace(name, **attributes):
+    """Trace the enclosed block, sampled at TRACE_SAMPLE_RATE.
+    
+    Spans opened inside it (in this thread or in contexts copied from it)
+    are recorded on the trace, which is then offered to the slow trace
+    buffer. Yields the Trace, or None when it was not sampled.
+    """
+    sample_rate = current_app.config['TRACE_SAMPLE_RATE']
+    if _current_trace.get() is not None or sample_rate <= 0 or random.random() >= sample_rate:
+        yield None
+        return
+    
+    current = Trace(name, attributes)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_trace.reset(token)
+        current.duration = time.perf_counter() - current.start
+        get_slow_traces().offer(current)
+
+@contextmanager
+def span(name):
+    """Time a stage of the current trace (a no-op outside a sampled trace)"""
+    current = _current_trace.get()
+    if current is None:
+        yield
+        return
+    
+    depth = _current_depth.get()
+    token = _current_depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _current_depth.reset(token)
+        current.spans.append((name, depth, start - current.start, end - start))
+
+_slow_traces = None
+_slow_traces_lock = threading.Lock()
+
+def get_slow_traces():
+    """Return the process-wide slow trace buffer"""
+    global _slow_traces
+    if _slow_traces is None:
+        with _slow_traces_lock:
+            if _slow_traces is None:
+                _slow_traces = SlowTraces(
+                    current_app.config['TRACE_SLOW_COUNT'],
+                    directory=current_app.config['TRACE_DIR'],
+                    flush_interval=current_app.config['METRICS_FLUSH_INTERVAL']
+                )
+    return _slow_traces
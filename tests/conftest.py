@@ -0,0 +1,47 @@
+import os
+import tempfile
+import pytest
+
+# Configuration is read from the environment on import, so point it at
+# throwaway locations before the app is loaded
+_tmp = tempfile.mkdtemp(prefix='strava_filter_tests_')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(_tmp, 'test.db')}",
+    'DB_CREATE_ALL': 'false',
+    'JOB_WORKERS': '0',
+    'STREAM_CACHE_DIR': '',
+    'METRICS_DIR': '',
+    'TRACE_DIR': '',
+    'TRACE_SAMPLE_RATE': '0',
+    'STRAVA_RATE_LIMIT_STATE_PATH': os.path.join(_tmp, 'rate_limit.json'),
+    'TOKEN_LOCK_DIR': os.path.join(_tmp, 'token_locks'),
+})
+
+@pytest.fixture
+def app():
+    from app import create_app
+    from models import db
+    from models import user as user_module
+    from services.dedup import recent_webhook_events
+    
+    app = create_app('development')
+    app.config.update(TESTING=True)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user_module._snapshots = None
+        recent_webhook_events.clear()
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def user(app):
+    from datetime import datetime, timedelta
+    from models import db
+    from models.user import User
+    
+    user = User(strava_id=1001, username='runner', access_token='token', refresh_token='refresh',
+                token_expiry=datetime.utcnow() + timedelta(hours=6))
+    db.session.add(user)
+    db.session.commit()
+    return user
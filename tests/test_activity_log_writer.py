@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+import pytest
+from models import db
+from models.activity_log import ActivityLog
+from models.job import Job
+from models.user import User
+from services import activity, activity_log_writer
+from services.activity_log_writer import ActivityLogBatcher, log_activities
+from services.queue import claim_next, enqueue, job_handler, run_job
+
+def run(activity_id):
+    return {'id': activity_id, 'type': 'Run', 'name': 'Morning Run', 'elapsed_time': 600, 'distance': 2000,
+            'start_date': '2026-01-01T07:00:00Z'}
+
+@pytest.fixture
+def batcher(app, monkeypatch):
+    """Group commit for live events, flushed by the test rather than its thread"""
+    batcher = ActivityLogBatcher(app, window=3600)
+    monkeypatch.setattr(activity, 'get_batcher', lambda: batcher)
+    
+    @job_handler('log_test')
+    def log_test(activity_id, user_id):
+        activity.log_activity_process(db.session.get(User, user_id), run(activity_id), False)
+    
+    return batcher
+
+def run_jobs(user, activity_ids):
+    jobs = [enqueue('log_test', {'activity_id': activity_id, 'user_id': user.id}) for activity_id in activity_ids]
+    for _ in jobs:
+        run_job(claim_next('worker-1'))
+    return [job.id for job in jobs]
+
+def statuses(job_ids):
+    db.session.expire_all()
+    return [db.session.get(Job, job_id).status for job_id in job_ids]
+
+def test_counts_each_activity_once(app, user):
+    assert log_activities(user.id, [(run(1), True), (run(2), False)]) == 2
+    assert log_activities(user.id, [(run(2), True)]) == 0
+    
+    db.session.expire_all()
+    assert (user.activities_processed, user.activities_hidden) == (2, 2)
+    assert ActivityLog.query.filter_by(user_id=user.id).count() == 2
+
+def test_jobs_are_done_when_their_logs_commit(app, user, batcher):
+    job_ids = run_jobs(user, [1, 2])
+    
+    # Handed off to the batcher: not done until its transaction commits
+    assert statuses(job_ids) == ['running', 'running']
+    assert ActivityLog.query.count() == 0
+    
+    batcher.flush()
+    
+    assert statuses(job_ids) == ['done', 'done']
+    assert ActivityLog.query.count() == 2
+
+def test_jobs_are_retried_when_their_logs_fail(app, user, batcher, monkeypatch):
+    job_ids = run_jobs(user, [1, 2])
+    
+    def disk_full(*args, **kwargs):
+        raise RuntimeError('disk full')
+    
+    monkeypatch.setattr(activity_log_writer, 'log_activities', disk_full)
+    batcher.flush()
+    
+    assert statuses(job_ids) == ['pending', 'pending']
+    assert ActivityLog.query.count() == 0
+    
+    # The retry logs them
+    monkeypatch.setattr(activity_log_writer, 'log_activities', log_activities)
+    db.session.query(Job).update({'run_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    for _ in job_ids:
+        run_job(claim_next('worker-1'))
+    batcher.flush()
+    
+    assert statuses(job_ids) == ['done', 'done']
+    assert ActivityLog.query.count() == 2
@@ -0,0 +1,73 @@
+import pytest
+from services import strava
+from services.activity import commit_activity_rules
+from services.strava import ActivityUpdate
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+class FakeClient:
+    """Records the PUTs that would have gone to Strava"""
+    
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.puts = []
+    
+    def put(self, path, **kwargs):
+        self.puts.append((path, kwargs['json']))
+        return FakeResponse(self.status_code)
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(strava, 'get_client', lambda: client)
+    return client
+
+def short_run(**fields):
+    return dict({'id': 42, 'type': 'Run', 'elapsed_time': 600, 'name': 'Morning Run', 'hide_from_home': False}, **fields)
+
+def test_hide_and_rename_go_in_one_put(client):
+    activity = short_run()
+    
+    assert ActivityUpdate(42, activity).hide_from_feed().rename('Easy Run').commit('token') is True
+    
+    assert client.puts == [('/api/v3/activities/42', {'hide_from_home': True, 'name': 'Easy Run'})]
+    assert (activity['hide_from_home'], activity['name']) == (True, 'Easy Run')
+
+def test_nothing_is_sent_when_nothing_changes(client):
+    update = ActivityUpdate(42, short_run(hide_from_home=True)).hide_from_feed().rename('Morning Run')
+    
+    assert update.changes == {}
+    assert update.commit('token') is True
+    assert client.puts == []
+
+def test_only_changed_fields_are_sent(client):
+    ActivityUpdate(42, short_run(hide_from_home=True)).hide_from_feed().rename('Easy Run').commit('token')
+    
+    assert client.puts == [('/api/v3/activities/42', {'name': 'Easy Run'})]
+
+def test_unknown_fields_are_sent(client):
+    # Without the fetched activity every requested field is sent
+    ActivityUpdate(42).hide_from_feed().commit('token')
+    
+    assert client.puts == [('/api/v3/activities/42', {'hide_from_home': True})]
+
+def test_failed_put_leaves_the_activity_unchanged(client):
+    client.status_code = 500
+    activity = short_run()
+    
+    assert ActivityUpdate(42, activity).rename('Easy Run').commit('token') is False
+    assert activity['name'] == 'Morning Run'
+
+def test_rules_skip_activities_already_hidden(app, user, client):
+    result = commit_activity_rules(42, short_run(hide_from_home=True), user, 'token')
+    
+    assert result == {'should_hide': True, 'hidden': True, 'titled': False, 'updated': True}
+    assert client.puts == []
+
+def test_rules_send_hide_and_title_together(app, user, client):
+    result = commit_activity_rules(42, short_run(), user, 'token', 'Easy Run')
+    
+    assert result == {'should_hide': True, 'hidden': True, 'titled': True, 'updated': True}
+    assert client.puts == [('/api/v3/activities/42', {'hide_from_home': True, 'name': 'Easy Run'})]
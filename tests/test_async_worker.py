@@ -0,0 +1,78 @@
+import asyncio
+import time
+import pytest
+from models import db
+from models.job import Job
+from services import queue
+from services.async_worker import AsyncWorker
+from services.queue import async_job_handler, enqueue, hand_off_completion, job_handler
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Register job handlers for the test only"""
+    monkeypatch.setattr(queue, '_handlers', {})
+    monkeypatch.setattr(queue, '_async_handlers', {})
+    monkeypatch.setattr(queue, '_failure_handlers', {})
+
+def run_burst(app):
+    """Run an asyncio worker until the queue is empty"""
+    app.config['JOB_POLL_INTERVAL'] = 0.01
+    worker = AsyncWorker(app, max_in_flight=10, io_threads=4, cpu_threads=1, worker_id='async-1')
+    worker.run_forever(burst=True)
+    db.session.expire_all()
+
+def jobs(job_ids):
+    return [db.session.get(Job, job_id) for job_id in job_ids]
+
+def test_jobs_wait_concurrently(app, handlers):
+    seen = []
+    
+    @async_job_handler('slow')
+    async def slow(worker, n):
+        await asyncio.sleep(0.3)
+        seen.append(await worker.run_cpu(lambda: n * n))
+    
+    job_ids = [enqueue('slow', {'n': n}).id for n in range(5)]
+    started = time.monotonic()
+    run_burst(app)
+    
+    # Five 0.3 s waits overlap rather than adding up
+    assert time.monotonic() - started < 1.0
+    assert sorted(seen) == [0, 1, 4, 9, 16]
+    assert [job.status for job in jobs(job_ids)] == ['done'] * 5
+    assert {job.locked_by for job in jobs(job_ids)} == {'async-1'}
+
+def test_failed_coroutine_is_retried(app, handlers):
+    @async_job_handler('broken')
+    async def broken(worker):
+        raise RuntimeError('boom')
+    
+    job = enqueue('broken', {}, max_attempts=3)
+    run_burst(app)
+    
+    job = db.session.get(Job, job.id)
+    assert (job.status, job.attempts) == ('pending', 1)
+    assert 'boom' in job.last_error
+
+def test_sync_handlers_run_on_io_threads(app, handlers):
+    calls = []
+    job_handler('sync')(lambda n: calls.append(n))
+    
+    job = enqueue('sync', {'n': 1})
+    run_burst(app)
+    
+    assert calls == [1]
+    assert db.session.get(Job, job.id).status == 'done'
+
+def test_handed_off_job_is_left_to_its_writer(app, handlers):
+    claims = []
+    
+    @async_job_handler('handed_off')
+    async def handed_off(worker):
+        claims.append(hand_off_completion())
+    
+    job = enqueue('handed_off', {})
+    run_burst(app)
+    
+    assert claims == [(job.id, 'async-1')]
+    assert db.session.get(Job, job.id).status == 'running'
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+import pytest
+from models import db
+from models.activity_log import ActivityLog
+from models.job import Job
+from services import activity
+from services.activity import _handled_until
+from services.queue import claim_next, enqueue, recover_stale_jobs, running_job
+from services.strava import ActivityUpdate
+
+START = datetime(2026, 1, 1)
+
+def strava_activity(activity_id):
+    start_date = START + timedelta(hours=activity_id)
+    return {'id': activity_id, 'type': 'Run', 'elapsed_time': 600, 'distance': 2000,
+            'start_date': start_date.strftime('%Y-%m-%dT%H:%M:%SZ')}
+
+@pytest.fixture
+def strava(monkeypatch):
+    """Fake Strava history of 50 activities, processed without network calls"""
+    history = [strava_activity(i) for i in range(1, 51)]
+    fake = {'history': history, 'missing': set(), 'failing': set(), 'titles': {}}
+    
+    def get_athlete_activities(access_token, page, per_page, after):
+        newer = [a for a in history if datetime.strptime(a['start_date'], '%Y-%m-%dT%H:%M:%SZ') > after]
+        return newer[(page - 1) * per_page:page * per_page]
+    
+    def backfill_activity(activity_id, settings, access_token, generate_titles):
+        if activity_id in fake['missing']:
+            return None, None
+        full_activity = dict(history[activity_id - 1])
+        title = fake['titles'].get(activity_id)
+        return full_activity, activity.commit_activity_rules(activity_id, full_activity, settings, access_token, title)
+    
+    def commit(update, access_token):
+        # A failed PUT (e.g. a 500 from Strava)
+        return update.activity_id not in fake['failing']
+    
+    monkeypatch.setattr(activity, 'get_athlete_activities', get_athlete_activities)
+    monkeypatch.setattr(activity, '_backfill_activity', backfill_activity)
+    monkeypatch.setattr(ActivityUpdate, 'commit', commit)
+    return fake
+
+def test_checkpoints_keep_the_job_lock_fresh(app, user, strava):
+    app.config.update(JOB_LOCK_TIMEOUT=600, BACKFILL_CHECKPOINT_SIZE=20)
+    job = enqueue('historic_backfill', {})
+    claim_next('worker-1')
+    stale = datetime.utcnow() - timedelta(seconds=601)
+    db.session.get(Job, job.id).locked_at = stale
+    db.session.commit()
+    
+    with running_job(job.id, 'worker-1'):
+        activity.process_historic_activities(user, generate_titles=False)
+    
+    assert db.session.get(Job, job.id).locked_at > stale
+    assert recover_stale_jobs() == 0
+
+def logged_ids(user):
+    return {entry.strava_activity_id for entry in ActivityLog.query.filter_by(user_id=user.id)}
+
+def test_watermark_follows_the_synced_activities(app, user, strava):
+    app.config.update(BACKFILL_PAGE_SIZE=30, BACKFILL_CHECKPOINT_SIZE=20)
+    
+    totals = activity.process_historic_activities(user, generate_titles=False)
+    
+    assert totals['processed'] == 50
+    assert user.sync_after == START + timedelta(hours=50)
+    assert logged_ids(user) == set(range(1, 51))
+    
+    # The next sync only asks for activities from the watermark on
+    strava['history'].append(strava_activity(51))
+    assert activity.process_historic_activities(user, generate_titles=False)['processed'] == 1
+    assert user.sync_after == START + timedelta(hours=51)
+
+@pytest.mark.parametrize('failure', ['missing', 'hide', 'title'])
+def test_watermark_stops_at_the_first_failed_activity(app, user, strava, failure):
+    app.config.update(BACKFILL_PAGE_SIZE=30, BACKFILL_CHECKPOINT_SIZE=20)
+    if failure == 'missing':
+        strava['missing'].add(25)
+    elif failure == 'hide':
+        # Runs under the threshold are hidden; hiding this one fails
+        strava['failing'].add(25)
+    else:
+        # Nothing is hidden; saving this one's generated title fails
+        user.run_threshold = 60
+        db.session.commit()
+        strava['titles'] = {25: 'Threshold Run', 26: 'Easy Run'}
+        strava['failing'].add(25)
+    
+    activity.process_historic_activities(user, generate_titles=False)
+    
+    assert user.sync_after == START + timedelta(hours=24)
+    assert logged_ids(user) == set(range(1, 51)) - {25}
+    
+    # The retry picks the failed activity up and skips the logged ones
+    strava['missing'].clear()
+    strava['failing'].clear()
+    totals = activity.process_historic_activities(user, generate_titles=False)
+    
+    assert totals['processed'] == 1
+    assert user.sync_after == START + timedelta(hours=50)
+    assert logged_ids(user) == set(range(1, 51))
+
+def test_handled_until():
+    chunk = [strava_activity(i) for i in (1, 2, 3)]
+    
+    assert _handled_until(chunk, {1, 2, 3}) == (START + timedelta(hours=3), True)
+    assert _handled_until(chunk, {1, 3}) == (START + timedelta(hours=1), False)
+    assert _handled_until(chunk, {2, 3}) == (None, False)
@@ -0,0 +1,76 @@
+import random
+import numpy as np
+import pytest
+from services.title_generator import analyze_elevation, find_climbs
+
+def loop_climbs(altitude_data):
+    """The original sample-by-sample climb detection find_climbs replaces"""
+    climbs = []
+    current_climb = 0
+    
+    for i in range(1, len(altitude_data)):
+        diff = altitude_data[i] - altitude_data[i-1]
+        if diff > 0:
+            current_climb += diff
+        elif diff < -1 and current_climb > 10:
+            climbs.append(current_climb)
+            current_climb = 0
+        elif diff < 0 and current_climb <= 10:
+            current_climb = 0
+    
+    if current_climb > 10:
+        climbs.append(current_climb)
+    return climbs
+
+def vector_climbs(altitude_data):
+    return find_climbs(np.diff(np.asarray(altitude_data, dtype=float)))
+
+def random_altitude(rng, n, start, step, drift):
+    """A random walk quantized to 0.1m, the resolution of Strava altitude streams"""
+    altitude = [start]
+    for _ in range(n - 1):
+        altitude.append(round(altitude[-1] + rng.gauss(drift, step), 1))
+    return altitude
+
+@pytest.mark.parametrize('seed', range(200))
+def test_matches_loop_on_random_streams(seed):
+    rng = random.Random(seed)
+    altitude = random_altitude(rng, rng.randint(10, 3000), rng.uniform(0, 3000), rng.choice([0.3, 1.0, 3.0]),
+                               rng.choice([-0.2, 0.0, 0.1, 0.5]))
+    assert vector_climbs(altitude) == loop_climbs(altitude)
+
+@pytest.mark.parametrize('start', [0.0, 123.4, 1000.0, 2407.3])
+@pytest.mark.parametrize('step', [0.1, 0.2, 0.5, 1.0])
+@pytest.mark.parametrize('rise', [9.9, 10.0, 10.1])
+def test_matches_loop_at_threshold(start, step, rise):
+    # Climb exactly to around the threshold, then a drop that ends it
+    steps = int(round(rise / step))
+    climb = [round(start + i * step, 1) for i in range(steps + 1)]
+    altitude = climb + [round(climb[-1] - 2, 1), round(climb[-1] - 4, 1)]
+    assert vector_climbs(altitude) == loop_climbs(altitude)
+
+@pytest.mark.parametrize('start', [0.0, 512.7, 1500.0])
+def test_matches_loop_with_dips_at_threshold(start):
+    # Small dips right before and right after reaching exactly 10m
+    altitude = [start]
+    for delta in [0.1] * 60 + [-0.5] + [0.1] * 100 + [-0.3] + [0.1] * 40 + [-0.2] + [0.1] * 5 + [-1.5]:
+        altitude.append(round(altitude[-1] + delta, 1))
+    assert vector_climbs(altitude) == loop_climbs(altitude)
+
+@pytest.mark.parametrize('altitude', [
+    [100.0] * 20,
+    [float(i) for i in range(20)],
+    [float(20 - i) for i in range(20)],
+    [0.0, 5.0, 11.0, 9.5, 20.0, 18.0, 30.0, 31.0, 29.0, 40.0]
+])
+def test_matches_loop_on_simple_profiles(altitude):
+    assert vector_climbs(altitude) == loop_climbs(altitude)
+
+def test_analyze_elevation_reports_loop_climbs():
+    altitude = random_altitude(random.Random(7), 2000, 800.0, 1.0, 0.3)
+    climbs = loop_climbs(altitude)
+    result = analyze_elevation(altitude)
+    
+    assert result['num_significant_climbs'] == len(climbs)
+    assert result['biggest_climb'] == max(climbs)
+    assert result['total_gain'] == sum(max(0, b - a) for a, b in zip(altitude, altitude[1:]))
@@ -0,0 +1,109 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from models import db
+from models.job import Job
+from models.user import User
+from routes import auth
+from services import hr_zones, strava
+from services.hr_zones import heart_rate_zones, refresh_hr_zones_job, request_zone_refresh, zone_edges
+from services.strava import MissingScope, get_athlete_zones
+
+ZONES = [{'min': 0, 'max': 120}, {'min': 120, 'max': 145}, {'min': 145, 'max': 160},
+         {'min': 160, 'max': 175}, {'min': 175, 'max': -1}]
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+    
+    def json(self):
+        return self.body
+
+class FakeClient:
+    def __init__(self, response):
+        self.response = response
+    
+    def get(self, path, **kwargs):
+        return self.response
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    calls = []
+    enqueue = hr_zones.enqueue
+    monkeypatch.setattr(hr_zones, 'enqueue', lambda *args, **kwargs: calls.append(args) or enqueue(*args, **kwargs))
+    return calls
+
+def test_stale_zones_are_requested_once(app, user, enqueued):
+    for _ in range(5):
+        assert heart_rate_zones(User.get_snapshot(user_id=user.id)) is None
+    
+    assert Job.query.filter_by(kind='refresh_hr_zones').count() == 1
+    assert len(enqueued) == 1
+
+def test_request_leaves_the_callers_transaction_alone(app, user):
+    user.run_threshold = 60
+    request_zone_refresh(user)
+    
+    assert user in db.session.dirty
+    db.session.rollback()
+    assert db.session.get(User, user.id).run_threshold == 3600
+    assert Job.query.filter_by(kind='refresh_hr_zones').count() == 1
+
+def test_refresh_caches_the_zones(app, user, monkeypatch):
+    monkeypatch.setattr(hr_zones, 'get_athlete_zones', lambda token: {'heart_rate': {'zones': ZONES}})
+    refresh_hr_zones_job(user.id)
+    
+    snapshot = User.get_snapshot(user_id=user.id)
+    assert zone_edges(snapshot.hr_zones) == [120, 145, 160, 175]
+    assert heart_rate_zones(snapshot) == [120, 145, 160, 175]
+    assert Job.query.count() == 0
+
+def test_missing_scope_is_recorded_and_not_retried(app, user, monkeypatch, enqueued):
+    def refused(token):
+        raise MissingScope('profile:read_all')
+    
+    monkeypatch.setattr(hr_zones, 'get_athlete_zones', refused)
+    refresh_hr_zones_job(user.id)
+    
+    # Long after the TTL, zones are still not asked for again
+    user.hr_zones_fetched_at = datetime.utcnow() - timedelta(days=30)
+    db.session.commit()
+    snapshot = User.get_snapshot(user_id=user.id)
+    assert snapshot.hr_zones_scope_missing is True
+    assert heart_rate_zones(snapshot) is None
+    assert enqueued == []
+
+@pytest.mark.parametrize('status, body, expected', [
+    (200, {'heart_rate': {'zones': ZONES}}, {'heart_rate': {'zones': ZONES}}),
+    (401, {'errors': [{'resource': 'AccessToken', 'field': 'profile:read_permission', 'code': 'missing'}]}, MissingScope),
+    (403, {}, MissingScope),
+    (401, {'errors': [{'resource': 'Athlete', 'field': 'access_token', 'code': 'invalid'}]}, None),
+    (500, {}, None),
+])
+def test_athlete_zones_response(app, monkeypatch, status, body, expected):
+    monkeypatch.setattr(strava, 'get_client', lambda: FakeClient(FakeResponse(status, body)))
+    if expected is MissingScope:
+        with pytest.raises(MissingScope):
+            get_athlete_zones('token')
+    else:
+        assert get_athlete_zones('token') == expected
+
+@pytest.mark.parametrize('scope, missing', [
+    ('read,activity:write,activity:read_all', True),
+    ('read,activity:write,activity:read_all,profile:read_all', False),
+])
+def test_login_records_the_granted_scope(app, user, monkeypatch, scope, missing):
+    token = {'athlete': {'id': user.strava_id, 'username': 'runner'}, 'access_token': 'new', 'refresh_token': 'refresh',
+             'expires_at': int((datetime.utcnow() + timedelta(hours=6)).timestamp())}
+    monkeypatch.setattr(auth, 'exchange_token', lambda code: token)
+    user.hr_zones_scope_missing = not missing
+    db.session.commit()
+    client = app.test_client()
+    
+    client.get(f"/auth/callback?code=abc&scope={scope}")
+    
+    assert db.session.get(User, user.id).hr_zones_scope_missing is missing
+    assert Job.query.filter_by(kind='refresh_hr_zones').count() == int(not missing)
+    prompt = 'Reconnect with Strava' in client.get('/user/dashboard').get_data(as_text=True)
+    assert prompt is missing
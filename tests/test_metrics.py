@@ -0,0 +1,45 @@
+import json
+import os
+from services.metrics import Counter, Histogram, MetricsRegistry
+
+def families(text):
+    """Metric family declared by each HELP/TYPE line, and the sample names that follow it"""
+    declared, samples = {}, {}
+    family = None
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            family = line.split()[2]
+            declared[family] = line.split()[3]
+            samples[family] = set()
+        elif line and not line.startswith('#'):
+            samples[family].add(line.split('{')[0].split()[0])
+    return declared, samples
+
+def test_help_and_type_name_the_exposed_samples():
+    registry = MetricsRegistry()
+    events = Counter(registry, 'webhook_events', 'Webhook events', ['outcome'])
+    latency = Histogram(registry, 'commit_duration_seconds', 'Commit latency', buckets=(0.1, 1.0))
+    events.inc(outcome='queued')
+    events.inc(2, outcome='duplicate')
+    latency.observe(0.05)
+    latency.observe(3.0)
+    
+    text = registry.render()
+    declared, samples = families(text)
+    
+    assert declared == {'webhook_events_total': 'counter', 'commit_duration_seconds': 'histogram'}
+    assert samples['webhook_events_total'] == {'webhook_events_total'}
+    assert samples['commit_duration_seconds'] == {'commit_duration_seconds_bucket', 'commit_duration_seconds_sum',
+                                                  'commit_duration_seconds_count'}
+    assert '# HELP webhook_events_total Webhook events' in text
+    assert 'webhook_events_total{outcome="duplicate"} 2' in text
+    assert 'commit_duration_seconds_bucket{le="+Inf"} 2' in text
+
+def test_adds_up_other_processes(tmp_path):
+    registry = MetricsRegistry(directory=str(tmp_path))
+    events = Counter(registry, 'webhook_events', 'Webhook events', ['outcome'])
+    events.inc(outcome='queued')
+    with open(os.path.join(str(tmp_path), 'metrics_1.json'), 'w') as f:
+        json.dump({'webhook_events': [[['queued'], 4]]}, f)
+    
+    assert 'webhook_events_total{outcome="queued"} 5' in registry.render()
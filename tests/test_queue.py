@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta
+import pytest
+from models import db
+from models.job import Job
+from services import queue
+from services.queue import (claim_next, complete_jobs, enqueue, finish_job, hand_off_completion, job_handler,
+                            recover_stale_jobs, run_job, running_job)
+
+class RateLimited(Exception):
+    retry_after = 120
+
+@pytest.fixture
+def handlers(monkeypatch):
+    """Register job handlers for the test only"""
+    monkeypatch.setattr(queue, '_handlers', {})
+    monkeypatch.setattr(queue, '_failure_handlers', {})
+    return queue._handlers
+
+def claimed(kind='test', worker_id='worker-1', **kwargs):
+    job = enqueue(kind, {}, **kwargs)
+    assert claim_next(worker_id).id == job.id
+    return db.session.get(Job, job.id)
+
+def test_enqueue_drops_duplicate_keys(app):
+    first = enqueue('test', {'n': 1}, dedup_key='activity:1:1')
+    
+    assert first is not None
+    assert enqueue('test', {'n': 2}, dedup_key='activity:1:1') is None
+    assert enqueue('test', {'n': 3}, dedup_key='activity:1:2') is not None
+    assert Job.query.count() == 2
+
+def test_failed_job_releases_its_key(app):
+    job = claimed(dedup_key='activity:1:1', max_attempts=1)
+    finish_job(job.id, RuntimeError('boom'), 'worker-1')
+    
+    assert db.session.get(Job, job.id).status == 'failed'
+    assert enqueue('test', {}, dedup_key='activity:1:1') is not None
+
+def test_legacy_failed_job_key_is_released(app):
+    # Jobs that failed before keys were released on failure still hold theirs
+    job = enqueue('test', {}, dedup_key='activity:1:1')
+    job.status = 'failed'
+    db.session.commit()
+    
+    again = enqueue('test', {}, dedup_key='activity:1:1')
+    
+    assert again is not None
+    assert db.session.get(Job, job.id).dedup_key is None
+
+def test_failures_back_off_until_out_of_attempts(app):
+    app.config.update(JOB_RETRY_BASE_DELAY=30, JOB_RETRY_MAX_DELAY=3600)
+    job = enqueue('test', {}, max_attempts=3)
+    
+    delays = []
+    for attempt in range(3):
+        job = db.session.get(Job, job.id)
+        job.run_at = datetime.utcnow()
+        db.session.commit()
+        claim_next('worker-1')
+        started = datetime.utcnow()
+        finish_job(job.id, RuntimeError('boom'), 'worker-1')
+        job = db.session.get(Job, job.id)
+        delays.append(round((job.run_at - started).total_seconds()))
+    
+    assert job.status == 'failed'
+    assert job.attempts == 3
+    assert delays[:2] == [30, 60]
+
+def test_retry_after_defers_without_using_an_attempt(app):
+    job = claimed(max_attempts=1)
+    started = datetime.utcnow()
+    
+    assert finish_job(job.id, RateLimited('429'), 'worker-1') is False
+    
+    job = db.session.get(Job, job.id)
+    assert job.status == 'pending'
+    assert job.attempts == 0
+    assert round((job.run_at - started).total_seconds()) == RateLimited.retry_after
+
+def test_run_job_records_the_outcome(app, handlers):
+    calls = []
+    job_handler('test')(lambda n: calls.append(n))
+    job_handler('broken')(lambda: 1 / 0)
+    
+    ok = enqueue('test', {'n': 1})
+    broken = enqueue('broken', {})
+    run_job(claim_next('worker-1'))
+    run_job(claim_next('worker-1'))
+    
+    assert calls == [1]
+    assert db.session.get(Job, ok.id).status == 'done'
+    assert db.session.get(Job, broken.id).status == 'pending'
+    assert 'ZeroDivisionError' in db.session.get(Job, broken.id).last_error
+
+def test_handed_off_job_waits_for_its_writer(app, handlers):
+    claims = []
+    job_handler('test')(lambda: claims.append(hand_off_completion()))
+    job = enqueue('test', {})
+    
+    run_job(claim_next('worker-1'))
+    
+    assert claims == [(job.id, 'worker-1')]
+    assert db.session.get(Job, job.id).status == 'running'
+    
+    assert complete_jobs(claims) == ['test']
+    db.session.commit()
+    assert db.session.get(Job, job.id).status == 'done'
+
+def test_hand_off_outside_a_job(app):
+    assert hand_off_completion() is None
+
+def test_recovered_job_belongs_to_its_new_worker(app):
+    app.config['JOB_LOCK_TIMEOUT'] = 600
+    job = claimed(worker_id='worker-1')
+    job.locked_at = datetime.utcnow() - timedelta(seconds=601)
+    db.session.commit()
+    
+    assert recover_stale_jobs() == 1
+    assert claim_next('worker-2').id == job.id
+    
+    # The first run finishing (or failing) late does not touch the second
+    assert finish_job(job.id, worker_id='worker-1') is False
+    assert finish_job(job.id, RuntimeError('late'), 'worker-1') is False
+    assert complete_jobs([(job.id, 'worker-1')]) == []
+    job = db.session.get(Job, job.id)
+    assert (job.status, job.locked_by, job.attempts) == ('running', 'worker-2', 2)
+    
+    assert finish_job(job.id, worker_id='worker-2') is True
+    assert db.session.get(Job, job.id).status == 'done'
+
+def test_running_job_context_is_reset(app):
+    with running_job(7, 'worker-1'):
+        assert hand_off_completion() == (7, 'worker-1')
+    assert hand_off_completion() is None
@@ -0,0 +1,106 @@
+import time
+import pytest
+from services import rate_limit
+from services.rate_limit import (BACKFILL, LIVE, LONG_WINDOW, SHORT_WINDOW, RateLimitExceeded, RateLimitGovernor,
+                                 rate_limit_priority, retry_after_throttled)
+from services.strava_client import StravaClient
+
+# Ten minutes into a 15-minute window, well clear of midnight UTC
+NOW = 1767225600 + 3 * 3600 + 600
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [NOW]
+    monkeypatch.setattr(rate_limit.time, 'time', lambda: now[0])
+    return now
+
+def governor(tmp_path, **kwargs):
+    kwargs.setdefault('max_wait', 0)
+    return RateLimitGovernor(str(tmp_path / 'rate_limit.json'), **kwargs)
+
+def test_workers_share_one_budget(tmp_path, clock):
+    first, second = governor(tmp_path, short_limit=3), governor(tmp_path, short_limit=3)
+    first.acquire()
+    second.acquire()
+    first.acquire()
+    
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        second.acquire()
+    assert exceeded.value.retry_after == SHORT_WINDOW - 600
+    assert first.status()['short_usage'] == 3
+
+def test_backfills_leave_a_reserve_for_live_events(tmp_path, clock):
+    bucket = governor(tmp_path, short_limit=10, backfill_reserve=0.3)
+    with rate_limit_priority(BACKFILL):
+        for _ in range(7):
+            bucket.acquire()
+        with pytest.raises(RateLimitExceeded):
+            bucket.acquire()
+    
+    for _ in range(3):
+        bucket.acquire(LIVE)
+    with pytest.raises(RateLimitExceeded):
+        bucket.acquire(LIVE)
+
+def test_windows_reset(tmp_path, clock):
+    bucket = governor(tmp_path, short_limit=1, long_limit=2)
+    bucket.acquire()
+    clock[0] += SHORT_WINDOW
+    bucket.acquire()
+    clock[0] += SHORT_WINDOW
+    
+    # The daily budget is used up until midnight UTC
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        bucket.acquire()
+    assert exceeded.value.retry_after == LONG_WINDOW - clock[0] % LONG_WINDOW
+
+def test_headers_keep_the_bucket_in_sync(tmp_path, clock):
+    bucket = governor(tmp_path)
+    bucket.acquire()
+    bucket.update_from_headers({'X-RateLimit-Limit': '100,1000', 'X-RateLimit-Usage': '40,400'})
+    assert bucket.status() == {'short_usage': 40, 'short_limit': 100, 'long_usage': 400, 'long_limit': 1000}
+    
+    # Usage Strava has not seen yet is kept
+    for _ in range(5):
+        bucket.acquire()
+    bucket.update_from_headers({'X-RateLimit-Usage': '41,401'})
+    assert bucket.status()['short_usage'] == 45
+    
+    bucket.mark_exhausted()
+    assert bucket.status()['short_usage'] == 100
+
+def test_blocks_briefly_before_giving_up(tmp_path, monkeypatch):
+    bucket = governor(tmp_path, short_limit=1, max_wait=5)
+    waits = iter([0, 2, 0])
+    monkeypatch.setattr(bucket, '_try_acquire', lambda priority: next(waits))
+    monkeypatch.setattr(rate_limit.time, 'sleep', lambda seconds: None)
+    
+    bucket.acquire()
+    bucket.acquire()
+
+def test_retry_after_throttled():
+    assert retry_after_throttled({'Retry-After': '30'}) == 30
+    assert retry_after_throttled({}, now=NOW) == SHORT_WINDOW - 600
+    daily = {'X-RateLimit-Limit': '100,1000', 'X-RateLimit-Usage': '100,1000'}
+    assert retry_after_throttled(daily, now=NOW) == LONG_WINDOW - NOW % LONG_WINDOW
+
+def test_client_defers_on_throttling(tmp_path, clock, monkeypatch):
+    bucket = governor(tmp_path)
+    client = StravaClient(base_url='http://strava.test', governor=bucket)
+    throttled = FakeResponse(429, {'X-RateLimit-Limit': '100,1000', 'X-RateLimit-Usage': '100,120'})
+    monkeypatch.setattr(client.session, 'request', lambda *args, **kwargs: throttled)
+    
+    with pytest.raises(RateLimitExceeded) as exceeded:
+        client.get('/api/v3/athlete', endpoint='athlete')
+    
+    assert exceeded.value.retry_after == SHORT_WINDOW - 600
+    assert bucket.status()['short_usage'] == 100
+    
+    # OAuth calls are not metered
+    monkeypatch.setattr(client.session, 'request', lambda *args, **kwargs: FakeResponse(200))
+    assert client.post('/oauth/token').status_code == 200
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from models import db
+from models.activity_daily_stats import ActivityDailyStats
+from services.activity_log_writer import log_activities
+from services.rollups import ROLLUP_FIELDS, dashboard_stats, rebuild_rollups
+
+def activity(activity_id, activity_type, days_ago, elapsed_time=600, distance=2000.0):
+    start_date = datetime.utcnow() - timedelta(days=days_ago)
+    return {'id': activity_id, 'type': activity_type, 'elapsed_time': elapsed_time, 'distance': distance,
+            'start_date': start_date.strftime('%Y-%m-%dT%H:%M:%SZ')}
+
+def rollups(user):
+    """The user's non-empty buckets (a bucket an activity moved out of is left at zero)"""
+    db.session.expire_all()
+    buckets = {(stats.day, stats.activity_type): tuple(getattr(stats, field) for field in ROLLUP_FIELDS)
+               for stats in ActivityDailyStats.query.filter_by(user_id=user.id)}
+    return {key: totals for key, totals in buckets.items() if any(totals)}
+
+def test_incremental_rollups_match_a_rebuild(app, user):
+    log_activities(user.id, [(activity(1, 'Run', 0), True), (activity(2, 'Run', 0), False),
+                             (activity(3, 'Ride', 3, 3600, 30000.0), False)])
+    # Re-processing moves an activity to another day and type, and hides it
+    log_activities(user.id, [(activity(3, 'Walk', 10, 1800, 3000.0), True), (activity(4, 'Ride', 20), False)])
+    
+    incremental = rollups(user)
+    rebuild_rollups(user.id)
+    
+    assert rollups(user) == incremental
+    assert sum(count for count, _, _, _ in incremental.values()) == 4
+
+def test_dashboard_stats(app, user):
+    log_activities(user.id, [(activity(1, 'Run', 0), True), (activity(2, 'Run', 0), False),
+                             (activity(3, 'Run', 7), True), (activity(4, 'Ride', 7, 3600, 30000.0), False),
+                             (activity(5, 'Ride', 400), True)])
+    
+    stats = dashboard_stats(user.id, weeks=4)
+    
+    assert stats['by_type'] == [
+        {'activity_type': 'Run', 'count': 3, 'hidden': 2, 'distance': 6000.0, 'elapsed_time': 1800},
+        {'activity_type': 'Ride', 'count': 2, 'hidden': 1, 'distance': 32000.0, 'elapsed_time': 4200},
+    ]
+    
+    # The activity from last year is outside the weekly window
+    weekly = stats['weekly']
+    assert len(weekly) == 4
+    assert [week['week_start'].weekday() for week in weekly] == [0] * 4
+    assert (weekly[-1]['hidden'], weekly[-1]['shown']) == (1, 1)
+    assert (weekly[-2]['hidden'], weekly[-2]['shown']) == (1, 1)
+    assert sum(week['hidden'] + week['shown'] for week in weekly) == 4
+
+def test_dashboard_stats_without_activities(app, user):
+    stats = dashboard_stats(user.id)
+    
+    assert stats['by_type'] == []
+    assert len(stats['weekly']) == 12
+    assert all(week['hidden'] == week['shown'] == 0 for week in stats['weekly'])
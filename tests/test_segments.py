@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+from services.segments import Segment, describe_climbs, describe_intervals, detect_climbs, detect_intervals
+
+def workout(reps, work_seconds, rest_seconds, work_speed=5.0, rest_speed=2.0, step=1, noise=0.0, seed=0):
+    """Velocity, time and distance streams of a warm-up, `reps` efforts and a cool-down"""
+    parts = [(600, 3.0)]
+    for rep in range(reps):
+        parts.append((work_seconds, work_speed))
+        if rep < reps - 1:
+            parts.append((rest_seconds, rest_speed))
+    parts.append((600, 3.0))
+    
+    velocity = np.concatenate([np.full(seconds // step, speed) for seconds, speed in parts])
+    velocity += np.random.default_rng(seed).normal(0, noise, len(velocity))
+    time = np.arange(len(velocity)) * float(step)
+    distance = np.concatenate(([0.0], np.cumsum(velocity[1:] * step)))
+    return velocity, time, distance
+
+def profile(*sections):
+    """Altitude and distance streams from (meters, grade) sections sampled every 5 m"""
+    altitude, distance = [100.0], [0.0]
+    for meters, grade in sections:
+        for _ in range(int(meters / 5)):
+            altitude.append(altitude[-1] + 5 * grade)
+            distance.append(distance[-1] + 5)
+    return np.array(altitude), np.array(distance)
+
+def test_detects_distance_repeats():
+    velocity, time, distance = workout(6, 160, 90)
+    
+    intervals = detect_intervals(velocity, time, distance)
+    
+    assert len(intervals['work']) == 6
+    assert len(intervals['rest']) == 5
+    assert all(segment.distance == pytest.approx(800, rel=0.1) for segment in intervals['work'])
+    assert describe_intervals(intervals['work']) == '6x800m'
+
+def test_detects_repeats_from_sparse_samples():
+    # Smart recording: one sample every 3 s and no distance stream
+    velocity, time, _ = workout(5, 240, 120, work_speed=4.2, rest_speed=2.5, step=3, noise=0.2)
+    
+    intervals = detect_intervals(velocity, time)
+    
+    assert len(intervals['work']) == 5
+    assert all(segment.duration == pytest.approx(240, abs=15) for segment in intervals['work'])
+
+@pytest.mark.parametrize('velocity', [
+    # A steady run with GPS noise
+    3.0 + np.random.default_rng(1).normal(0, 0.3, 3600),
+    # Two efforts are not a session
+    workout(2, 160, 90)[0],
+    # Efforts barely faster than the recoveries
+    workout(6, 160, 90, work_speed=3.2, rest_speed=3.0)[0],
+    [3.0] * 9,
+    None,
+], ids=['steady', 'two-reps', 'no-contrast', 'short', 'missing'])
+def test_no_intervals(velocity):
+    assert detect_intervals(velocity) is None
+
+def test_short_recoveries_are_joined_into_the_effort():
+    # Three 5 s pauses at a crossing split one long effort
+    velocity = np.concatenate([np.full(600, 3.0), np.tile(np.concatenate([np.full(300, 5.0), np.full(5, 1.0)]), 3),
+                               np.full(600, 3.0)])
+    assert detect_intervals(velocity) is None
+
+def test_describe_intervals():
+    def efforts(*values, by='distance'):
+        # Distance efforts at a steady 4 m/s; timed efforts without a distance
+        return [Segment('work', 0, 0, value / 4, value, 0.0) if by == 'distance' else
+                Segment('work', 0, 0, value, 0.0, 0.0) for value in values]
+    
+    # A cut-off last rep is left out of the count
+    assert describe_intervals(efforts(400, 410, 395, 400, 250)) == '4x400m'
+    assert describe_intervals(efforts(1600, 1620, 1590)) == '3x1.5km'
+    assert describe_intervals(efforts(240, 235, 250, 245, 240, by='duration')) == '5x4min'
+    assert describe_intervals(efforts(200, 800, 1600, 3200)) == '4'
+
+def test_detects_climbs():
+    altitude, distance = profile((1500, 0), (1000, 0.08), (500, 0), (1000, -0.06), (500, 0), (600, 0.05), (1000, 0))
+    
+    climbs = detect_climbs(altitude, distance)
+    
+    assert [segment.kind for segment in climbs] == ['climb', 'climb']
+    assert climbs[0].gain == pytest.approx(80, abs=5)
+    assert climbs[1].gain == pytest.approx(30, abs=5)
+    # Smoothing spreads the ends a little
+    assert climbs[0].distance == pytest.approx(1000, rel=0.2)
+    assert describe_climbs(climbs) == f"2 climbs, max {int(climbs[0].gain)}m"
+
+def test_small_dips_do_not_split_a_climb():
+    altitude, distance = profile((500, 0), (400, 0.06), (40, -0.05), (400, 0.06), (500, 0))
+    
+    climbs = detect_climbs(altitude, distance)
+    
+    assert len(climbs) == 1
+    assert climbs[0].gain == pytest.approx(46, abs=5)
+    assert describe_climbs(climbs) == f"1 climb, {int(climbs[0].gain)}m"
+
+def test_false_flats_need_a_distance_stream_to_be_ruled_out():
+    # 25 m over 5 km is a 0.5% drag, not a climb
+    altitude, distance = profile((500, 0), (5000, 0.005), (500, 0))
+    
+    assert detect_climbs(altitude, distance) == []
+    assert len(detect_climbs(altitude)) == 1
+
+@pytest.mark.parametrize('altitude', [
+    100 + np.random.default_rng(2).normal(0, 1.0, 2000),
+    np.linspace(300, 100, 2000),
+    [100.0] * 9,
+    None,
+], ids=['jitter', 'descent', 'short', 'missing'])
+def test_no_climbs(altitude):
+    assert detect_climbs(altitude) == []
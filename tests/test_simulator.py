@@ -0,0 +1,74 @@
+import random
+import pytest
+from services.activity import should_hide_from_feed
+from services.activity_log_writer import log_activities
+from services.simulator import load_history, simulate_thresholds, sweep_threshold
+
+DURATIONS = {'Run': [300, 1200, 3599, 3600, 5400], 'Ride': [1800, 7199, 7200], 'Swim': [900]}
+
+@pytest.fixture
+def history(app, user):
+    entries = []
+    for activity_type, durations in DURATIONS.items():
+        for elapsed_time in durations:
+            activity_id = len(entries) + 1
+            entries.append(({'id': activity_id, 'type': activity_type, 'elapsed_time': elapsed_time,
+                              'distance': 1000, 'start_date': '2026-01-01T07:00:00Z'}, False))
+    log_activities(user.id, entries)
+    return [activity for activity, _ in entries]
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    return client
+
+def test_counts_match_the_live_rule(app, user, history):
+    rng = random.Random(1)
+    for _ in range(20):
+        user.run_threshold, user.ride_threshold, user.walk_threshold = (rng.choice([0, 1200, 3600, 5400])
+                                                                         for _ in range(3))
+        thresholds = {'Run': user.run_threshold, 'Ride': user.ride_threshold, 'Walk': user.walk_threshold}
+        
+        result = simulate_thresholds(load_history(user.id), thresholds)
+        
+        for activity_type, durations in DURATIONS.items():
+            hidden = sum(should_hide_from_feed(a, user) for a in history if a['type'] == activity_type)
+            assert result[activity_type] == {'total': len(durations), 'hidden': hidden}
+
+def test_sweep_counts_shorter_activities(app, user, history):
+    results = sweep_threshold(load_history(user.id), 'Run', [0, 300, 301, 3600, 3601, 10000])
+    
+    assert [row['hidden'] for row in results] == [0, 0, 1, 3, 4, 5]
+
+def test_endpoint_defaults_to_current_settings(client, history):
+    response = client.get('/user/simulate')
+    
+    assert response.status_code == 200
+    assert response.json['thresholds'] == {'Run': 3600, 'Ride': 7200, 'Walk': 10800}
+    assert response.json['by_type'] == {'Run': {'total': 5, 'hidden': 3}, 'Ride': {'total': 3, 'hidden': 2},
+                                        'Swim': {'total': 1, 'hidden': 0}}
+    assert 'sweep' not in response.json
+
+def test_endpoint_sweeps_one_type(client, history):
+    response = client.get('/user/simulate?run_threshold=600&sweep_type=Ride&sweep_start=0&sweep_stop=9000'
+                          '&sweep_step=3600')
+    
+    assert response.json['by_type']['Run'] == {'total': 5, 'hidden': 1}
+    assert response.json['sweep'] == {'activity_type': 'Ride', 'results': [
+        {'threshold': 0, 'hidden': 0}, {'threshold': 3600, 'hidden': 1}, {'threshold': 7200, 'hidden': 2}]}
+    
+    response = client.get('/user/simulate?sweep_type=Run&sweep=1200,1201')
+    assert [row['hidden'] for row in response.json['sweep']['results']] == [1, 2]
+
+def test_endpoint_rejects_bad_thresholds(client, history):
+    response = client.get('/user/simulate?run_threshold=an+hour')
+    
+    assert response.status_code == 400
+
+def test_endpoint_without_history(client):
+    response = client.get('/user/simulate?sweep_type=Run&sweep=600')
+    
+    assert response.json['by_type'] == {}
+    assert response.json['sweep']['results'] == [{'threshold': 600, 'hidden': 0}]
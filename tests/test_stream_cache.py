@@ -0,0 +1,56 @@
+import json
+import os
+import numpy as np
+from services.stream_cache import StreamCache, USAGE
+
+def cache_size(cache_dir):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(cache_dir) for name in names if name.endswith('.npy'))
+
+def recorded_size(cache_dir):
+    with open(os.path.join(cache_dir, USAGE)) as f:
+        return json.load(f)['bytes']
+
+def streams(n):
+    return {'altitude': np.arange(n, dtype=np.float32), 'time': np.arange(n, dtype=np.int32)}
+
+def test_tracks_size_without_scanning(tmp_path, monkeypatch):
+    cache = StreamCache(str(tmp_path), max_bytes=10 * 1024 * 1024)
+    cache.put(1, ['altitude', 'time'], streams(1000))
+    
+    scans = []
+    monkeypatch.setattr(cache, 'evict', lambda: scans.append(1) or 0)
+    for activity_id in range(2, 20):
+        cache.put(activity_id, ['altitude', 'time'], streams(1000))
+    # Refetching an activity replaces its size rather than adding to it
+    cache.put(2, ['altitude'], streams(1000), resolution='high')
+    
+    assert scans == []
+    assert recorded_size(str(tmp_path)) == cache_size(str(tmp_path))
+
+def test_evicts_least_recently_used_once_full(tmp_path):
+    cache = StreamCache(str(tmp_path), max_bytes=50 * 1000)
+    for activity_id in range(1, 7):
+        cache.put(activity_id, ['altitude', 'time'], streams(1000))
+    cache.get(1, ['altitude'])
+    cache.put(7, ['altitude', 'time'], streams(1000))
+    
+    assert cache_size(str(tmp_path)) <= 50 * 1000 * 0.9
+    assert recorded_size(str(tmp_path)) == cache_size(str(tmp_path))
+    assert sorted(os.listdir(str(tmp_path))) == ['1', '4', '5', '6', '7', USAGE]
+
+def test_entries_of_an_older_format_are_refetched(tmp_path):
+    cache = StreamCache(str(tmp_path))
+    cache.put(1, ['altitude', 'time'], streams(100))
+    manifest_path = os.path.join(str(tmp_path), '1', 'manifest.json')
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    del manifest['format']
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    
+    assert cache.get(1, ['altitude']) is None
+    
+    cache.put(1, ['altitude'], streams(100))
+    assert cache.get(1, ['altitude', 'time']) is None
+    assert cache.get(1, ['altitude']) is not None
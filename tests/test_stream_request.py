@@ -0,0 +1,51 @@
+import pytest
+from services import activity, strava
+from services.title_generator import stream_request
+
+class FakeResponse:
+    status_code = 404
+
+class FakeClient:
+    """Records the stream requests that would have gone to Strava"""
+    
+    def __init__(self):
+        self.requests = []
+    
+    def get(self, path, **kwargs):
+        self.requests.append((path, kwargs['params']))
+        return FakeResponse()
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(strava, 'get_client', lambda: client)
+    return client
+
+@pytest.mark.parametrize('activity, enabled, expected', [
+    # Everything applies: full resolution for the sample-to-sample analyzers
+    ({'type': 'Run'}, None, (['altitude', 'distance', 'heartrate', 'time', 'velocity_smooth'], None)),
+    # Heart rate alone survives downsampling
+    ({'type': 'Run'}, ['heart_rate'], (['heartrate'], 'medium')),
+    ({'type': 'Run', 'has_heartrate': False}, ['heart_rate', 'pace'], (['velocity_smooth'], None)),
+    # No elevation or climbs indoors
+    ({'type': 'Ride', 'trainer': True}, None, (['distance', 'heartrate', 'time', 'velocity_smooth'], None)),
+    # Interval detection only for interval sports
+    ({'type': 'Hike'}, ['intervals', 'heart_rate'], (['heartrate'], 'medium')),
+    # Nothing to analyze in a manual entry
+    ({'type': 'Run', 'manual': True}, None, ([], None)),
+], ids=['run', 'heart-rate', 'no-strap', 'trainer', 'hike', 'manual'])
+def test_stream_request(activity, enabled, expected):
+    assert stream_request(activity, enabled) == expected
+
+def test_titles_fetch_only_the_needed_streams(app, client):
+    app.config['TITLE_ANALYZERS'] = ['heart_rate']
+    
+    activity.generate_activity_title(42, {'type': 'Run'}, 'token')
+    
+    assert client.requests == [('/api/v3/activities/42/streams', {
+        'keys': 'heartrate', 'key_by_type': True, 'resolution': 'medium', 'series_type': 'time'
+    })]
+
+def test_titles_skip_streams_nothing_uses(app, client):
+    assert activity.generate_activity_title(42, {'type': 'Run', 'manual': True}, 'token') is None
+    assert client.requests == []
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from services.streams import ActivityStreams, drop_gaps, fill_gaps, to_array
+from services.title_generator import analyze_elevation, analyze_heart_rate, analyze_pace, generate_workout_title
+
+def strava_json(**streams):
+    return {key: {'data': data, 'series_type': 'time'} for key, data in streams.items()}
+
+def test_analyzed_streams_keep_json_precision():
+    velocity = [3.1234567, 2.9876543, 3.3333333] * 10
+    altitude = [101.3, 101.7, 102.9] * 10
+    streams = ActivityStreams.from_json(strava_json(velocity_smooth=velocity, altitude=altitude))
+    
+    assert streams.velocity.dtype == np.float64 and streams.velocity.tolist() == velocity
+    assert streams.altitude.dtype == np.float64 and streams.altitude.tolist() == altitude
+    assert analyze_pace(streams.velocity, 'Run') == analyze_pace(velocity, 'Run')
+    assert analyze_elevation(streams.altitude) == analyze_elevation(altitude)
+
+def test_gaps_become_nan():
+    hr = to_array('heartrate', [120, None, 130])
+    
+    assert np.isnan(hr[1])
+    assert drop_gaps(hr).tolist() == [120, 130]
+    assert fill_gaps(hr).tolist() == [120, 125, 130]
+    assert fill_gaps(to_array('heartrate', [None, None])) is None
+    assert drop_gaps(to_array('heartrate', [120, 130])).dtype == np.int16
+
+def test_gappy_heart_rate_is_analyzed_without_its_gaps():
+    hr = [110, 115, 120, 160, 170, 175, 178, 180, 150, 140, 130, 120]
+    gappy = hr[:3] + [None, None] + hr[3:8] + [None] + hr[8:]
+    streams = ActivityStreams.from_json(strava_json(heartrate=gappy))
+    
+    result = analyze_heart_rate(streams.heartrate)
+    
+    assert result == analyze_heart_rate(hr)
+    assert result['max_hr'] == 180
+    assert sum(result['zone_percentages']) == pytest.approx(100)
+    assert analyze_heart_rate(streams.heartrate, [120, 140, 160, 175]) == analyze_heart_rate(hr, [120, 140, 160, 175])
+
+def test_gappy_streams_still_get_a_title():
+    n = 600
+    gappy = lambda values: [None if i % 50 == 7 else value for i, value in enumerate(values)]
+    streams = ActivityStreams.from_json(strava_json(
+        time=list(range(n)),
+        distance=[3.0 * i for i in range(n)],
+        heartrate=gappy([140 + i % 20 for i in range(n)]),
+        velocity_smooth=gappy([3.0] * n),
+        altitude=gappy([100 + i * 0.5 for i in range(n)]),
+    ))
+    activity = {'type': 'Run', 'distance': 1800, 'elapsed_time': n}
+    
+    title = generate_workout_title(activity, streams)
+    
+    assert 'nan' not in title.lower()
+    assert analyze_pace(streams.velocity, 'Run')['pace_description'] == '5:33 min/km'
+    assert analyze_elevation(streams.altitude)['total_gain'] > 250
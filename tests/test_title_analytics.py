@@ -0,0 +1,135 @@
+import random
+import statistics
+import pytest
+from services.title_generator import analyze_heart_rate, analyze_pace
+
+def loop_heart_rate(hr_data):
+    """The original sample-by-sample zone count analyze_heart_rate replaces"""
+    if not hr_data or len(hr_data) < 10:
+        return None
+    
+    avg_hr = statistics.mean(hr_data)
+    max_hr = max(hr_data)
+    zone_counts = [0, 0, 0, 0, 0]
+    
+    for hr in hr_data:
+        hr_percent = hr / max_hr * 100
+        if hr_percent < 60:
+            zone_counts[0] += 1
+        elif hr_percent < 70:
+            zone_counts[1] += 1
+        elif hr_percent < 80:
+            zone_counts[2] += 1
+        elif hr_percent < 90:
+            zone_counts[3] += 1
+        else:
+            zone_counts[4] += 1
+    
+    primary_zone = zone_counts.index(max(zone_counts)) + 1
+    total_points = len(hr_data)
+    zone_percentages = [count / total_points * 100 for count in zone_counts]
+    
+    return {
+        'avg_hr': avg_hr,
+        'max_hr': max_hr,
+        'primary_zone': primary_zone,
+        'zone_percentages': zone_percentages
+    }
+
+def loop_pace(velocity_data, activity_type):
+    """The original pure-Python analyze_pace"""
+    if not velocity_data or len(velocity_data) < 10:
+        return None
+    
+    avg_velocity = statistics.mean(velocity_data)
+    max_velocity = max(velocity_data)
+    velocity_std = statistics.stdev(velocity_data)
+    velocity_changes = [abs(velocity_data[i] - velocity_data[i-1]) for i in range(1, len(velocity_data))]
+    avg_change = statistics.mean(velocity_changes)
+    is_interval = velocity_std > 1.0 and avg_change > 0.5
+    
+    if activity_type in ['Run', 'Walk']:
+        avg_pace = 1000 / avg_velocity / 60 if avg_velocity > 0 else 0
+        pace_description = f"{int(avg_pace)}:{int((avg_pace % 1) * 60):02d} min/km"
+    else:
+        pace_description = f"{avg_velocity * 3.6:.1f} km/h"
+    
+    return {
+        'avg_velocity': avg_velocity,
+        'max_velocity': max_velocity,
+        'pace_description': pace_description,
+        'is_interval': is_interval,
+        'velocity_variation': velocity_std
+    }
+
+def assert_same_heart_rate(hr_data):
+    expected = loop_heart_rate(hr_data)
+    result = analyze_heart_rate(hr_data)
+    if expected is None:
+        assert result is None
+        return
+    
+    assert result['max_hr'] == expected['max_hr']
+    assert result['primary_zone'] == expected['primary_zone']
+    assert result['zone_percentages'] == expected['zone_percentages']
+    assert result['avg_hr'] == pytest.approx(expected['avg_hr'], rel=1e-12)
+    assert result['athlete_zones'] is False
+
+def assert_same_pace(velocity_data, activity_type):
+    expected = loop_pace(velocity_data, activity_type)
+    result = analyze_pace(velocity_data, activity_type)
+    if expected is None:
+        assert result is None
+        return
+    
+    assert result['max_velocity'] == expected['max_velocity']
+    assert result['is_interval'] == expected['is_interval']
+    assert result['pace_description'] == expected['pace_description']
+    assert result['avg_velocity'] == pytest.approx(expected['avg_velocity'], rel=1e-12)
+    assert result['velocity_variation'] == pytest.approx(expected['velocity_variation'], rel=1e-9, abs=1e-12)
+
+@pytest.mark.parametrize('seed', range(100))
+def test_heart_rate_matches_loop_on_random_streams(seed):
+    rng = random.Random(seed)
+    base = rng.randint(90, 160)
+    hr_data = [max(40, int(rng.gauss(base, rng.choice([5, 15, 30])))) for _ in range(rng.randint(10, 5000))]
+    assert_same_heart_rate(hr_data)
+
+@pytest.mark.parametrize('hr_data', [
+    [],
+    [150] * 9,
+    [150] * 10,
+    [0.0] * 9 + [1.0],
+    # Samples exactly on the 60/70/80/90% boundaries of a 200 bpm max
+    [120, 140, 160, 180, 200] * 4,
+    [119, 120, 139, 140, 159, 160, 179, 180, 199, 200],
+    # The same boundaries against a max that does not divide evenly
+    [113.4, 132.3, 151.2, 170.1, 189] * 2,
+], ids=['empty', 'short', 'constant', 'one-beat', 'boundaries', 'around-boundaries', 'uneven-boundaries'])
+def test_heart_rate_matches_loop_on_edge_cases(hr_data):
+    assert_same_heart_rate(hr_data)
+
+@pytest.mark.parametrize('seed', range(100))
+def test_pace_matches_loop_on_random_streams(seed):
+    rng = random.Random(seed)
+    activity_type = rng.choice(['Run', 'Walk', 'Ride'])
+    base = rng.uniform(1.0, 12.0)
+    velocity_data = [round(max(0.0, rng.gauss(base, rng.choice([0.2, 1.0, 3.0]))), 3)
+                     for _ in range(rng.randint(10, 5000))]
+    assert_same_pace(velocity_data, activity_type)
+
+@pytest.mark.parametrize('activity_type', ['Run', 'Ride'])
+@pytest.mark.parametrize('velocity_data', [
+    [],
+    [3.0] * 9,
+    [3.0] * 10,
+    [0.0] * 10,
+    # Exactly 5:00 and 4:00 min/km, and 18.0 km/h
+    [10 / 3] * 10,
+    [1000 / 240] * 10,
+    [5.0] * 10,
+    # Alternating efforts right at the interval thresholds
+    [2.0, 4.0] * 10,
+], ids=['empty', 'short', 'constant', 'stopped', '5-00', '4-00', '18-kmh', 'intervals'])
+def test_pace_matches_loop_on_edge_cases(velocity_data, activity_type):
+    assert_same_pace(velocity_data, activity_type)
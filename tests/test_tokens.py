@@ -0,0 +1,90 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from models import db
+from models import user as user_module
+from models.user import User
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+        self.text = str(data)
+    
+    def json(self):
+        return self.data
+
+class FakeOAuth:
+    """Strava's token endpoint, rotating the refresh token on every use"""
+    
+    def __init__(self):
+        self.calls = []
+        self.refresh_token = 'refresh'
+        self.failing = False
+    
+    def post(self, path, **kwargs):
+        used = kwargs['data']['refresh_token']
+        self.calls.append(used)
+        # Long enough for the other threads to reach the lock
+        time.sleep(0.1)
+        if self.failing or used != self.refresh_token:
+            return FakeResponse(400, {'message': 'Bad Request'})
+        
+        self.refresh_token = f"refresh-{len(self.calls)}"
+        expires_at = int(time.time()) + 6 * 3600
+        return FakeResponse(200, {'access_token': f"token-{len(self.calls)}", 'refresh_token': self.refresh_token,
+                                  'expires_at': expires_at})
+
+@pytest.fixture
+def oauth(monkeypatch):
+    oauth = FakeOAuth()
+    monkeypatch.setattr(user_module, 'get_client', lambda: oauth)
+    return oauth
+
+@pytest.fixture
+def expiring(app, user):
+    user.token_expiry = datetime.utcnow() + timedelta(seconds=30)
+    db.session.commit()
+    return user
+
+def test_fresh_tokens_are_not_refreshed(app, user, oauth):
+    assert user.get_valid_token() == 'token'
+    assert User.get_snapshot(user_id=user.id).get_valid_token() == 'token'
+    assert oauth.calls == []
+
+def test_concurrent_refreshes_are_single_flight(app, expiring, oauth):
+    tokens = []
+    
+    def worker():
+        with app.app_context():
+            tokens.append(db.session.get(User, expiring.id).get_valid_token())
+            db.session.remove()
+    
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert oauth.calls == ['refresh']
+    assert tokens == ['token-1'] * 4
+    
+    db.session.expire_all()
+    assert db.session.get(User, expiring.id).refresh_token == 'refresh-1'
+
+def test_snapshot_refreshes_through_the_database(app, expiring, oauth):
+    snapshot = User.get_snapshot(user_id=expiring.id)
+    
+    assert snapshot.get_valid_token() == 'token-1'
+    assert oauth.calls == ['refresh']
+    
+    # The refresh committed a change, so the cache hands out the new token
+    assert User.get_snapshot(user_id=expiring.id).get_valid_token() == 'token-1'
+    assert oauth.calls == ['refresh']
+
+def test_failed_refresh_keeps_the_old_token(app, expiring, oauth):
+    oauth.failing = True
+    
+    assert expiring.get_valid_token() == 'token'
+    assert expiring.refresh_token == 'refresh'
@@ -0,0 +1,28 @@
+import json
+import os
+from services.tracing import SlowTraces, Trace
+
+def finished_trace(name, duration):
+    trace = Trace(name, {})
+    trace.duration = duration
+    return trace
+
+def test_keeps_slowest_traces(tmp_path):
+    traces = SlowTraces(size=2, directory=str(tmp_path))
+    for duration in (0.3, 0.1, 0.5, 0.2):
+        traces.offer(finished_trace(f"t{duration}", duration))
+    
+    assert [t['name'] for t in traces.slowest()] == ['t0.5', 't0.3']
+
+def test_merges_traces_of_other_processes(tmp_path):
+    traces = SlowTraces(size=3, directory=str(tmp_path))
+    traces.offer(finished_trace('local', 0.2))
+    traces.flush()
+    with open(os.path.join(str(tmp_path), f"traces_{os.getpid()}.json")) as f:
+        assert [t['name'] for t in json.load(f)] == ['local']
+    
+    other = [dict(finished_trace(name, duration).to_dict(), pid=1) for name, duration in (('worker', 0.4), ('fast', 0.01))]
+    with open(os.path.join(str(tmp_path), 'traces_1.json'), 'w') as f:
+        json.dump(other + [dict(finished_trace('slowest', 0.9).to_dict(), pid=1)], f)
+    
+    assert [(t['name'], t['pid']) for t in traces.slowest()] == [('slowest', 1), ('worker', 1), ('local', os.getpid())]
@@ -0,0 +1,65 @@
+from sqlalchemy import text
+from models import db
+from models.user import User, load_user
+
+def test_snapshots_are_cached(app, user):
+    snapshot = User.get_snapshot(user_id=user.id)
+    # Writes that bypass the ORM are not seen until the entry expires
+    db.session.execute(text('UPDATE user SET run_threshold = 60'))
+    db.session.commit()
+    
+    assert User.get_snapshot(strava_id=user.strava_id) is snapshot
+    assert snapshot.run_threshold == 3600
+
+def test_updates_drop_the_snapshot_once_committed(app, user):
+    snapshot = User.get_snapshot(user_id=user.id)
+    user.run_threshold = 60
+    db.session.flush()
+    
+    # Until the commit, other lookups keep seeing the committed settings
+    assert User.get_snapshot(user_id=user.id) is snapshot
+    db.session.commit()
+    
+    assert User.get_snapshot(user_id=user.id).run_threshold == 60
+    assert User.get_snapshot(strava_id=user.strava_id).run_threshold == 60
+
+def test_rolled_back_updates_keep_the_snapshot(app, user):
+    snapshot = User.get_snapshot(user_id=user.id)
+    user.run_threshold = 60
+    db.session.flush()
+    db.session.rollback()
+    
+    assert User.get_snapshot(user_id=user.id) is snapshot
+
+def test_deleted_users_are_not_loaded(app, user):
+    user_id = user.id
+    snapshot = User.get_snapshot(user_id=user_id)
+    db.session.delete(user)
+    db.session.commit()
+    db.session.remove()
+    
+    assert User.get_snapshot(user_id=user_id) is None
+    assert snapshot.to_user() is None
+    assert load_user(str(user_id)) is None
+
+def test_to_user_builds_the_user_without_a_query(app, user):
+    user_id = user.id
+    snapshot = User.get_snapshot(user_id=user_id)
+    db.session.remove()
+    
+    loaded = load_user(str(user_id))
+    
+    assert loaded.id == user_id and loaded.run_threshold == snapshot.run_threshold
+    assert loaded.refresh_token == 'refresh'
+
+def test_settings_page_updates_the_cached_thresholds(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+    User.get_snapshot(user_id=user.id)
+    
+    response = client.post('/user/settings', data={'run_threshold': 900, 'ride_threshold': 1800, 'walk_threshold': 2700})
+    
+    assert response.status_code == 200
+    snapshot = User.get_snapshot(strava_id=user.strava_id)
+    assert (snapshot.run_threshold, snapshot.ride_threshold, snapshot.walk_threshold) == (900, 1800, 2700)
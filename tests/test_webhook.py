@@ -0,0 +1,55 @@
+import time
+import pytest
+from models import db
+from models.job import Job
+from services.dedup import RecentKeys, recent_webhook_events
+from services.queue import claim_next, finish_job
+
+def created(activity_id, owner_id=1001):
+    return {'object_type': 'activity', 'aspect_type': 'create', 'object_id': activity_id, 'owner_id': owner_id}
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_repeated_events_are_queued_once(client, user):
+    for _ in range(3):
+        assert client.post('/webhook/', json=created(42)).status_code == 200
+    # Even once this process has forgotten it, the job's dedup key holds
+    recent_webhook_events.clear()
+    client.post('/webhook/', json=created(42))
+    
+    jobs = Job.query.all()
+    assert [(job.kind, job.dedup_key) for job in jobs] == [('process_activity', 'activity:1001:42')]
+
+def test_event_is_queued_again_after_its_job_failed(client, user):
+    client.post('/webhook/', json=created(42))
+    job = Job.query.one()
+    job.max_attempts = 1
+    db.session.commit()
+    
+    claim_next('worker-1')
+    finish_job(job.id, RuntimeError('boom'), 'worker-1')
+    assert 'activity:1001:42' not in recent_webhook_events
+    
+    client.post('/webhook/', json=created(42))
+    assert [job.status for job in Job.query.order_by(Job.id)] == ['failed', 'pending']
+
+def test_other_events_are_ignored(client, user):
+    client.post('/webhook/', json=dict(created(42), aspect_type='update'))
+    client.post('/webhook/', json=created(43, owner_id=999))
+    
+    assert Job.query.count() == 0
+
+def test_recent_keys_expire(monkeypatch):
+    keys = RecentKeys(max_size=2, ttl=60)
+    now = time.monotonic()
+    keys.add('a')
+    keys.add('b')
+    keys.add('c')
+    
+    assert 'a' not in keys and 'b' in keys and 'c' in keys
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 61)
+    assert 'b' not in keys
+    keys.discard('c')
+    assert 'c' not in keys